@@ -1,55 +1,115 @@
 # app.py
 
+import argparse
 import gradio as gr
-from keyword_extractor import analyze_image_content, extract_keywords
-from music_generator import generate_music
+from fastapi import FastAPI
+import requests
+import uvicorn
+from audio_engine import AUDIO_FORMATS
 import tempfile
+import time
+import uuid
 import os
 
-def process_content(api_key, content_type, files):
+# 작업 API 서버 주소 (job_server.py)
+JOB_API_URL = os.environ.get("JOB_API_URL", "http://127.0.0.1:8000")
+
+# 작업 상태 폴링 간격(초)
+JOB_POLL_INTERVAL = 1.0
+
+# 작업 제출이 네트워크 오류로 실패했을 때 같은 멱등성 키로 다시 보내는 횟수
+SUBMIT_RETRIES = 2
+
+def submit_job(content_type, paths, output_format, draft_first, api_key, idempotency_key):
+    """
+    작업 API에 작업을 제출합니다. 응답을 받지 못하면 같은 멱등성 키로 다시 보내므로
+    서버가 이미 받은 작업이 두 번 실행되지 않습니다.
+
+    Returns:
+        dict: 작업 상태
     """
-    콘텐츠를 처리하고 음악을 생성합니다.
+    for attempt in range(SUBMIT_RETRIES + 1):
+        uploads = [('files', (os.path.basename(path), open(path, "rb"))) for path in paths]
+        try:
+            response = requests.post(f"{JOB_API_URL}/jobs", headers={'Idempotency-Key': idempotency_key},
+                                     data={'type': content_type, 'output_format': output_format,
+                                           'draft': str(bool(draft_first)).lower(), 'api_key': api_key or ''},
+                                     files=uploads, timeout=60)
+            response.raise_for_status()
+            return response.json()
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == SUBMIT_RETRIES:
+                raise
+            print(f"Job submission failed ({e}), retrying with the same idempotency key")
+            time.sleep(2 ** attempt)
+        finally:
+            for _, (_, handle) in uploads:
+                handle.close()
+
+def _download(url, output_dir):
+    """작업 API에서 아티팩트를 내려받아 파일 경로를 반환"""
+    response = requests.get(url, timeout=60)
+    response.raise_for_status()
+    filename = url.rstrip('/').split('/')[-1]
+    disposition = response.headers.get('content-disposition', '')
+    if 'filename=' in disposition:
+        filename = disposition.split('filename=')[-1].strip('"; ')
+    path = os.path.join(output_dir, filename)
+    with open(path, "wb") as f:
+        f.write(response.content)
+    return path
+
+def process_content(api_key, content_type, files, output_format="mp3", draft_first=True):
+    """
+    작업 API에 작업을 제출하고 진행 상황을 폴링하며 결과를 보여줍니다.
+    draft_first이면 초안이 준비되는 대로 먼저 보여주고, 전체 곡이 완성되면 초안을 전체 곡으로 바꿉니다.
 
     Args:
         api_key (str): OpenAI API 키
         content_type (str): 콘텐츠 타입 ('webtoon' 또는 'novel')
         files (list): 업로드된 파일 리스트
+        output_format (str): 음악 파일 형식 ('wav', 'flac', 'opus', 'mp3')
+        draft_first (bool): 초안을 먼저 보여줄지 여부
 
-    Returns:
-        tuple: 상태 메시지, 생성된 오디오 파일 경로
+    Yields:
+        tuple: 상태 메시지, 생성된 오디오 파일 경로 (초안, 전체 곡 순서)
     """
     temp_dir = tempfile.mkdtemp()
-    keywords = []
+    # 클릭 한 번에 키 하나 (연결이 끊겨 다시 보내도 같은 작업으로 처리됨)
+    idempotency_key = uuid.uuid4().hex
 
     try:
-        if content_type == "webtoon":
-            for file in files:
-                file_path = file.name
-
-                # 이미지 분석 (API Key 전달)
-                image_keywords = analyze_image_content(file_path, api_key)
-                keywords.extend(image_keywords)
-
-        elif content_type == "novel":
-            file_path = files[0].name
-
-            # 텍스트 분석 (API Key 전달)
-            with open(file_path, "r", encoding="utf-8") as f:
-                text_content = f.read()
-
-            keywords = extract_keywords({"full_text": text_content}, "novel", api_key)
-
-        keywords = list(set(keywords))
-        output_path = os.path.join(temp_dir, "output.wav")
-
-        # 음악 생성
-        generate_music(keywords, "romance", "peaceful", "modern", "acoustic", output_path)
-
-        return f"Generated Music with Keywords: {', '.join(keywords)}", output_path
+        if not files:
+            yield "Error: upload at least one file", None
+            return
+        job = submit_job(content_type, [file.name for file in files], output_format, draft_first, api_key,
+                         idempotency_key)
+
+        start = time.perf_counter()
+        draft_path = None
+        while job['status'] in ('queued', 'running'):
+            if draft_first and draft_path is None and 'draft' in job['artifacts']:
+                draft_path = _download(JOB_API_URL + job['artifacts']['draft'], temp_dir)
+                yield f"Draft ready in {time.perf_counter() - start:.1f}s, refining full track...", draft_path
+            elif draft_path is None:
+                yield f"Job {job['status']}: {job['stage']} ({job['progress']:.0%})", None
+            time.sleep(JOB_POLL_INTERVAL)
+            response = requests.get(f"{JOB_API_URL}/jobs/{job['id']}", timeout=30)
+            response.raise_for_status()
+            job = response.json()
+
+        if job['status'] != 'done':
+            yield f"Error: {job['error']}", draft_path
+            return
+
+        keywords = requests.get(JOB_API_URL + job['artifacts']['keywords'], timeout=30).json()
+        output_path = _download(JOB_API_URL + job['artifacts']['audio'], temp_dir)
+        yield (f"Generated Music with Keywords: {', '.join(keywords['keywords'])} "
+               f"({keywords['genre']}, {keywords['mood']}, full track in {time.perf_counter() - start:.1f}s)"), output_path
 
     except Exception as e:
         print(f"Error: {str(e)}")
-        return f"Error: {str(e)}", None
+        yield f"Error: {str(e)}", None
 
 def gradio_interface():
     with gr.Blocks() as demo:
@@ -59,6 +119,9 @@ def gradio_interface():
         api_key_input = gr.Textbox(label="OpenAI API Key", type="password", placeholder="Enter your OpenAI API Key")
         content_type_input = gr.Dropdown(choices=["webtoon", "novel"], label="Content Type")
         file_input = gr.Files(label="Upload Files", file_types=["image", "text"])
+        # 기본값은 브라우저 재생 호환성이 가장 넓은 mp3 (wav 대비 전송량이 크게 줄어듦)
+        format_input = gr.Dropdown(choices=sorted(AUDIO_FORMATS), value="mp3", label="Audio Format")
+        draft_input = gr.Checkbox(value=True, label="Play a quick draft first")
 
         submit_button = gr.Button("Generate Music")
         output_text = gr.Textbox(label="Status")
@@ -66,12 +129,22 @@ def gradio_interface():
 
         submit_button.click(
             fn=process_content,
-            inputs=[api_key_input, content_type_input, file_input],
+            inputs=[api_key_input, content_type_input, file_input, format_input, draft_input],
             outputs=[output_text, output_audio]
         )
 
     return demo
 
+def create_app():
+    """Gradio UI 앱 생성 (메트릭은 작업 API 서버의 /metrics에서 제공)"""
+    return gr.mount_gradio_app(FastAPI(), gradio_interface(), path="/")
+
 if __name__ == "__main__":
-    demo = gradio_interface()
-    demo.launch()
+    parser = argparse.ArgumentParser(description='Webtoon & Novel to Music Generator web UI')
+    parser.add_argument('--host', default='0.0.0.0', help='Host to bind')
+    parser.add_argument('--port', type=int, default=7860, help='Port to listen on')
+    parser.add_argument('--api_url', default=JOB_API_URL, help='Job API server URL (see job_server.py)')
+    args = parser.parse_args()
+    JOB_API_URL = args.api_url.rstrip('/')
+
+    uvicorn.run(create_app(), host=args.host, port=args.port)
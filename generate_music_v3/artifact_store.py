@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import metrics
+
+# 아티팩트 저장소 위치. 여러 워커 호스트가 공유 파일시스템의 같은 디렉토리를 가리키면 결과를 함께 사용
+ARTIFACT_STORE_DIR = os.environ.get("ARTIFACT_STORE_DIR", os.path.join("cache", "artifacts"))
+
+def _fsync_write(path, write):
+    """같은 디렉토리의 임시 파일에 쓰고 fsync한 뒤 교체 (다른 프로세스에는 완성된 파일만 보임)"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+class ArtifactStore:
+    """
+    내용 해시(SHA-256)로 파일을 저장하는 저장소.
+    같은 내용은 한 번만 저장되고, 경로가 내용으로 정해지므로 어느 호스트에서든 같은 해시로 찾을 수 있습니다.
+    이름이 필요한 항목(URL별 결과 등)은 refs/ 아래 JSON으로 해시를 가리킵니다.
+
+    Args:
+        root (str): 저장소 루트 디렉토리
+    """
+
+    def __init__(self, root=ARTIFACT_STORE_DIR):
+        self.root = root
+
+    def path(self, digest):
+        """해시에 해당하는 파일 경로 (objects/ab/cdef...)"""
+        return os.path.join(self.root, "objects", digest[:2], digest[2:])
+
+    def has(self, digest):
+        return bool(digest) and os.path.exists(self.path(digest))
+
+    def put_bytes(self, data):
+        """
+        바이트를 저장합니다.
+
+        Returns:
+            str: 내용의 SHA-256 해시
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        if not self.has(digest):
+            _fsync_write(self.path(digest), lambda f: f.write(data))
+            metrics.increment('bytes_written_total', len(data), store='artifacts')
+        return digest
+
+    def put_file(self, path):
+        """
+        파일을 저장합니다 (조각 단위로 해시를 계산하고 복사).
+
+        Returns:
+            str: 내용의 SHA-256 해시
+        """
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        if not self.has(digest):
+            def copy(out):
+                with open(path, "rb") as src:
+                    shutil.copyfileobj(src, out, 1024 * 1024)
+            _fsync_write(self.path(digest), copy)
+            metrics.increment('bytes_written_total', os.path.getsize(path), store='artifacts')
+        return digest
+
+    def put_json(self, data):
+        """JSON으로 직렬화해 저장하고 해시를 반환"""
+        return self.put_bytes(json.dumps(data, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+
+    def get_bytes(self, digest):
+        with open(self.path(digest), "rb") as f:
+            return f.read()
+
+    def get_json(self, digest):
+        return json.loads(self.get_bytes(digest).decode("utf-8"))
+
+    def materialize(self, digest, dest_path):
+        """
+        아티팩트를 dest_path로 복사합니다 (출력 파일을 수정해도 저장소는 그대로 남도록 링크하지 않음).
+
+        Returns:
+            str: dest_path
+        """
+        directory = os.path.dirname(dest_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        shutil.copyfile(self.path(digest), dest_path)
+        return dest_path
+
+    def _ref_path(self, name):
+        return os.path.join(self.root, "refs", f"{name}.json")
+
+    def set_ref(self, name, data):
+        """이름으로 찾을 수 있는 JSON 레퍼런스를 원자적으로 저장"""
+        payload = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+        _fsync_write(self._ref_path(name), lambda f: f.write(payload))
+
+    def get_ref(self, name):
+        """
+        레퍼런스를 불러옵니다.
+
+        Returns:
+            dict: 저장된 JSON (없으면 None)
+        """
+        path = self._ref_path(name)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+_artifact_store = None
+_artifact_store_lock = threading.Lock()
+
+def get_artifact_store():
+    """ArtifactStore를 프로세스당 한 번만 만들어 재사용"""
+    global _artifact_store
+    with _artifact_store_lock:
+        if _artifact_store is None:
+            _artifact_store = ArtifactStore()
+        return _artifact_store
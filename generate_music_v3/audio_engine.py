@@ -0,0 +1,444 @@
+import math
+import os
+import tempfile
+import warnings
+import numpy as np
+import scipy.io.wavfile
+import scipy.signal
+import soundfile as sf
+
+# 출력 형식별 soundfile 인코더 설정 (format, subtype)
+AUDIO_FORMATS = {
+    'wav': ('WAV', 'PCM_16'),
+    'flac': ('FLAC', 'PCM_16'),
+    'opus': ('OGG', 'OPUS'),
+    'mp3': ('MP3', 'MPEG_LAYER_III')
+}
+DEFAULT_AUDIO_FORMAT = 'wav'
+
+# Opus 인코더가 지원하는 샘플링 레이트
+OPUS_SAMPLING_RATES = (8000, 12000, 16000, 24000, 48000)
+
+# 한 번에 읽고 쓰는 프레임 수 (메모리 사용량은 트랙 길이와 무관하게 이 크기에 비례)
+BLOCK_FRAMES = 65536
+
+# BS.1770 게이팅: 400ms 블록, 100ms 간격(75% 겹침), 절대 게이트 -70 LUFS, 상대 게이트 -10 LU
+LUFS_BLOCK_SECONDS = 0.4
+LUFS_STEP_SECONDS = 0.1
+LUFS_ABSOLUTE_GATE = -70.0
+LUFS_RELATIVE_GATE = -10.0
+# 게이팅 블록 에너지를 저장하는 히스토그램 (0.01 LU 간격, -70 ~ +20 LUFS)
+_LUFS_HIST_STEP = 0.01
+_LUFS_HIST_BINS = 9000
+
+def audio_format_for(path):
+    """
+    파일 확장자로 출력 형식을 결정합니다 (지원하지 않는 확장자면 기본 형식).
+
+    Args:
+        path (str): 오디오 파일 경로
+
+    Returns:
+        str: AUDIO_FORMATS의 형식 이름
+    """
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    return ext if ext in AUDIO_FORMATS else DEFAULT_AUDIO_FORMAT
+
+def _pcm_to_float(block):
+    """WAV 샘플 배열을 -1.0 ~ 1.0 범위의 float32로 변환"""
+    if block.dtype == np.int16:
+        return block.astype(np.float32) / 32768.0
+    if block.dtype == np.int32:
+        return (block / 2147483648.0).astype(np.float32)
+    if block.dtype == np.uint8:
+        return (block.astype(np.float32) - 128.0) / 128.0
+    return block.astype(np.float32)
+
+class AudioReader:
+    """
+    오디오 파일에서 필요한 구간만 블록 단위로 읽는 리더.
+    PCM/float WAV는 메모리 매핑하고, 그 외 형식(FLAC, Opus, MP3, 24비트 WAV 등)은
+    soundfile로 필요한 위치부터 디코딩합니다.
+
+    Args:
+        path (str): 오디오 파일 경로
+    """
+
+    def __init__(self, path):
+        self.path = path
+        info = sf.info(path)
+        self.format = info.format
+        self.subtype = info.subtype
+        self._data = None
+        self._file = None
+
+        try:
+            with warnings.catch_warnings():
+                # 알 수 없는 청크(LIST 등) 경고 무시
+                warnings.simplefilter('ignore', scipy.io.wavfile.WavFileWarning)
+                self.samplerate, data = scipy.io.wavfile.read(path, mmap=True)
+            self._data = data if data.ndim == 2 else data[:, np.newaxis]
+            self.frames, self.channels = self._data.shape
+        except Exception:
+            self._file = sf.SoundFile(path)
+            self.samplerate = self._file.samplerate
+            self.frames = self._file.frames
+            self.channels = self._file.channels
+
+    @property
+    def mmapped(self):
+        """메모리 매핑으로 읽는지 여부"""
+        return self._data is not None
+
+    def read(self, start, stop):
+        """
+        [start, stop) 구간의 프레임을 읽습니다.
+
+        Returns:
+            numpy.ndarray: (프레임 수, 채널 수) float32 배열
+        """
+        start = max(0, start)
+        stop = min(self.frames, stop)
+        if stop <= start:
+            return np.zeros((0, self.channels), dtype=np.float32)
+        if self._data is not None:
+            return _pcm_to_float(self._data[start:stop])
+        self._file.seek(start)
+        return self._file.read(stop - start, dtype='float32', always_2d=True)
+
+    def blocks(self, start=0, stop=None, block_frames=BLOCK_FRAMES):
+        """
+        [start, stop) 구간을 블록 단위로 읽습니다.
+
+        Yields:
+            tuple: (블록 시작 프레임, (프레임 수, 채널 수) float32 배열)
+        """
+        stop = self.frames if stop is None else min(stop, self.frames)
+        for offset in range(max(0, start), stop, block_frames):
+            yield offset, self.read(offset, min(offset + block_frames, stop))
+
+    def close(self):
+        # 메모리 매핑 해제 (같은 경로에 덮어쓰기 전에 호출)
+        self._data = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_writer(path, samplerate, channels, audio_format=None, subtype=None):
+    """
+    블록 단위로 쓸 수 있는 출력 파일을 엽니다.
+
+    Args:
+        path (str): 저장 경로
+        samplerate (int): 샘플링 레이트
+        channels (int): 채널 수
+        audio_format (str): 'wav', 'flac', 'opus', 'mp3' 중 하나 (None이면 확장자로 결정)
+        subtype (str): soundfile subtype (None이면 형식별 기본값, 형식과 맞지 않으면 무시)
+
+    Returns:
+        soundfile.SoundFile: 쓰기 모드로 열린 파일
+    """
+    audio_format = audio_format or audio_format_for(path)
+    container, default_subtype = AUDIO_FORMATS[audio_format]
+    if audio_format == 'opus' and samplerate not in OPUS_SAMPLING_RATES:
+        raise ValueError(f"Opus does not support {samplerate} Hz (supported: {OPUS_SAMPLING_RATES})")
+    if subtype is None or not sf.check_format(container, subtype):
+        subtype = default_subtype
+    return sf.SoundFile(path, 'w', samplerate=samplerate, channels=channels, format=container, subtype=subtype)
+
+def write_block(writer, block):
+    """
+    블록을 출력 파일에 씁니다. 정수 PCM/손실 압축 형식이면 범위를 벗어난 값이 뒤집히지 않도록 제한합니다.
+    """
+    if writer.subtype not in ('FLOAT', 'DOUBLE'):
+        block = np.clip(block, -1.0, 1.0)
+    writer.write(block)
+
+def _replace_output(input_path, output_path):
+    """
+    출력 경로가 입력과 같으면 같은 디렉토리의 임시 파일 경로를 반환합니다.
+
+    Returns:
+        tuple: (실제로 쓸 경로, 끝난 뒤 옮길 최종 경로 또는 None)
+    """
+    if os.path.abspath(input_path) != os.path.abspath(output_path):
+        return output_path, None
+    directory, name = os.path.split(os.path.abspath(output_path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=os.path.splitext(name)[1], dir=directory)
+    os.close(fd)
+    return temp_path, output_path
+
+def _writer_subtype(reader, output_path):
+    """입력과 출력 형식이 같으면 입력의 subtype(비트 깊이)을 유지"""
+    return reader.subtype if audio_format_for(output_path) == audio_format_for(reader.path) else None
+
+def measure_rms_dbfs(path, block_frames=BLOCK_FRAMES):
+    """
+    모든 채널의 RMS 레벨(dBFS)을 블록 단위로 계산합니다.
+
+    Returns:
+        float: dBFS (무음이면 -inf)
+    """
+    total = 0.0
+    count = 0
+    with AudioReader(path) as reader:
+        for _, block in reader.blocks(block_frames=block_frames):
+            total += float(np.square(block, dtype=np.float64).sum())
+            count += block.size
+    if count == 0 or total == 0:
+        return float('-inf')
+    return 10 * math.log10(total / count)
+
+def _biquad_high_shelf(samplerate, gain_db, q, fc):
+    A = 10 ** (gain_db / 40)
+    w0 = 2 * math.pi * fc / samplerate
+    alpha = math.sin(w0) / (2 * q)
+    cos_w0 = math.cos(w0)
+    sqrt_a = math.sqrt(A)
+    b = [A * ((A + 1) + (A - 1) * cos_w0 + 2 * sqrt_a * alpha),
+         -2 * A * ((A - 1) + (A + 1) * cos_w0),
+         A * ((A + 1) + (A - 1) * cos_w0 - 2 * sqrt_a * alpha)]
+    a = [(A + 1) - (A - 1) * cos_w0 + 2 * sqrt_a * alpha,
+         2 * ((A - 1) - (A + 1) * cos_w0),
+         (A + 1) - (A - 1) * cos_w0 - 2 * sqrt_a * alpha]
+    return [v / a[0] for v in b] + [v / a[0] for v in a]
+
+def _biquad_high_pass(samplerate, q, fc):
+    w0 = 2 * math.pi * fc / samplerate
+    alpha = math.sin(w0) / (2 * q)
+    cos_w0 = math.cos(w0)
+    b = [(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2]
+    a = [1 + alpha, -2 * cos_w0, 1 - alpha]
+    return [v / a[0] for v in b] + [v / a[0] for v in a]
+
+def k_weighting_sos(samplerate):
+    """
+    BS.1770 K-가중 필터(고역 셸빙 + RLB 하이패스)를 임의의 샘플링 레이트에 맞춰 계산합니다.
+
+    Returns:
+        numpy.ndarray: scipy.signal.sosfilt용 (2, 6) 계수
+    """
+    return np.array([
+        _biquad_high_shelf(samplerate, gain_db=4.0, q=1 / math.sqrt(2), fc=1500.0),
+        _biquad_high_pass(samplerate, q=0.5, fc=38.0)
+    ])
+
+def measure_lufs(path, block_frames=BLOCK_FRAMES):
+    """
+    BS.1770 통합 라우드니스(LUFS)를 블록 단위로 계산합니다.
+    게이팅 블록 에너지는 고정 크기 히스토그램에 모으므로 트랙 길이와 무관하게 메모리 사용량이 일정합니다.
+
+    Returns:
+        float: 통합 라우드니스 (게이트를 통과한 블록이 없으면 -inf)
+    """
+    with AudioReader(path) as reader:
+        sos = k_weighting_sos(reader.samplerate)
+        zi = np.zeros((sos.shape[0], 2, reader.channels))
+        # 채널 가중치 (L, R, C = 1.0, 서라운드 = 1.41)
+        weights = np.array([1.41 if c in (3, 4) else 1.0 for c in range(reader.channels)])
+
+        step = int(round(LUFS_STEP_SECONDS * reader.samplerate))
+        steps_per_block = int(round(LUFS_BLOCK_SECONDS / LUFS_STEP_SECONDS))
+        recent = []  # 최근 100ms 구간들의 채널별 평균 제곱 (최대 4개)
+        sub_sum = np.zeros(reader.channels)
+        sub_count = 0
+
+        hist_count = np.zeros(_LUFS_HIST_BINS)
+        hist_energy = np.zeros(_LUFS_HIST_BINS)
+
+        for _, block in reader.blocks(block_frames=block_frames):
+            filtered, zi = scipy.signal.sosfilt(sos, block, axis=0, zi=zi)
+            squares = np.square(filtered, dtype=np.float64)
+            pos = 0
+            while pos < len(squares):
+                take = min(step - sub_count, len(squares) - pos)
+                sub_sum += squares[pos:pos + take].sum(axis=0)
+                sub_count += take
+                pos += take
+                if sub_count < step:
+                    break
+
+                recent.append(sub_sum / step)
+                if len(recent) > steps_per_block:
+                    recent.pop(0)
+                sub_sum = np.zeros(reader.channels)
+                sub_count = 0
+
+                if len(recent) == steps_per_block:
+                    energy = float(np.dot(weights, np.mean(recent, axis=0)))
+                    if energy <= 0:
+                        continue
+                    loudness = -0.691 + 10 * math.log10(energy)
+                    if loudness < LUFS_ABSOLUTE_GATE:
+                        continue
+                    index = min(int((loudness - LUFS_ABSOLUTE_GATE) / _LUFS_HIST_STEP), _LUFS_HIST_BINS - 1)
+                    hist_count[index] += 1
+                    hist_energy[index] += energy
+
+    if hist_count.sum() == 0:
+        return float('-inf')
+
+    # 상대 게이트: 절대 게이트를 통과한 블록 평균보다 10 LU 낮은 블록 제외
+    relative_gate = -0.691 + 10 * math.log10(hist_energy.sum() / hist_count.sum()) + LUFS_RELATIVE_GATE
+    first = max(0, int(math.ceil((relative_gate - LUFS_ABSOLUTE_GATE) / _LUFS_HIST_STEP)))
+    gated_count = hist_count[first:].sum()
+    if gated_count == 0:
+        return float('-inf')
+    return -0.691 + 10 * math.log10(hist_energy[first:].sum() / gated_count)
+
+def apply_gain(input_path, output_path, gain_db, block_frames=BLOCK_FRAMES):
+    """
+    파일 전체에 게인을 블록 단위로 적용합니다. 출력 경로가 입력과 같으면 임시 파일에 쓴 뒤 교체합니다.
+
+    Returns:
+        str: 출력 파일 경로
+    """
+    gain = 10 ** (gain_db / 20)
+    write_path, final_path = _replace_output(input_path, output_path)
+    try:
+        with AudioReader(input_path) as reader:
+            with open_writer(write_path, reader.samplerate, reader.channels,
+                             audio_format=audio_format_for(output_path),
+                             subtype=_writer_subtype(reader, output_path)) as writer:
+                for _, block in reader.blocks(block_frames=block_frames):
+                    write_block(writer, block * gain)
+        if final_path:
+            os.replace(write_path, final_path)
+    except Exception:
+        if final_path and os.path.exists(write_path):
+            os.remove(write_path)
+        raise
+    return output_path
+
+def transcode(input_path, output_path, block_frames=BLOCK_FRAMES):
+    """
+    다른 형식으로 블록 단위 변환합니다 (형식은 출력 확장자로 결정).
+
+    Returns:
+        str: 출력 파일 경로
+    """
+    return apply_gain(input_path, output_path, 0.0, block_frames)
+
+def normalize(input_path, output_path, method='rms', target=-20.0, block_frames=BLOCK_FRAMES):
+    """
+    두 번 읽어서 라우드니스를 정규화합니다 (1차: 측정, 2차: 게인 적용).
+
+    Args:
+        input_path (str): 입력 오디오 파일 경로
+        output_path (str): 출력 오디오 파일 경로 (입력과 같아도 됨)
+        method (str): 'rms' (dBFS) 또는 'lufs' (BS.1770 통합 라우드니스)
+        target (float): 목표 레벨 (dBFS 또는 LUFS)
+
+    Returns:
+        tuple: (출력 파일 경로, 측정값, 적용한 게인(dB))
+    """
+    if method == 'rms':
+        measured = measure_rms_dbfs(input_path, block_frames)
+    elif method == 'lufs':
+        measured = measure_lufs(input_path, block_frames)
+    else:
+        raise ValueError(f"Unknown loudness method: {method}")
+
+    # 무음이면 게인 없이 복사
+    gain_db = target - measured if math.isfinite(measured) else 0.0
+    apply_gain(input_path, output_path, gain_db, block_frames)
+    return output_path, measured, gain_db
+
+def _fade_gain(positions, total, fade_in_frames, fade_out_frames):
+    """구간 시작 기준 위치별 선형 페이드 게인"""
+    gain = np.ones(len(positions), dtype=np.float32)
+    if fade_in_frames > 0:
+        gain = np.minimum(gain, positions / fade_in_frames)
+    if fade_out_frames > 0:
+        gain = np.minimum(gain, (total - positions) / fade_out_frames)
+    return np.clip(gain, 0.0, 1.0)[:, np.newaxis]
+
+def trim(input_path, output_path, start_ms=0, duration_ms=None, fade_in_ms=0, fade_out_ms=0,
+         block_frames=BLOCK_FRAMES):
+    """
+    구간을 잘라 저장합니다. 잘라낼 구간의 프레임만 읽습니다.
+
+    Args:
+        input_path (str): 입력 오디오 파일 경로
+        output_path (str): 출력 오디오 파일 경로
+        start_ms (int): 시작 위치(ms)
+        duration_ms (int): 길이(ms, None이면 끝까지, 원본보다 길면 원본 끝까지)
+        fade_in_ms (int): 페이드 인 길이(ms)
+        fade_out_ms (int): 페이드 아웃 길이(ms)
+
+    Returns:
+        str: 출력 파일 경로
+    """
+    write_path, final_path = _replace_output(input_path, output_path)
+    try:
+        with AudioReader(input_path) as reader:
+            rate = reader.samplerate
+            start = min(int(start_ms * rate / 1000), reader.frames)
+            stop = reader.frames if duration_ms is None else min(reader.frames, start + int(duration_ms * rate / 1000))
+            total = stop - start
+            fade_in_frames = min(int(fade_in_ms * rate / 1000), total)
+            fade_out_frames = min(int(fade_out_ms * rate / 1000), total)
+
+            with open_writer(write_path, rate, reader.channels, audio_format=audio_format_for(output_path),
+                             subtype=_writer_subtype(reader, output_path)) as writer:
+                for offset, block in reader.blocks(start, stop, block_frames):
+                    positions = np.arange(offset - start, offset - start + len(block), dtype=np.float32)
+                    write_block(writer, block * _fade_gain(positions, total, fade_in_frames, fade_out_frames))
+        if final_path:
+            os.replace(write_path, final_path)
+    except Exception:
+        if final_path and os.path.exists(write_path):
+            os.remove(write_path)
+        raise
+    return output_path
+
+def concat(input_paths, output_path, crossfade_ms=1000, block_frames=BLOCK_FRAMES):
+    """
+    여러 파일을 크로스페이드로 이어 붙입니다.
+    이전 파일의 끝부분(크로스페이드 길이)만 메모리에 두고 나머지는 블록 단위로 바로 씁니다.
+    크로스페이드는 두 파일 중 짧은 쪽 길이를 넘지 않습니다.
+
+    Args:
+        input_paths (list): 입력 오디오 파일 경로 리스트 (샘플링 레이트와 채널 수가 같아야 함)
+        output_path (str): 출력 오디오 파일 경로
+        crossfade_ms (int): 크로스페이드 길이(ms)
+
+    Returns:
+        str: 출력 파일 경로
+    """
+    if not input_paths:
+        raise ValueError("No input files to concatenate")
+
+    with AudioReader(input_paths[0]) as first:
+        rate, channels = first.samplerate, first.channels
+        subtype = _writer_subtype(first, output_path)
+    crossfade_frames = int(crossfade_ms * rate / 1000)
+
+    with open_writer(output_path, rate, channels, audio_format=audio_format_for(output_path), subtype=subtype) as writer:
+        tail = np.zeros((0, channels), dtype=np.float32)
+        for path in input_paths:
+            with AudioReader(path) as reader:
+                if (reader.samplerate, reader.channels) != (rate, channels):
+                    raise ValueError(f"{path}: {reader.samplerate} Hz/{reader.channels} ch does not match "
+                                     f"{rate} Hz/{channels} ch")
+
+                # 이전 파일 끝부분과 현재 파일 앞부분을 겹쳐서 기록
+                fade = min(len(tail), reader.frames)
+                write_block(writer, tail[:len(tail) - fade])
+                if fade:
+                    fade_in = np.linspace(0.0, 1.0, fade, dtype=np.float32)[:, np.newaxis]
+                    write_block(writer, tail[len(tail) - fade:] * (1.0 - fade_in) + reader.read(0, fade) * fade_in)
+
+                # 다음 파일과 겹칠 끝부분은 남겨 두고 나머지 기록
+                keep = min(crossfade_frames, reader.frames - fade)
+                for _, block in reader.blocks(fade, reader.frames - keep, block_frames):
+                    write_block(writer, block)
+                tail = reader.read(reader.frames - keep, reader.frames)
+        write_block(writer, tail)
+    return output_path
@@ -0,0 +1,313 @@
+import argparse
+import csv
+import datetime
+import hashlib
+import json
+import os
+import time
+import traceback
+from keyword_extractor import get_keybert_model
+from music_generator import load_musicgen_model, AUDIO_FORMATS
+from main import prepare_job, run_job, PIPELINE_STAGES
+from pipeline_executor import PipelineExecutor
+import metrics
+from memory_profiling import MemoryProfiler
+from prompt_cache import DEFAULT_SIMILARITY_THRESHOLD
+from image_mood import LOCAL_MOOD_CONFIDENCE
+
+def load_manifest(manifest_path):
+    """
+    배치 매니페스트(JSONL 또는 CSV)를 읽습니다.
+    각 항목은 type, input, output(선택), format(선택) 필드를 가집니다.
+
+    Args:
+        manifest_path (str): 매니페스트 파일 경로 (.jsonl 또는 .csv)
+
+    Returns:
+        list: 항목 리스트 (각 항목에 고유 id 포함)
+    """
+    if manifest_path.lower().endswith('.csv'):
+        with open(manifest_path, "r", encoding="utf-8", newline='') as f:
+            rows = list(csv.DictReader(f))
+    else:
+        rows = []
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rows.append(json.loads(line))
+
+    items = []
+    seen_ids = {}
+    for row in rows:
+        content_type = (row.get('type') or '').strip()
+        input_source = (row.get('input') or '').strip()
+        output = (row.get('output') or '').strip() or None
+        output_format = (row.get('format') or '').strip() or None
+        if content_type not in ('webtoon', 'novel') or not input_source:
+            print(f"Skipping invalid manifest row: {row}")
+            continue
+
+        # 같은 입력이 여러 번 나오면 순서대로 구분
+        base_id = hashlib.md5(f"{content_type}|{input_source}|{output}".encode()).hexdigest()
+        seen_ids[base_id] = seen_ids.get(base_id, 0) + 1
+        item_id = base_id if seen_ids[base_id] == 1 else f"{base_id}#{seen_ids[base_id]}"
+
+        items.append({'id': item_id, 'type': content_type, 'input': input_source, 'output': output,
+                      'format': output_format})
+    return items
+
+def load_checkpoint(checkpoint_path):
+    """
+    체크포인트 파일에서 항목별 마지막 상태를 읽습니다.
+
+    Returns:
+        dict: 항목 id → 마지막 체크포인트 레코드
+    """
+    records = {}
+    if not os.path.exists(checkpoint_path):
+        return records
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                records[record['id']] = record
+            except Exception:
+                # 비정상 종료로 잘린 마지막 줄은 무시
+                continue
+    return records
+
+def append_checkpoint(checkpoint_path, record):
+    """체크포인트 레코드를 한 줄 추가하고 바로 디스크에 기록"""
+    with open(checkpoint_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def warm_up_models(profiler=None):
+    """배치 시작 전에 KeyBERT와 MusicGen을 한 번만 로드"""
+    start = time.time()
+    if profiler:
+        with profiler.stage('keybert_load'):
+            get_keybert_model()
+        with profiler.stage('musicgen_load'):
+            load_musicgen_model()
+    else:
+        get_keybert_model()
+        load_musicgen_model()
+    print(f"Models loaded in {time.time() - start:.1f}s")
+
+def parse_stage_workers(spec):
+    """
+    'extract=2,music=1' 형식의 단계별 워커 수 설정을 읽습니다.
+
+    Returns:
+        dict: 단계 이름 → 워커 수
+    """
+    workers = {}
+    if not spec:
+        return workers
+    for part in spec.split(','):
+        name, _, count = part.partition('=')
+        workers[name.strip()] = int(count)
+    return workers
+
+class _BatchProgress:
+    """항목별 체크포인트 기록과 처리 속도(items/hour) 보고"""
+
+    def __init__(self, checkpoint_path, total):
+        self.checkpoint_path = checkpoint_path
+        self.total = total
+        self.start = time.time()
+        self.finished = 0
+        self.done = 0
+        self.failed = 0
+
+    def record(self, item, job=None, error=None, item_start=None):
+        record = {'id': item['id'], 'type': item['type'], 'input': item['input']}
+        if job is not None:
+            record['output_dir'] = job.get('output_dir')
+        if error is None and job is not None and job.get('music_path'):
+            record.update({'status': 'done', 'music_path': job['music_path']})
+            self.done += 1
+        else:
+            record.update({'status': 'failed', 'error': str(error) if error else 'music generation failed'})
+            self.failed += 1
+
+        if item_start is not None:
+            record['elapsed'] = round(time.time() - item_start, 2)
+        record['finished_at'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        append_checkpoint(self.checkpoint_path, record)
+
+        self.finished += 1
+        print(f"[{self.finished}/{self.total}] {record['status']}: {item['input']} "
+              f"({record.get('elapsed', 0)}s, {self.items_per_hour():.1f} items/hour)")
+
+    def items_per_hour(self):
+        elapsed_hours = (time.time() - self.start) / 3600
+        return self.finished / elapsed_hours if elapsed_hours > 0 else 0
+
+def _run_sequential(pending, api_key, use_cache, progress, profiler=None, job_options=None):
+    """항목을 하나씩 모든 단계에 통과시켜 처리"""
+    job_options = job_options or {}
+    for item in pending:
+        item_start = time.time()
+        job = None
+        try:
+            job = prepare_job(item['type'], item['input'], api_key, output=item['output'], use_cache=use_cache,
+                              output_format=item['format'], **job_options)
+            run_job(job, profiler=profiler)
+            progress.record(item, job, item_start=item_start)
+        except Exception as e:
+            print(f"Error processing batch item {item['input']}: {e}")
+            traceback.print_exc()
+            progress.record(item, job, error=e, item_start=item_start)
+
+def _run_overlapped(pending, api_key, use_cache, progress, stage_workers=None, queue_size=2, job_options=None):
+    """
+    항목들이 서로 다른 단계를 동시에 진행하도록 파이프라인 실행기로 처리합니다.
+    키워드 추출, 시각화, 음악 생성 단계는 모델/전역 상태를 공유하므로 기본 워커 수는 1입니다.
+    """
+    stage_workers = stage_workers or {}
+    job_options = job_options or {}
+
+    def make_stage(name, stage):
+        def run(job):
+            if name == 'extract':
+                item = job
+                job = prepare_job(item['type'], item['input'], api_key, output=item['output'], use_cache=use_cache,
+                                  output_format=item['format'], **job_options)
+                job['batch_item'] = item
+                job['batch_start'] = item['batch_start']
+            return stage(job)
+        return run
+
+    def items():
+        for item in pending:
+            yield dict(item, batch_start=time.time())
+
+    def on_complete(job):
+        progress.record(job['batch_item'], job, item_start=job['batch_start'])
+
+    def on_error(job, stage_name, error):
+        item = job.get('batch_item', job)
+        progress.record(item, job if 'output_dir' in job else None, error=error,
+                        item_start=job.get('batch_start'))
+
+    executor = PipelineExecutor(
+        [(name, make_stage(name, stage), stage_workers.get(name, 1)) for name, stage in PIPELINE_STAGES],
+        queue_size=queue_size
+    )
+    executor.run(items(), on_complete=on_complete, on_error=on_error)
+    executor.print_stats()
+    return executor.stats()
+
+def run_batch(manifest_path, api_key, checkpoint_path=None, use_cache=False, retry_failed=True,
+              overlap=False, stage_workers=None, profile_memory=False, output_format=None,
+              similarity_threshold=None, instant=False, live_fallback=True, soundtrack=False, local_mood_threshold=None):
+    """
+    매니페스트의 모든 입력을 한 프로세스에서 처리합니다.
+    항목이 끝날 때마다 체크포인트를 기록하므로 중단 후 다시 실행하면 남은 항목부터 처리합니다.
+
+    Args:
+        manifest_path (str): 매니페스트 파일 경로
+        api_key (str): OpenAI API 키
+        checkpoint_path (str): 체크포인트 파일 경로 (None이면 매니페스트 옆에 생성)
+        use_cache (bool): 캐시 사용 여부
+        retry_failed (bool): 이전에 실패한 항목을 다시 처리할지 여부
+        overlap (bool): 항목 간 단계를 겹쳐서 실행할지 여부
+        stage_workers (dict): overlap 모드의 단계별 워커 수
+        profile_memory (bool): 단계별 메모리 사용량 측정 여부 (단계가 겹치면 구분할 수 없으므로 순차 실행)
+        output_format (str): 매니페스트에 format이 없는 항목의 음악 파일 형식
+        similarity_threshold (float): 유사 프롬프트 음악 캐시 임계값 (None이면 사용 안 함)
+        instant (bool): 미리 생성한 음악 라이브러리에서 바로 가져오기
+        live_fallback (bool): instant 모드에서 라이브러리에 없으면 새로 생성할지 여부
+        soundtrack (bool): 웹소설 항목은 챕터별 사운드트랙도 생성
+        local_mood_threshold (float): 웹툰 이미지에 로컬 분위기 분류기를 쓸 최소 신뢰도 (None이면 항상 Vision API)
+
+    Returns:
+        dict: 처리 결과 통계
+    """
+    if checkpoint_path is None:
+        checkpoint_path = os.path.splitext(manifest_path)[0] + "_checkpoint.jsonl"
+
+    items = load_manifest(manifest_path)
+    checkpoint = load_checkpoint(checkpoint_path)
+
+    pending = []
+    for item in items:
+        record = checkpoint.get(item['id'])
+        if record and (record['status'] == 'done' or not retry_failed):
+            continue
+        item['format'] = item['format'] or output_format
+        pending.append(item)
+
+    print(f"Batch: {len(items)} items, {len(items) - len(pending)} already completed, {len(pending)} to process")
+    if not pending:
+        return {'total': len(items), 'done': 0, 'failed': 0}
+
+    profiler = MemoryProfiler() if profile_memory else None
+    if profiler and overlap:
+        print("Memory profiling needs stages to run one at a time, ignoring --overlap")
+        overlap = False
+
+    # 항목마다 prepare_job에 넘길 이미지 분석/음악 생성 옵션
+    job_options = {'similarity_threshold': similarity_threshold, 'instant': instant, 'live_fallback': live_fallback,
+                   'soundtrack': soundtrack, 'local_mood_threshold': local_mood_threshold}
+
+    warm_up_models(profiler)
+
+    progress = _BatchProgress(checkpoint_path, len(pending))
+    pipeline_stats = None
+    if overlap:
+        pipeline_stats = _run_overlapped(pending, api_key, use_cache, progress, stage_workers, job_options=job_options)
+    else:
+        _run_sequential(pending, api_key, use_cache, progress, profiler, job_options)
+
+    if profiler:
+        profiler.print_table()
+        profiler.write_json(os.path.splitext(checkpoint_path)[0] + "_memory.json")
+
+    print(f"Batch finished: {progress.done} done, {progress.failed} failed, "
+          f"{progress.items_per_hour():.1f} items/hour")
+    print(f"Checkpoint: {checkpoint_path}")
+
+    # 배치 전체의 단계별 시간, 캐시 적중률 등 저장
+    metrics.write_json(os.path.splitext(checkpoint_path)[0] + "_metrics.json", extra={
+        'manifest': manifest_path,
+        'done': progress.done,
+        'failed': progress.failed,
+        'items_per_hour': progress.items_per_hour(),
+        'pipeline_stats': pipeline_stats
+    })
+    return {'total': len(items), 'done': progress.done, 'failed': progress.failed}
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate music for a manifest of webtoon and novel inputs in one process')
+    parser.add_argument('--manifest', required=True, help='JSONL or CSV file with type, input and optional output columns')
+    parser.add_argument('--api_key', required=True, help='OpenAI API key')
+    parser.add_argument('--checkpoint', default=None, help='Checkpoint file path (default: <manifest>_checkpoint.jsonl)')
+    parser.add_argument('--use_cache', action='store_true', help='Use cached content if available')
+    parser.add_argument('--skip_failed', action='store_true', help='Do not retry items that failed in a previous run')
+    parser.add_argument('--overlap', action='store_true', help='Overlap pipeline stages across items')
+    parser.add_argument('--stage_workers', default=None, help='Workers per stage in overlap mode, e.g. extract=2,music=1')
+    parser.add_argument('--format', choices=sorted(AUDIO_FORMATS), default=None, help='Audio format for items without a format column')
+    parser.add_argument('--semantic_cache', type=float, nargs='?', const=DEFAULT_SIMILARITY_THRESHOLD, default=None,
+                        metavar='THRESHOLD', help=f'Reuse cached music for similar prompts (default threshold: {DEFAULT_SIMILARITY_THRESHOLD})')
+    parser.add_argument('--instant', action='store_true', help='Serve music from the pre-generated library (see music_library.py)')
+    parser.add_argument('--no_live_fallback', action='store_true', help='With --instant, fail instead of generating when the library has no track')
+    parser.add_argument('--soundtrack', action='store_true', help='For novels, also generate a per-chapter soundtrack of mood cues')
+    parser.add_argument('--local_mood', type=float, nargs='?', const=LOCAL_MOOD_CONFIDENCE, default=None, metavar='THRESHOLD',
+                        help='Skip the vision API for webtoon images the fitted local mood classifier is confident about '
+                             '(see image_mood.py fit; the calibrated threshold is used if higher)')
+    parser.add_argument('--profile-memory', dest='profile_memory', action='store_true', help='Record per-stage memory usage (tracemalloc, RSS, JVM heap)')
+    args = parser.parse_args()
+
+    run_batch(args.manifest, args.api_key, checkpoint_path=args.checkpoint,
+              use_cache=args.use_cache, retry_failed=not args.skip_failed,
+              overlap=args.overlap, stage_workers=parse_stage_workers(args.stage_workers),
+              profile_memory=args.profile_memory, output_format=args.format,
+              similarity_threshold=args.semantic_cache, instant=args.instant,
+              live_fallback=not args.no_live_fallback, soundtrack=args.soundtrack, local_mood_threshold=args.local_mood)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import traceback
+
+# 벤치마크는 네트워크 없이 실행 (허깅페이스 허브 접근 차단)
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+
+import numpy as np
+
+# 등록된 벤치마크: 이름 → 케이스 생성 함수
+BENCHMARKS = {}
+
+def benchmark(name):
+    """
+    벤치마크 등록 데코레이터. 등록된 함수는 (workdir, quick)을 받아
+    (케이스 이름, 실행 함수, 파라미터 딕셔너리)를 차례로 반환해야 합니다.
+    """
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+def _sample_text(num_chars, seed=0):
+    """렉시콘 키워드와 일반 단어를 섞은 재현 가능한 한국어/영어 텍스트 생성"""
+    from lexicon import LEXICONS
+    rng = random.Random(seed)
+    lexicon_words = [word for lexicon, _ in LEXICONS.values() for words in lexicon.values() for word in words]
+    filler_words = ['그녀는', '천천히', '문을', '열었다', '하늘', '바람', 'the', 'city', 'night', 'said', '그리고', '눈빛']
+    words = []
+    length = 0
+    while length < num_chars:
+        word = rng.choice(lexicon_words) if rng.random() < 0.1 else rng.choice(filler_words)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)[:num_chars]
+
+def _write_novel(path, num_chars, seed=0):
+    """챕터 구분이 있는 합성 웹소설 파일 생성"""
+    chapter_size = 5000
+    with open(path, "w", encoding="utf-8") as f:
+        for idx, start in enumerate(range(0, num_chars, chapter_size), 1):
+            f.write(f"제 {idx} 장\n")
+            f.write(_sample_text(min(chapter_size, num_chars - start), seed + idx))
+            f.write("\n\n")
+
+def _synthetic_strip(width, height, seed=0):
+    """말풍선 비슷한 밝은 영역과 어두운 선이 있는 합성 웹툰 스트립 이미지"""
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(180, 256, size=(height, width, 3), dtype=np.uint8)
+    for y in range(0, height, 120):
+        pixels[y:y + 4, :, :] = 20
+    return Image.fromarray(pixels, 'RGB')
+
+def _synthetic_audio(seconds, sampling_rate=16000, seed=0):
+    """사인파와 잡음을 섞은 float32 오디오"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sampling_rate)) / sampling_rate
+    audio = 0.3 * np.sin(2 * np.pi * 440 * t) + 0.05 * rng.standard_normal(t.shape)
+    return audio.astype(np.float32)
+
+@benchmark('novel_processing')
+def bench_novel_processing(workdir, quick):
+    from novel_processor import process_novel_file
+    sizes = [20000] if quick else [20000, 200000, 2000000]
+    for size in sizes:
+        path = os.path.join(workdir, f"novel_{size}.txt")
+        _write_novel(path, size)
+        yield f"{size}_chars", lambda path=path: process_novel_file(path, use_cache=False), {'chars': size}
+
+@benchmark('lexicon_scoring')
+def bench_lexicon_scoring(workdir, quick):
+    from lexicon import score_categories, select_dominant
+    sizes = [20000] if quick else [20000, 200000, 2000000]
+    for size in sizes:
+        text = _sample_text(size)
+        yield f"{size}_chars", lambda text=text: select_dominant(score_categories(text)), {'chars': size}
+
+@benchmark('ocr_preprocess')
+def bench_ocr_preprocess(workdir, quick):
+    from webtoon_processor import preprocess_for_ocr
+    heights = [2000] if quick else [2000, 8000]
+    for height in heights:
+        strip = _synthetic_strip(800, height)
+        yield f"800x{height}", lambda strip=strip: preprocess_for_ocr(strip), {'width': 800, 'height': height}
+
+@benchmark('ocr_backend')
+def bench_ocr_backend(workdir, quick):
+    from PIL import Image, ImageDraw
+    from ocr_backend import OCR_BACKENDS
+    from webtoon_processor import OCR_LANG, preprocess_for_ocr
+    # 말풍선 정도 크기의 흰 바탕 텍스트 이미지 (이미지 한 장당 지연 시간 측정)
+    image = Image.new('RGB', (800, 300), 'white')
+    draw = ImageDraw.Draw(image)
+    for line, text in enumerate(["I can't believe you came back.", "We have to leave before the rain.", "Promise me."]):
+        draw.text((40, 40 + line * 80), text, fill='black')
+    binary_image = preprocess_for_ocr(image)
+
+    available = []
+    for name, backend_class in OCR_BACKENDS.items():
+        try:
+            backend = backend_class()
+            # 언어 데이터/실행 파일이 있는지 확인 (tesserocr는 여기서 엔진을 만들어 둠)
+            backend.image_to_text(binary_image, OCR_LANG)
+            available.append((name, backend))
+        except Exception as e:
+            print(f"ocr_backend/{name}: unavailable ({e})")
+    if not available:
+        raise ImportError("no OCR backend available (install tesserocr or the tesseract binary)")
+    for name, backend in available:
+        yield name, lambda backend=backend: backend.image_to_text(binary_image, OCR_LANG), {'backend': name, 'lang': OCR_LANG}
+
+@benchmark('group_image')
+def bench_group_image(workdir, quick):
+    from webtoon_processor import create_group_image
+    counts = [5] if quick else [5, 20]
+    for count in counts:
+        strips = [_synthetic_strip(800, 1500, seed) for seed in range(count)]
+        yield f"{count}_strips", lambda strips=strips: create_group_image(strips), {'images': count, 'height': 1500}
+
+@benchmark('image_mood')
+def bench_image_mood(workdir, quick):
+    from image_mood import extract_image_features, fit_mood_model, local_mood_keywords
+    # 밝은 스트립과 어두운 스트립을 두 분위기로 라벨링해 작은 분류기를 학습 (지연 시간 측정용, 정확도 의미 없음)
+    samples = []
+    for seed in range(10):
+        strip = _synthetic_strip(200, 400, seed)
+        samples.append((extract_image_features(strip), 'peaceful'))
+        samples.append((extract_image_features(strip.point(lambda value: value // 4)), 'mysterious'))
+    model = fit_mood_model(samples)
+    heights = [1500] if quick else [1500, 7500]
+    for height in heights:
+        strip = _synthetic_strip(800, height)
+        yield f"800x{height}", lambda strip=strip: local_mood_keywords(strip, model=model), {'width': 800, 'height': height}
+
+@benchmark('visualize_keywords')
+def bench_visualize_keywords(workdir, quick):
+    from utils import visualize_keywords, submit_visualization, wait_for_visualization
+    keywords = ['사랑', 'rain', 'memory', 'school', 'night', 'city', 'friend', 'letter', 'summer', 'sea'] * 3
+    output_path = os.path.join(workdir, "keywords.png")
+    yield "sync", lambda: visualize_keywords(keywords, output_path=output_path, use_cache=False), {'keywords': len(keywords)}
+
+    # 백그라운드로 맡기고 바로 돌아오는 데 걸리는 시간 (응답 경로에 남는 비용)
+    def submit_only():
+        future = submit_visualization(keywords, output_path=output_path, use_cache=False)
+        futures.append(future)
+
+    futures = []
+    yield "submit", submit_only, {'keywords': len(keywords)}
+    for future in futures:
+        wait_for_visualization(future)
+
+@benchmark('audio_assembly')
+def bench_audio_assembly(workdir, quick):
+    from music_generator import append_segment
+    seconds = 10 if quick else 30
+    segments = [_synthetic_audio(seconds, seed=seed) for seed in range(2 if quick else 6)]
+
+    def assemble():
+        combined = None
+        for data in segments:
+            combined = append_segment(combined, data, 16000)
+        return combined
+
+    yield f"{len(segments)}x{seconds}s", assemble, {'segments': len(segments), 'seconds': seconds}
+
+@benchmark('audio_encode')
+def bench_audio_encode(workdir, quick):
+    from music_generator import AUDIO_FORMATS, write_audio
+    seconds = 30 if quick else 180
+    data = _synthetic_audio(seconds)
+    for audio_format in sorted(AUDIO_FORMATS):
+        path = os.path.join(workdir, f"encoded.{audio_format}")
+        yield audio_format, lambda path=path, audio_format=audio_format: write_audio(path, data, 16000, audio_format), \
+            {'format': audio_format, 'seconds': seconds}
+
+@benchmark('normalize_audio')
+def bench_normalize_audio(workdir, quick):
+    import scipy.io.wavfile
+    from utils import normalize_audio
+    seconds = 30 if quick else 180
+    input_path = os.path.join(workdir, f"normalize_{seconds}s.wav")
+    data = (_synthetic_audio(seconds) * 32767).astype(np.int16)
+    scipy.io.wavfile.write(input_path, 16000, data)
+    output_path = os.path.join(workdir, "normalized.wav")
+    yield f"{seconds}s", lambda: normalize_audio(input_path, output_path), {'seconds': seconds}
+    yield f"{seconds}s_lufs", lambda: normalize_audio(input_path, output_path, method='lufs'), \
+        {'seconds': seconds, 'method': 'lufs'}
+
+@benchmark('audio_preview')
+def bench_audio_preview(workdir, quick):
+    import scipy.io.wavfile
+    from utils import create_audio_preview
+    # 미리듣기 시간은 원본 길이가 아니라 미리듣기 길이에 비례해야 함
+    for seconds in ((60,) if quick else (60, 600)):
+        input_path = os.path.join(workdir, f"preview_{seconds}s.wav")
+        scipy.io.wavfile.write(input_path, 16000, (_synthetic_audio(seconds) * 32767).astype(np.int16))
+        output_path = os.path.join(workdir, "preview.wav")
+        yield f"{seconds}s", lambda input_path=input_path, output_path=output_path: \
+            create_audio_preview(input_path, output_path), {'seconds': seconds}
+
+class _StubProcessor:
+    """토크나이저 없이 문자 코드로 입력 ID를 만드는 벤치마크용 프로세서"""
+
+    def __init__(self, vocab_size):
+        self.vocab_size = vocab_size
+
+    def __call__(self, text, padding=True, return_tensors="pt"):
+        import torch
+        ids = [[ord(c) % (self.vocab_size - 1) + 1 for c in t[:64]] for t in text]
+        max_len = max(len(row) for row in ids)
+        input_ids = torch.zeros((len(ids), max_len), dtype=torch.long)
+        attention_mask = torch.zeros((len(ids), max_len), dtype=torch.long)
+        for i, row in enumerate(ids):
+            input_ids[i, :len(row)] = torch.tensor(row)
+            attention_mask[i, :len(row)] = 1
+        return {'input_ids': input_ids, 'attention_mask': attention_mask}
+
+def build_tiny_musicgen(seed=0):
+    """
+    무작위로 초기화된 아주 작은 MusicGen 모델을 만듭니다 (다운로드 없음).
+
+    Returns:
+        tuple: (processor, model)
+    """
+    import torch
+    from transformers import (EncodecConfig, MusicgenConfig, MusicgenDecoderConfig,
+                              MusicgenForConditionalGeneration, T5Config)
+    text_config = T5Config(vocab_size=128, d_model=16, d_ff=32, num_layers=1, num_heads=2, d_kv=8)
+    audio_config = EncodecConfig(hidden_size=16, num_filters=4, codebook_size=64, num_lstm_layers=1,
+                                 compress=1, sampling_rate=32000, target_bandwidths=[2.2])
+    decoder_config = MusicgenDecoderConfig(vocab_size=64, hidden_size=16, num_hidden_layers=1,
+                                           num_attention_heads=2, ffn_dim=32, num_codebooks=2,
+                                           pad_token_id=64, decoder_start_token_id=64, bos_token_id=64,
+                                           tie_word_embeddings=False)
+    config = MusicgenConfig(text_encoder=text_config.to_dict(), audio_encoder=audio_config.to_dict(),
+                            decoder=decoder_config.to_dict())
+    torch.manual_seed(seed)
+    return _StubProcessor(text_config.vocab_size), MusicgenForConditionalGeneration(config).eval()
+
+@benchmark('generate_music')
+def bench_generate_music(workdir, quick):
+    import torch
+    from music_generator import generate_music, use_musicgen_model
+    use_musicgen_model(*build_tiny_musicgen())
+    output_path = os.path.join(workdir, "tiny_music.wav")
+
+    def run():
+        torch.manual_seed(0)
+        random.seed(0)
+        return generate_music(['love', 'rain', 'memory'], 'romance', 'sad', 'modern', 'acoustic',
+                              output_path, use_cache=False)
+
+    yield "tiny_random_model", run, {'model': 'tiny-random'}
+
+@benchmark('musicgen_cold_start')
+def bench_musicgen_cold_start(workdir, quick):
+    from transformers import MusicgenForConditionalGeneration
+    from musicgen_loader import load_musicgen_weights
+    model_dir = os.path.join(workdir, "tiny_musicgen")
+    build_tiny_musicgen()[1].save_pretrained(model_dir, safe_serialization=True)
+    yield "from_pretrained", lambda: MusicgenForConditionalGeneration.from_pretrained(model_dir, local_files_only=True), {'model': 'tiny-random'}
+    yield "mmap_assign", lambda: load_musicgen_weights(model_dir), {'model': 'tiny-random'}
+    yield "mmap_assign_lazy_codec", lambda: load_musicgen_weights(model_dir, lazy_codec=True), {'model': 'tiny-random'}
+
+def _time_case(func, repeat, warmup):
+    """워밍업 후 repeat번 실행해 각 실행 시간(초)을 반환"""
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+def run_benchmarks(names=None, quick=False, repeat=5, warmup=1):
+    """
+    벤치마크를 실행합니다. 필요한 라이브러리가 없는 벤치마크는 skipped로 기록됩니다.
+
+    Args:
+        names (list): 실행할 벤치마크 이름 (None이면 전체)
+        quick (bool): 작은 입력만 사용
+        repeat (int): 케이스별 반복 횟수
+        warmup (int): 측정 전 워밍업 횟수
+
+    Returns:
+        dict: 실행 환경과 케이스별 결과
+    """
+    random.seed(0)
+    np.random.seed(0)
+    results = []
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="lyr_bench_") as workdir:
+        # 각 모듈이 만드는 cache/ 디렉토리가 작업 트리를 건드리지 않도록 임시 디렉토리에서 실행
+        os.chdir(workdir)
+        try:
+            for name, factory in BENCHMARKS.items():
+                if names and name not in names:
+                    continue
+                try:
+                    for case, func, params in factory(workdir, quick):
+                        times = _time_case(func, repeat, warmup)
+                        result = {
+                            'benchmark': name,
+                            'case': case,
+                            'params': params,
+                            'repeat': repeat,
+                            'times': times,
+                            'min': min(times),
+                            'median': statistics.median(times),
+                            'mean': statistics.mean(times)
+                        }
+                        results.append(result)
+                        print(f"{name}/{case}: median {result['median'] * 1000:.2f} ms (min {result['min'] * 1000:.2f} ms)")
+                except ImportError as e:
+                    print(f"{name}: skipped ({e})")
+                    results.append({'benchmark': name, 'case': None, 'skipped': str(e)})
+                except Exception as e:
+                    print(f"{name}: failed ({e})")
+                    traceback.print_exc()
+                    results.append({'benchmark': name, 'case': None, 'error': str(e)})
+        finally:
+            os.chdir(original_cwd)
+
+    return {
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'environment': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'quick': quick
+        },
+        'results': results
+    }
+
+def compare_results(base, new, threshold=0.10):
+    """
+    두 벤치마크 결과의 케이스별 중앙값을 비교합니다.
+
+    Args:
+        base (dict): 기준 결과
+        new (dict): 새 결과
+        threshold (float): 회귀로 판단할 상대 증가율 (0.10 = 10% 느려짐)
+
+    Returns:
+        list: 회귀한 케이스 이름 리스트
+    """
+    def index(data):
+        return {f"{r['benchmark']}/{r['case']}": r for r in data['results'] if r.get('case') and 'median' in r}
+
+    base_index = index(base)
+    new_index = index(new)
+    regressions = []
+
+    print(f"{'case':<40}{'base(ms)':>12}{'new(ms)':>12}{'change':>10}  status")
+    for key in sorted(set(base_index) | set(new_index)):
+        if key not in base_index or key not in new_index:
+            print(f"{key:<40}{'':>12}{'':>12}{'':>10}  {'new' if key in new_index else 'missing'}")
+            continue
+        base_median = base_index[key]['median']
+        new_median = new_index[key]['median']
+        change = (new_median - base_median) / base_median if base_median > 0 else 0.0
+        if change > threshold:
+            status = "REGRESSION"
+            regressions.append(key)
+        elif change < -threshold:
+            status = "improved"
+        else:
+            status = "ok"
+        print(f"{key:<40}{base_median * 1000:>12.2f}{new_median * 1000:>12.2f}{change:>10.1%}  {status}")
+
+    print(f"{len(regressions)} regression(s) over {threshold:.0%} threshold")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline micro/macro benchmarks for the music generation pipeline')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run benchmarks and write results as JSON')
+    run_parser.add_argument('--output', default='benchmark_results.json', help='Output JSON path')
+    run_parser.add_argument('--only', default=None, help=f"Comma-separated benchmarks: {','.join(BENCHMARKS)}")
+    run_parser.add_argument('--quick', action='store_true', help='Use small inputs only')
+    run_parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case')
+    run_parser.add_argument('--warmup', type=int, default=1, help='Untimed warm-up runs per case')
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two result files and flag regressions')
+    compare_parser.add_argument('base', help='Baseline results JSON')
+    compare_parser.add_argument('new', help='New results JSON')
+    compare_parser.add_argument('--threshold', type=float, default=0.10, help='Relative slowdown flagged as regression')
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        names = args.only.split(',') if args.only else None
+        results = run_benchmarks(names, quick=args.quick, repeat=args.repeat, warmup=args.warmup)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Benchmark results saved to {args.output}")
+    else:
+        with open(args.base, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.new, "r", encoding="utf-8") as f:
+            new = json.load(f)
+        regressions = compare_results(base, new, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+from collections import Counter
+import metrics
+from lexicon import LEXICONS, score_categories
+
+CHAPTER_CACHE_DIR = os.path.join("cache", "chapters")
+
+# 전처리/렉시콘/후보 추출 방식이 바뀌면 올려서 이전 챕터 캐시를 무효화
+CHAPTER_ANALYSIS_VERSION = 1
+
+# KeyBERT에 넘길 후보 구문 수 (전체 챕터에서 많이 나온 순)
+MAX_CANDIDATES = 1000
+
+# 문서 임베딩에 쓸 전처리 텍스트 길이. 문장 임베딩 모델은 앞부분 토큰(256개)까지만 보므로
+# 이보다 긴 텍스트를 넘겨도 결과가 같음
+DOC_PREFIX_CHARS = 4000
+
+def _chapter_cache_path(text, config):
+    """챕터 내용과 분석 설정으로 캐시 파일 경로를 만든다"""
+    key = hashlib.md5(f"{CHAPTER_ANALYSIS_VERSION}|{config}|{text}".encode("utf-8")).hexdigest()
+    return os.path.join(CHAPTER_CACHE_DIR, f"{key}.json")
+
+def count_candidates(processed_text, stop_words):
+    """
+    KeyBERT와 같은 CountVectorizer 설정으로 후보 구문(1~2gram)별 등장 횟수를 셉니다.
+
+    Returns:
+        dict: 구문 → 등장 횟수
+    """
+    from sklearn.feature_extraction.text import CountVectorizer
+    vectorizer = CountVectorizer(ngram_range=(1, 2), stop_words=stop_words)
+    try:
+        counts = vectorizer.fit_transform([processed_text])
+    except ValueError:
+        # 불용어만 있거나 빈 챕터
+        return {}
+    return dict(zip(vectorizer.get_feature_names_out().tolist(), counts.toarray()[0].tolist()))
+
+def analyze_chapter(text, preprocess, config="", use_cache=True):
+    """
+    챕터 하나의 렉시콘 점수와 후보 구문 횟수를 계산합니다. 결과는 챕터 내용 해시로 캐시됩니다.
+
+    Args:
+        text (str): 챕터 본문
+        preprocess (callable): 소문자 텍스트 → (전처리된 텍스트, 불용어 리스트)
+        config (str): 전처리 설정 식별자 (형태소 분석기 사용 여부 등, 캐시 키에 포함)
+        use_cache (bool): 캐시 사용 여부
+
+    Returns:
+        dict: {'lexicon': 카테고리 → (항목 → 점수), 'candidates': 구문 → 횟수, 'doc_prefix': 전처리 텍스트 앞부분}
+    """
+    cache_path = _chapter_cache_path(text, config)
+    if use_cache and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+            metrics.increment('cache_hits_total', cache='chapter')
+            return record
+        except Exception as e:
+            print(f"Error loading chapter cache: {e}")
+    if use_cache:
+        metrics.increment('cache_misses_total', cache='chapter')
+
+    with metrics.timer('chapter_analysis'):
+        lowered = text.lower()
+        processed_text, stop_words = preprocess(lowered)
+        record = {
+            'lexicon': score_categories(lowered),
+            'candidates': count_candidates(processed_text, stop_words),
+            'doc_prefix': processed_text[:DOC_PREFIX_CHARS]
+        }
+
+    if use_cache:
+        try:
+            os.makedirs(CHAPTER_CACHE_DIR, exist_ok=True)
+            temp_path = cache_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(record, f, ensure_ascii=False)
+            os.replace(temp_path, cache_path)
+        except Exception as e:
+            print(f"Error saving chapter cache: {e}")
+    return record
+
+def aggregate_chapters(records, max_candidates=MAX_CANDIDATES):
+    """
+    챕터별 결과를 합칩니다. 점수와 후보 횟수는 더할 수 있으므로 새 챕터가 붙어도 그 챕터만 분석하면 됩니다.
+
+    Returns:
+        tuple: (score_categories 형식의 점수, 많이 나온 순 후보 구문 리스트, 문서 임베딩용 텍스트)
+    """
+    scores = {name: {category: 0 for category in lexicon} for name, (lexicon, _) in LEXICONS.items()}
+    candidates = Counter()
+    doc_parts = []
+    doc_length = 0
+    for record in records:
+        for name, category_scores in record['lexicon'].items():
+            for category, score in category_scores.items():
+                scores[name][category] += score
+        candidates.update(record['candidates'])
+        if doc_length < DOC_PREFIX_CHARS and record['doc_prefix']:
+            doc_parts.append(record['doc_prefix'])
+            doc_length += len(record['doc_prefix']) + 1
+    doc = ' '.join(doc_parts)[:DOC_PREFIX_CHARS]
+    return scores, [phrase for phrase, _ in candidates.most_common(max_candidates)], doc
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+import metrics
+
+EMBEDDING_STORE_DIR = os.path.join("cache", "embeddings")
+
+# 저장할 최대 임베딩 수. 가득 차면 가장 먼저 저장한 것부터 덮어씀 (FIFO)
+DEFAULT_MAX_ENTRIES = 200000
+
+# 벡터 파일을 처음 만들 때의 행 수 (부족하면 두 배씩 늘림)
+INITIAL_CAPACITY = 4096
+
+def text_key(text):
+    """텍스트의 64비트 해시 키 (0은 빈 슬롯 표시로 쓰므로 제외)"""
+    key = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    return key or 1
+
+class EmbeddingStore:
+    """
+    텍스트 → 임베딩 디스크 캐시.
+    벡터는 float16 메모리 맵 파일(vectors.f16)에, 슬롯별 텍스트 해시는 keys.npy에 저장하고
+    불러올 때 해시 → 슬롯 딕셔너리를 만듭니다. 한 프로세스가 쓰는 것을 전제로 합니다.
+
+    Args:
+        directory (str): 저장 디렉토리
+        model_name (str): 임베딩 모델 이름 (다른 모델로 만든 저장소는 비우고 새로 시작)
+        max_entries (int): 최대 임베딩 수
+    """
+
+    def __init__(self, directory=EMBEDDING_STORE_DIR, model_name="default", max_entries=DEFAULT_MAX_ENTRIES):
+        self.directory = directory
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._vectors_path = os.path.join(directory, "vectors.f16")
+        self._keys_path = os.path.join(directory, "keys.npy")
+        self._meta_path = os.path.join(directory, "meta.json")
+
+        self.dim = None
+        self.next_slot = 0
+        self._keys = np.zeros(0, dtype=np.uint64)
+        self._vectors = None
+        self._index = {}
+        try:
+            self._load()
+        except Exception as e:
+            print(f"Error loading embedding store, starting empty: {e}")
+            self.dim, self.next_slot, self._keys, self._vectors, self._index = None, 0, np.zeros(0, dtype=np.uint64), None, {}
+
+    def _load(self):
+        if not (os.path.exists(self._meta_path) and os.path.exists(self._keys_path)
+                and os.path.exists(self._vectors_path)):
+            return
+        with open(self._meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("model") != self.model_name:
+            print(f"Embedding store was built with {meta.get('model')}, starting empty")
+            return
+        self.dim = meta["dim"]
+        self.next_slot = meta["next_slot"]
+        self._keys = np.load(self._keys_path)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float16, mode="r+", shape=(len(self._keys), self.dim))
+        self._index = {int(key): slot for slot, key in enumerate(self._keys) if key}
+
+    def __len__(self):
+        return len(self._index)
+
+    def _ensure_capacity(self, rows):
+        """벡터 파일을 rows행 이상으로 늘림 (최대 max_entries)"""
+        capacity = len(self._keys)
+        if rows <= capacity:
+            return
+        new_capacity = min(self.max_entries, max(rows, capacity * 2, INITIAL_CAPACITY))
+        os.makedirs(self.directory, exist_ok=True)
+        if self._vectors is not None:
+            self._vectors.flush()
+            del self._vectors
+        # 새로 시작하는 경우에는 이전 파일 내용을 버림
+        with open(self._vectors_path, "ab" if capacity else "wb") as f:
+            f.truncate(new_capacity * self.dim * 2)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float16, mode="r+", shape=(new_capacity, self.dim))
+        self._keys = np.concatenate([self._keys, np.zeros(new_capacity - capacity, dtype=np.uint64)])
+
+    def _put(self, key, vector):
+        if key in self._index:
+            return
+        slot = self.next_slot % self.max_entries
+        self._ensure_capacity(slot + 1)
+        old_key = int(self._keys[slot])
+        if old_key:
+            del self._index[old_key]
+            self.evictions += 1
+            metrics.increment('embedding_store_evictions_total')
+        self._vectors[slot] = vector
+        self._keys[slot] = key
+        self._index[key] = slot
+        self.next_slot += 1
+
+    def _save(self):
+        """벡터를 디스크에 반영하고 키와 메타데이터를 원자적으로 저장"""
+        if self._vectors is None:
+            return
+        self._vectors.flush()
+        temp_keys = self._keys_path + ".tmp.npy"
+        np.save(temp_keys, self._keys)
+        os.replace(temp_keys, self._keys_path)
+        temp_meta = self._meta_path + ".tmp"
+        with open(temp_meta, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "dim": self.dim, "next_slot": self.next_slot,
+                       "max_entries": self.max_entries}, f)
+        os.replace(temp_meta, self._meta_path)
+
+    def embed(self, texts, compute):
+        """
+        텍스트 임베딩을 저장소에서 찾고, 없는 것만 compute로 계산해 저장합니다.
+
+        Args:
+            texts (list): 텍스트 리스트
+            compute (callable): 텍스트 리스트 → (개수, 차원) 배열
+
+        Returns:
+            numpy.ndarray: (개수, 차원) float32 배열 (texts 순서)
+        """
+        texts = list(texts)
+        keys = [text_key(text) for text in texts]
+        with self._lock:
+            missing = [i for i, key in enumerate(keys) if key not in self._index]
+            # 저장된 벡터는 먼저 복사 (이번 호출에서 FIFO로 밀려나더라도 값은 유지)
+            found = {i: np.asarray(self._vectors[self._index[key]], dtype=np.float32)
+                     for i, key in enumerate(keys) if key in self._index}
+
+        computed = None
+        if missing:
+            computed = np.asarray(compute([texts[i] for i in missing]), dtype=np.float32)
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(missing)
+            metrics.increment('cache_hits_total', len(found), cache='embedding')
+            metrics.increment('cache_misses_total', len(missing), cache='embedding')
+            if computed is not None:
+                if self.dim is None:
+                    self.dim = computed.shape[1]
+                for row, i in enumerate(missing):
+                    self._put(keys[i], computed[row])
+                try:
+                    self._save()
+                except Exception as e:
+                    print(f"Error saving embedding store: {e}")
+
+        result = np.empty((len(texts), self.dim or 0), dtype=np.float32)
+        for i, vector in found.items():
+            result[i] = vector
+        for row, i in enumerate(missing):
+            result[i] = computed[row]
+        return result
+
+    def stats(self):
+        """적중률과 크기 통계"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else None,
+            'evictions': self.evictions,
+            'size_mb': os.path.getsize(self._vectors_path) / (1024 * 1024) if os.path.exists(self._vectors_path) else 0.0
+        }
+
+_embedding_stores = {}
+_embedding_stores_lock = threading.Lock()
+
+def get_embedding_store(model_name="default"):
+    """모델별 EmbeddingStore를 프로세스당 한 번만 만들어 재사용"""
+    with _embedding_stores_lock:
+        if model_name not in _embedding_stores:
+            directory = os.path.join(EMBEDDING_STORE_DIR, hashlib.md5(model_name.encode()).hexdigest()[:12])
+            _embedding_stores[model_name] = EmbeddingStore(directory, model_name=model_name)
+        return _embedding_stores[model_name]
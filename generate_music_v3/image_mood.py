@@ -0,0 +1,366 @@
+import argparse
+import json
+import os
+import threading
+import time
+import numpy as np
+import metrics
+
+# 특징을 계산할 때 이미지의 긴 변을 이 크기로 줄임 (통계에는 충분하고 계산량은 일정)
+FEATURE_MAX_SIDE = 256
+
+# 색상 히스토그램 구간 수 (HSV 색상환)
+HUE_BINS = 12
+
+# 에지로 볼 밝기 기울기 (0~1 밝기 기준)
+EDGE_THRESHOLD = 0.1
+
+# --local_mood를 값 없이 줬을 때의 최소 신뢰도. 학습할 때 보정한 모델 임계값보다 낮으면 모델 값을 사용
+LOCAL_MOOD_CONFIDENCE = 0.6
+
+# fit으로 만든 분류기 파일 (라벨이 붙은 패널로 학습/검증, 없으면 로컬 분류를 쓰지 않음)
+MOOD_MODEL_PATH = os.environ.get("IMAGE_MOOD_MODEL", os.path.join("cache", "image_mood_model.json"))
+
+# 학습 이미지 중 검증용으로 떼어 둘 간격 (분위기별로 HOLDOUT_EVERY장마다 한 장)
+HOLDOUT_EVERY = 5
+
+# 보정 목표: 로컬 결과를 쓰는 이미지 중 이 비율 이상이 검증 라벨과 맞도록 신뢰도 임계값을 정함
+TARGET_PRECISION = 0.9
+
+# 학습 이미지에서 자기 분위기 대표값까지 거리의 이 분위수보다 멀면 어느 분위기와도 닮지 않은 것으로 보고 신뢰도 0
+MAX_DISTANCE_QUANTILE = 0.95
+
+# 분류기가 사용하는 특징 (순서대로 벡터를 만듦)
+FEATURE_NAMES = ('brightness', 'saturation', 'contrast', 'edge_density', 'warmth', 'dark_ratio',
+                 'brightness_std', 'saturation_std')
+
+# 라벨 디렉토리에서 읽을 이미지 확장자
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+_mood_model = None
+_mood_model_loaded = False
+_mood_model_lock = threading.Lock()
+
+def _rgb_array(image):
+    """PIL 이미지를 긴 변 FEATURE_MAX_SIDE 이하의 0~1 float32 RGB 배열로 변환"""
+    image = image.convert('RGB')
+    scale = FEATURE_MAX_SIDE / max(image.size)
+    if scale < 1:
+        image = image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))))
+    return np.asarray(image, dtype=np.float32) / 255.0
+
+def extract_image_features(image):
+    """
+    이미지의 색/밝기/대비/에지 특징을 NumPy로 계산합니다.
+
+    Args:
+        image (PIL.Image): 분석할 이미지
+
+    Returns:
+        dict: 특징 이름 → 값 (FEATURE_NAMES 항목과 'hue_histogram', 'brightness_std', 'saturation_std')
+    """
+    rgb = _rgb_array(image)
+    max_c = rgb.max(axis=2)
+    min_c = rgb.min(axis=2)
+    chroma = max_c - min_c
+
+    # HSV 밝기/채도
+    value = max_c
+    saturation = np.where(max_c > 0, chroma / np.maximum(max_c, 1e-6), 0.0)
+
+    # HSV 색상 (0~1), 채도로 가중한 히스토그램
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    safe_chroma = np.maximum(chroma, 1e-6)
+    hue = np.where(max_c == r, ((g - b) / safe_chroma) % 6,
+                   np.where(max_c == g, (b - r) / safe_chroma + 2, (r - g) / safe_chroma + 4)) / 6.0
+    hue_histogram, _ = np.histogram(hue, bins=HUE_BINS, range=(0.0, 1.0), weights=saturation)
+    total = hue_histogram.sum()
+    hue_histogram = hue_histogram / total if total > 0 else hue_histogram
+
+    # 따뜻한 색(빨강~노랑, 자주) 비율
+    warm_bins = np.zeros(HUE_BINS, dtype=bool)
+    warm_bins[:2] = True
+    warm_bins[-1] = True
+    warmth = float(hue_histogram[warm_bins].sum()) if total > 0 else 0.5
+
+    # 밝기 기울기로 에지 밀도 계산
+    luminance = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    grad_y = np.abs(np.diff(luminance, axis=0))[:, :-1]
+    grad_x = np.abs(np.diff(luminance, axis=1))[:-1, :]
+    edge_density = float(np.mean((grad_x + grad_y) > EDGE_THRESHOLD)) if grad_x.size else 0.0
+
+    return {
+        'brightness': float(value.mean()),
+        'brightness_std': float(value.std()),
+        'saturation': float(saturation.mean()),
+        'saturation_std': float(saturation.std()),
+        # 밝기 표준편차 0.5가 최대 대비에 해당
+        'contrast': min(1.0, float(luminance.std()) * 2),
+        'edge_density': edge_density,
+        'warmth': warmth,
+        'dark_ratio': float(np.mean(luminance < 0.25)),
+        'hue_histogram': hue_histogram.tolist()
+    }
+
+def feature_vector(features):
+    """특징 딕셔너리를 분류기 입력 벡터로 변환"""
+    return np.array([features[name] for name in FEATURE_NAMES], dtype=np.float32)
+
+def _distances(model, vector):
+    """표준화한 특징 공간에서 각 분위기 대표값까지의 제곱거리"""
+    scaled = (vector - model['mean']) / model['scale']
+    diff = model['centroids'] - scaled
+    return np.einsum('ij,ij->i', diff, diff)
+
+def classify_mood(features, model):
+    """
+    특징을 가장 가까운 분위기 대표값으로 분류합니다.
+
+    Args:
+        features (dict): extract_image_features 결과
+        model (dict): fit_mood_model/load_mood_model로 만든 분류기
+
+    Returns:
+        tuple: (분위기, 신뢰도, 분위기 → 확률 딕셔너리)
+    """
+    distances = _distances(model, feature_vector(features))
+    logits = -distances / model['temperature']
+    probabilities = np.exp(logits - logits.max())
+    probabilities /= probabilities.sum()
+    best = int(np.argmax(probabilities))
+    confidence = float(probabilities[best]) if distances[best] <= model['max_distance'] else 0.0
+    return model['moods'][best], confidence, dict(zip(model['moods'], probabilities.tolist()))
+
+def _calibrate_threshold(confidences, correct, target_precision):
+    """
+    검증 결과로 신뢰도 임계값을 정합니다. 임계값 이상인 이미지의 정확도가 target_precision 이상인
+    가장 낮은 임계값 (로컬 처리 비율이 가장 큼)을 고르고, 그런 값이 없으면 None
+    """
+    order = np.argsort(-confidences)
+    hits = np.cumsum(correct[order])
+    counts = np.arange(1, len(order) + 1)
+    threshold = None
+    for idx in range(len(order)):
+        confidence = confidences[order[idx]]
+        # 같은 신뢰도가 이어지면 마지막 위치에서만 판단 (임계값은 같은 값을 모두 포함)
+        if confidence <= 0 or (idx + 1 < len(order) and confidences[order[idx + 1]] == confidence):
+            continue
+        if hits[idx] / counts[idx] >= target_precision:
+            threshold = float(confidence)
+    return threshold
+
+def evaluate_mood_model(model, samples, threshold=None):
+    """
+    라벨이 붙은 특징으로 분류기를 평가합니다.
+
+    Args:
+        model (dict): 분류기
+        samples (list): (특징 딕셔너리, 분위기 라벨) 리스트
+        threshold (float): 로컬 결과를 쓸 신뢰도 (None이면 모델 임계값)
+
+    Returns:
+        dict: images, accuracy(전체 1순위 정확도), threshold, local_share(로컬 처리 = 생략된 API 호출 비율),
+              local_precision(로컬 처리한 이미지의 정확도)
+    """
+    threshold = model['threshold'] if threshold is None else threshold
+    results = [classify_mood(features, model)[:2] + (label,) for features, label in samples]
+    correct = np.array([mood == label for mood, _, label in results], dtype=bool)
+    confidences = np.array([confidence for _, confidence, _ in results], dtype=np.float32)
+    accepted = confidences >= threshold if threshold is not None else np.zeros(len(results), dtype=bool)
+    return {
+        'images': len(results),
+        'accuracy': float(correct.mean()) if len(results) else None,
+        'threshold': threshold,
+        'local_share': float(accepted.mean()) if len(results) else None,
+        'local_precision': float(correct[accepted].mean()) if accepted.any() else None
+    }
+
+def fit_mood_model(samples, holdout_every=HOLDOUT_EVERY, target_precision=TARGET_PRECISION):
+    """
+    라벨이 붙은 패널 특징으로 nearest-centroid 분류기를 학습하고 검증 세트로 신뢰도 임계값을 보정합니다.
+    특징은 학습 세트의 평균/표준편차로 표준화하고, 분위기별 대표값은 학습 세트 평균입니다.
+
+    Args:
+        samples (list): (특징 딕셔너리, 분위기 라벨) 리스트
+        holdout_every (int): 분위기별로 이 간격마다 한 장을 검증용으로 사용
+        target_precision (float): 로컬 결과를 쓰는 이미지의 목표 정확도
+
+    Returns:
+        dict: 분류기 (moods, mean, scale, centroids, temperature, max_distance, threshold, validation)
+    """
+    by_mood = {}
+    for features, label in samples:
+        by_mood.setdefault(label, []).append(features)
+    train, holdout = [], []
+    for label, items in sorted(by_mood.items()):
+        if len(items) < holdout_every:
+            raise ValueError(f"Need at least {holdout_every} labelled images per mood, '{label}' has {len(items)}")
+        for idx, features in enumerate(items):
+            (holdout if idx % holdout_every == holdout_every - 1 else train).append((features, label))
+
+    moods = sorted(by_mood)
+    vectors = np.stack([feature_vector(features) for features, _ in train])
+    labels = np.array([moods.index(label) for _, label in train])
+    mean = vectors.mean(axis=0)
+    scale = np.maximum(vectors.std(axis=0), 1e-3)
+    scaled = (vectors - mean) / scale
+    centroids = np.stack([scaled[labels == idx].mean(axis=0) for idx in range(len(moods))])
+    own_distances = np.einsum('ij,ij->i', scaled - centroids[labels], scaled - centroids[labels])
+
+    model = {
+        'moods': moods,
+        'mean': mean,
+        'scale': scale,
+        'centroids': centroids,
+        # 자기 분위기까지의 전형적인 거리로 softmax 폭을 맞춤
+        'temperature': max(float(np.median(own_distances)), 1e-3),
+        'max_distance': float(np.quantile(own_distances, MAX_DISTANCE_QUANTILE)),
+        'threshold': None
+    }
+    results = [classify_mood(features, model)[:2] for features, _ in holdout]
+    correct = np.array([mood == label for (mood, _), (_, label) in zip(results, holdout)], dtype=bool)
+    confidences = np.array([confidence for _, confidence in results], dtype=np.float32)
+    model['threshold'] = _calibrate_threshold(confidences, correct, target_precision)
+    model['validation'] = evaluate_mood_model(model, holdout)
+    model['validation'].update({'train_images': len(train), 'target_precision': target_precision})
+    return model
+
+def save_mood_model(model, path=MOOD_MODEL_PATH):
+    """분류기를 JSON으로 저장"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    data = {key: value.tolist() if isinstance(value, np.ndarray) else value for key, value in model.items()}
+    data['features'] = list(FEATURE_NAMES)
+    data['created_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return path
+
+def load_mood_model(path=MOOD_MODEL_PATH):
+    """
+    fit으로 저장한 분류기를 불러옵니다.
+
+    Returns:
+        dict: 분류기 (파일이 없거나 특징 구성이 다르면 None)
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if tuple(data.get('features', ())) != FEATURE_NAMES:
+        print(f"Image mood model {path} was fitted on different features, refit it (python image_mood.py fit ...)")
+        return None
+    for key in ('mean', 'scale', 'centroids'):
+        data[key] = np.array(data[key], dtype=np.float32)
+    return data
+
+def get_mood_model():
+    """MOOD_MODEL_PATH의 분류기를 프로세스당 한 번만 불러옴 (없으면 None)"""
+    global _mood_model, _mood_model_loaded
+    with _mood_model_lock:
+        if not _mood_model_loaded:
+            _mood_model = load_mood_model()
+            _mood_model_loaded = True
+            if _mood_model is None:
+                print(f"No fitted image mood model at {MOOD_MODEL_PATH}, local mood classification is disabled "
+                      f"(fit one with: python image_mood.py fit <labelled_dir>)")
+            elif _mood_model['threshold'] is None:
+                print(f"Image mood model did not reach its target precision on validation, local mood classification is disabled")
+        return _mood_model
+
+def local_mood_keywords(image, threshold=LOCAL_MOOD_CONFIDENCE, model=None):
+    """
+    로컬 특징만으로 분위기 키워드를 추정합니다.
+
+    Args:
+        image (PIL.Image): 분석할 이미지
+        threshold (float): 결과를 사용할 최소 신뢰도 (모델의 보정 임계값보다 낮으면 보정 임계값 사용)
+        model (dict): 분류기 (None이면 get_mood_model)
+
+    Returns:
+        tuple: (키워드 리스트 또는 사용할 수 없으면 None, 분위기, 신뢰도)
+    """
+    model = model or get_mood_model()
+    if model is None or model['threshold'] is None:
+        return None, None, 0.0
+    threshold = max(threshold, model['threshold'])
+
+    with metrics.timer('image_mood_local'):
+        features = extract_image_features(image)
+        mood, confidence, probabilities = classify_mood(features, model)
+    metrics.observe('image_mood_confidence', confidence, buckets=(0.2, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0))
+    if confidence < threshold:
+        return None, mood, confidence
+
+    keywords = [mood]
+    # 두 번째로 가까운 분위기도 충분히 가능성이 있으면 함께 사용
+    runner_up = sorted(probabilities.items(), key=lambda x: x[1], reverse=True)[1]
+    if runner_up[1] >= 0.2:
+        keywords.append(runner_up[0])
+    keywords.append('bright' if features['brightness'] > 0.6 else 'dark' if features['brightness'] < 0.35 else 'muted')
+    return keywords, mood, confidence
+
+def load_labelled_features(labelled_dir):
+    """
+    <labelled_dir>/<분위기>/*.jpg 구조의 라벨 패널에서 특징을 계산합니다.
+
+    Returns:
+        tuple: ((특징 딕셔너리, 분위기 라벨) 리스트, 이미지당 특징 계산 시간 리스트(초))
+    """
+    from PIL import Image
+    samples, seconds = [], []
+    for label in sorted(os.listdir(labelled_dir)):
+        mood_dir = os.path.join(labelled_dir, label)
+        if not os.path.isdir(mood_dir):
+            continue
+        for name in sorted(os.listdir(mood_dir)):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            with Image.open(os.path.join(mood_dir, name)) as image:
+                start = time.perf_counter()
+                features = extract_image_features(image)
+                seconds.append(time.perf_counter() - start)
+            samples.append((features, label))
+    return samples, seconds
+
+def _print_report(title, report, seconds):
+    def fmt(value):
+        return f"{value:.1%}" if value is not None else "-"
+    threshold = f"{report['threshold']:.2f}" if report['threshold'] is not None else "none (local path disabled)"
+    print(f"{title}: {report['images']} images, top-1 accuracy {fmt(report['accuracy'])}, threshold {threshold}")
+    print(f"  vision calls avoided: {fmt(report['local_share'])}, accuracy of local results: {fmt(report['local_precision'])}")
+    if seconds:
+        print(f"  features per image: {1000 * float(np.mean(seconds)):.1f} ms mean, {1000 * float(np.max(seconds)):.1f} ms max")
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit and evaluate the local image mood classifier on labelled panels')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    fit_parser = subparsers.add_parser('fit', help='Fit on <labelled_dir>/<mood>/*.jpg and calibrate the confidence threshold')
+    fit_parser.add_argument('labelled_dir')
+    fit_parser.add_argument('--output', default=MOOD_MODEL_PATH, help='Model file path')
+    fit_parser.add_argument('--target_precision', type=float, default=TARGET_PRECISION,
+                            help='Required accuracy of the images answered locally (on the validation split)')
+    fit_parser.add_argument('--holdout_every', type=int, default=HOLDOUT_EVERY, help='Use every Nth image per mood for validation')
+
+    evaluate_parser = subparsers.add_parser('evaluate', help='Evaluate a fitted model on another labelled directory')
+    evaluate_parser.add_argument('labelled_dir')
+    evaluate_parser.add_argument('--model', default=MOOD_MODEL_PATH)
+    evaluate_parser.add_argument('--threshold', type=float, default=None, help='Confidence threshold (default: the calibrated one)')
+
+    args = parser.parse_args()
+    samples, seconds = load_labelled_features(args.labelled_dir)
+    if args.command == 'fit':
+        model = fit_mood_model(samples, args.holdout_every, args.target_precision)
+        save_mood_model(model, args.output)
+        _print_report(f"Validation ({model['validation']['train_images']} training images)", model['validation'], seconds)
+        print(f"Model saved to {args.output}")
+    else:
+        model = load_mood_model(args.model)
+        if model is None:
+            raise SystemExit(f"No usable model at {args.model}")
+        _print_report("Evaluation", evaluate_mood_model(model, samples, args.threshold), seconds)
+
+if __name__ == "__main__":
+    main()
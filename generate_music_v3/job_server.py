@@ -0,0 +1,512 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextlib import asynccontextmanager, nullcontext
+from typing import List, Optional
+import metrics
+
+# 작업 큐 SQLite 파일과 업로드 파일 저장 위치
+JOB_DB_PATH = os.environ.get("JOB_DB_PATH", os.path.join("cache", "jobs.sqlite3"))
+JOB_UPLOAD_DIR = os.environ.get("JOB_UPLOAD_DIR", os.path.join("cache", "job_uploads"))
+
+# 작업을 처리할 워커 스레드 수. 키워드/음악 단계는 프로세스 안의 모델을 공유하므로 기본 1
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "1"))
+
+# 대기 중인 작업이 없을 때 큐를 다시 확인하는 간격(초)
+POLL_INTERVAL = 1.0
+
+# 작업 진행률 (단계 이름 → 그 단계를 시작할 때의 진행률)
+STAGE_PROGRESS = {'queued': 0.0, 'extract': 0.05, 'keywords': 0.25, 'visualize': 0.4, 'draft': 0.45, 'music': 0.5}
+
+class IdempotencyConflict(ValueError):
+    """같은 멱등성 키로 다른 내용의 작업을 제출함"""
+
+def _request_digest(request):
+    """작업 요청 내용 해시 (같은 멱등성 키의 재시도인지 확인용)"""
+    return hashlib.sha256(json.dumps(request, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+class JobQueue:
+    """
+    SQLite에 저장되는 작업 큐. 서버가 재시작되어도 대기/실행 중이던 작업이 남습니다.
+    idempotency_key에 UNIQUE 제약이 있어 같은 키로 다시 제출하면 새 작업을 만들지 않고 기존 작업을 돌려줍니다.
+    연결은 스레드마다 따로 열고 WAL 모드로 읽기와 쓰기가 서로 막지 않게 합니다.
+
+    Args:
+        path (str): SQLite 파일 경로
+    """
+
+    def __init__(self, path=JOB_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    idempotency_key TEXT NOT NULL UNIQUE,
+                    request_digest TEXT NOT NULL,
+                    request TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    progress REAL NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job['request'] = json.loads(job['request'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def submit(self, idempotency_key, request, request_digest=None, job_id=None):
+        """
+        작업을 큐에 넣습니다.
+
+        Args:
+            idempotency_key (str): 클라이언트가 정한 멱등성 키
+            request (dict): 작업 요청 (JSON 직렬화 가능)
+            request_digest (str): 같은 요청인지 비교할 해시 (None이면 request 전체 해시)
+            job_id (str): 새 작업에 쓸 ID (None이면 새로 생성, 행을 넣기 전에 작업별 상태를 준비할 때 사용)
+
+        Returns:
+            tuple: (작업 딕셔너리, 새로 만들었는지 여부)
+
+        Raises:
+            IdempotencyConflict: 같은 키로 다른 요청을 이미 제출한 경우
+        """
+        digest = request_digest or _request_digest(request)
+        conn = self._connect()
+        try:
+            job_id = job_id or uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, idempotency_key, request_digest, request, status, stage, created_at) "
+                "VALUES (?, ?, ?, ?, 'queued', 'queued', ?)",
+                (job_id, idempotency_key, digest, json.dumps(request, ensure_ascii=False), time.time()))
+            return self.get(job_id), True
+        except sqlite3.IntegrityError:
+            job = self._to_dict(conn.execute("SELECT * FROM jobs WHERE idempotency_key = ?", (idempotency_key,)).fetchone())
+            if job['request_digest'] != digest:
+                raise IdempotencyConflict(f"Idempotency key {idempotency_key} was used for a different request")
+            return job, False
+
+    def get(self, job_id):
+        """작업 딕셔너리 (없으면 None)"""
+        return self._to_dict(self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def claim(self):
+        """
+        가장 오래 기다린 작업 하나를 실행 중으로 바꾸고 반환합니다 (없으면 None).
+        BEGIN IMMEDIATE로 쓰기 잠금을 먼저 잡으므로 여러 워커가 같은 작업을 가져가지 않습니다.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (time.time(), row['id']))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row['id'])
+
+    def update(self, job_id, stage=None, progress=None, result=None):
+        """진행 단계/진행률/중간 결과 갱신"""
+        fields, values = [], []
+        if stage is not None:
+            fields.append("stage = ?")
+            values.append(stage)
+        if progress is not None:
+            fields.append("progress = ?")
+            values.append(progress)
+        if result is not None:
+            fields.append("result = ?")
+            values.append(json.dumps(result, ensure_ascii=False))
+        if fields:
+            self._connect().execute(f"UPDATE jobs SET {', '.join(fields)} WHERE id = ?", (*values, job_id))
+
+    def finish(self, job_id, result):
+        """작업 완료 처리"""
+        self._connect().execute(
+            "UPDATE jobs SET status = 'done', stage = 'done', progress = 1, result = ?, finished_at = ? WHERE id = ?",
+            (json.dumps(result, ensure_ascii=False), time.time(), job_id))
+
+    def fail(self, job_id, error):
+        """작업 실패 처리"""
+        self._connect().execute(
+            "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+            (str(error), time.time(), job_id))
+
+    def requeue_running(self):
+        """
+        이전 서버 프로세스가 실행하다 멈춘 작업을 다시 대기 상태로 돌립니다 (서버 시작 시 호출).
+
+        Returns:
+            int: 다시 넣은 작업 수
+        """
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = 'queued', stage = 'queued', progress = 0, started_at = NULL WHERE status = 'running'")
+        return cursor.rowcount
+
+    def counts(self):
+        """상태별 작업 수"""
+        rows = self._connect().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row['status']: row['n'] for row in rows}
+
+def _job_artifacts(job):
+    """작업 결과에서 클라이언트가 내려받을 수 있는 아티팩트 URL 목록"""
+    result = job['result'] or {}
+    artifacts = {}
+    if result.get('draft_path') and job['status'] != 'done':
+        artifacts['draft'] = f"/jobs/{job['id']}/draft"
+    if job['status'] == 'done':
+        if result.get('music_path'):
+            artifacts['audio'] = f"/jobs/{job['id']}/audio"
+        if result.get('keywords') is not None:
+            artifacts['keywords'] = f"/jobs/{job['id']}/keywords"
+        if result.get('visualization_path'):
+            artifacts['visualization'] = f"/jobs/{job['id']}/visualization"
+    return artifacts
+
+def job_status(job):
+    """API 응답용 작업 상태 (요청 내용과 서버 경로는 제외)"""
+    return {
+        'id': job['id'],
+        'idempotency_key': job['idempotency_key'],
+        'status': job['status'],
+        'stage': job['stage'],
+        'progress': job['progress'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'artifacts': _job_artifacts(job)
+    }
+
+class JobWorkers:
+    """
+    큐에서 작업을 가져와 main.py의 파이프라인 단계를 실행하는 백그라운드 워커 스레드들.
+    단계가 바뀔 때마다 진행 상황을 큐에 기록하므로 클라이언트는 폴링으로 확인할 수 있습니다.
+
+    Args:
+        queue (JobQueue): 작업 큐
+        num_workers (int): 워커 스레드 수
+    """
+
+    def __init__(self, queue, num_workers=JOB_WORKERS):
+        self.queue = queue
+        self.num_workers = num_workers
+        # API 키는 디스크에 저장하지 않고 메모리에만 보관 (재시작하면 키를 보낸 작업은 실패 처리)
+        self._api_keys = {}
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def remember_api_key(self, job_id, api_key):
+        """작업 행을 넣기 전에 호출 (워커가 바로 가져가도 키가 있도록)"""
+        if api_key:
+            self._api_keys[job_id] = api_key
+
+    def forget_api_key(self, job_id):
+        """작업이 만들어지지 않은 경우(멱등성 재시도/충돌) 미리 넣은 키 제거"""
+        self._api_keys.pop(job_id, None)
+
+    def notify(self):
+        """새 작업이 들어왔음을 알림 (대기 중인 워커가 바로 확인)"""
+        self._wakeup.set()
+
+    def start(self):
+        requeued = self.queue.requeue_running()
+        if requeued:
+            print(f"Requeued {requeued} interrupted jobs")
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            job = self.queue.claim()
+            if job is None:
+                self._wakeup.wait(POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            metrics.observe('job_queue_wait_seconds', job['started_at'] - job['created_at'])
+            with metrics.timer('job_total', type=job['request']['type']):
+                self._execute(job)
+
+    @staticmethod
+    def _music_cached(pipeline_job):
+        """전체 곡이 음악 캐시에 있는지 (있으면 초안을 만들지 않음)"""
+        from music_generator import audio_format_for, music_cache_paths
+        audio_format = pipeline_job.get('output_format') or audio_format_for(pipeline_job['output_path'])
+        _, cache_path, _ = music_cache_paths(pipeline_job['keywords'], pipeline_job['genre'], pipeline_job['mood'],
+                                             pipeline_job['era'], pipeline_job['music_style'], audio_format)
+        return os.path.exists(cache_path)
+
+    def _execute(self, job):
+        request = job['request']
+        job_id = job['id']
+        api_key = self._api_keys.pop(job_id, None)
+        result = {}
+        try:
+            if request.get('caller_api_key') and not api_key:
+                # 서버가 재시작되어 메모리에만 있던 키가 사라짐. 다른 키로 조용히 실행하지 않음
+                raise RuntimeError("The API key submitted with this job is no longer available (server restarted); "
+                                   "resubmit the job with a new Idempotency-Key")
+            api_key = api_key or os.environ.get("OPENAI_API_KEY")
+            from main import prepare_job, PIPELINE_STAGES
+            from music_generator import generate_music_draft
+            pipeline_job = prepare_job(request['type'], request['input'], api_key, use_cache=request.get('use_cache', True),
+                                       output_format=request.get('output_format'),
+                                       local_mood_threshold=request.get('local_mood'))
+            for name, stage in PIPELINE_STAGES:
+                if name == 'music' and request.get('draft') and not self._music_cached(pipeline_job):
+                    # 전체 곡보다 먼저 짧은 초안을 만들어 폴링하는 클라이언트가 바로 들을 수 있게 함
+                    self.queue.update(job_id, stage='draft', progress=STAGE_PROGRESS['draft'])
+                    try:
+                        with metrics.timer('pipeline_draft'):
+                            result['draft_path'] = os.path.abspath(generate_music_draft(
+                                pipeline_job['keywords'], pipeline_job['genre'], pipeline_job['mood'],
+                                pipeline_job['era'], pipeline_job['music_style'], pipeline_job['output_path'],
+                                output_format=request.get('output_format')))
+                        self.queue.update(job_id, result=result)
+                    except Exception as e:
+                        print(f"Error generating draft for job {job_id}: {e}")
+                self.queue.update(job_id, stage=name, progress=STAGE_PROGRESS[name])
+                # 초안을 만든 작업은 전체 곡 시간도 music_tier로 기록 (초안과 비교용)
+                tier_timer = (metrics.timer('music_tier', tier='full') if name == 'music' and result.get('draft_path')
+                              else nullcontext())
+                with metrics.timer(f"pipeline_{name}"), tier_timer:
+                    stage(pipeline_job)
+
+            if not pipeline_job.get('music_path'):
+                raise RuntimeError("Failed to generate music")
+            visualization_path = os.path.join(pipeline_job['output_dir'], "keywords_visualization.png")
+            result.update({
+                'output_dir': os.path.abspath(pipeline_job['output_dir']),
+                'music_path': os.path.abspath(pipeline_job['music_path']),
+                'visualization_path': os.path.abspath(visualization_path) if os.path.exists(visualization_path) else None,
+                'keywords': {key: pipeline_job[key] for key in ('keywords', 'genre', 'mood', 'era', 'music_style')}
+            })
+            if result.get('draft_path') and not os.path.exists(result['draft_path']):
+                result.pop('draft_path')
+            self.queue.finish(job_id, result)
+            metrics.increment('jobs_finished_total', status='done')
+            print(f"Job {job_id} finished: {result['music_path']}")
+        except Exception as e:
+            traceback.print_exc()
+            self.queue.fail(job_id, e)
+            metrics.increment('jobs_finished_total', status='failed')
+            print(f"Job {job_id} failed: {e}")
+
+def _save_uploads(files, content_type):
+    """
+    업로드 파일을 저장하고 파이프라인 입력 문자열을 만듭니다.
+    웹툰 이미지는 쉼표로 이어 붙인 경로로 넘기므로 파일 이름은 순번으로 바꿔 저장합니다.
+
+    Returns:
+        tuple: (업로드 디렉토리, 입력 문자열)
+    """
+    upload_dir = os.path.abspath(os.path.join(JOB_UPLOAD_DIR, uuid.uuid4().hex))
+    os.makedirs(upload_dir, exist_ok=True)
+    paths = []
+    for i, upload in enumerate(files):
+        extension = os.path.splitext(upload.filename or "")[1].lower() or (".txt" if content_type == 'novel' else ".png")
+        path = os.path.join(upload_dir, f"{i:03d}{extension}")
+        with open(path, "wb") as f:
+            shutil.copyfileobj(upload.file, f)
+        paths.append(path)
+    return upload_dir, ','.join(paths) if content_type == 'webtoon' else paths[0]
+
+def _upload_digest(upload_dir):
+    """업로드 파일 내용 해시 (요청 비교용, 저장 경로와 무관)"""
+    sha256 = hashlib.sha256()
+    for name in sorted(os.listdir(upload_dir)):
+        with open(os.path.join(upload_dir, name), "rb") as f:
+            sha256.update(hashlib.sha256(f.read()).digest())
+    return sha256.hexdigest()
+
+def create_job_app(queue=None, workers=None):
+    """
+    작업 API 앱을 만듭니다.
+
+    POST /jobs                     작업 제출 (Idempotency-Key 헤더 필수, multipart: type, input, files, output_format, draft)
+    GET  /jobs/{id}                상태/진행률 폴링
+    GET  /jobs/{id}/audio          완성된 음악
+    GET  /jobs/{id}/draft          초안 (draft 요청 시, 전체 곡 완성 전까지)
+    GET  /jobs/{id}/keywords       키워드/장르/분위기/시대/음악 스타일
+    GET  /jobs/{id}/visualization  키워드 시각화 이미지
+    GET  /health                   상태별 작업 수
+    GET  /metrics                  Prometheus 메트릭
+
+    Args:
+        queue (JobQueue): 작업 큐 (None이면 JOB_DB_PATH)
+        workers (JobWorkers): 워커 (None이면 JOB_WORKERS개)
+    """
+    from fastapi import FastAPI, File, Form, Header, HTTPException, UploadFile
+    from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
+    from music_generator import AUDIO_FORMATS
+
+    queue = queue or JobQueue()
+    workers = workers or JobWorkers(queue)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        workers.start()
+        yield
+        workers.stop(timeout=5)
+        from ocr_backend import close_ocr_backend
+        close_ocr_backend()
+
+    app = FastAPI(title="Webtoon & Novel to Music job API", lifespan=lifespan)
+
+    @app.post("/jobs", status_code=202)
+    def submit_job(idempotency_key: str = Header(..., alias="Idempotency-Key"),
+                   type: str = Form(...), input: Optional[str] = Form(None),
+                   output_format: str = Form("mp3"), draft: bool = Form(False), use_cache: bool = Form(True),
+                   api_key: Optional[str] = Form(None), local_mood: Optional[float] = Form(None),
+                   files: List[UploadFile] = File(default=[])):
+        if type not in ('webtoon', 'novel'):
+            raise HTTPException(400, "type must be 'webtoon' or 'novel'")
+        if output_format not in AUDIO_FORMATS:
+            raise HTTPException(400, f"output_format must be one of {sorted(AUDIO_FORMATS)}")
+        # 서버 로컬 경로는 받지 않음 (웹툰 URL 또는 업로드 파일만)
+        if input and not (type == 'webtoon' and input.startswith(('http://', 'https://'))):
+            raise HTTPException(400, "input must be a webtoon URL; upload files for other inputs")
+        if not input and not files:
+            raise HTTPException(400, "provide a webtoon URL as input or upload files")
+
+        upload_dir = None
+        request = {'type': type, 'output_format': output_format, 'draft': draft, 'use_cache': use_cache}
+        if local_mood is not None:
+            # 웹툰 이미지에 학습된 로컬 분위기 분류기 사용 (기본은 항상 Vision API)
+            request['local_mood'] = local_mood
+        if api_key:
+            # 키 자체는 저장하지 않고 키를 보냈다는 사실만 기록
+            request['caller_api_key'] = True
+        if files:
+            upload_dir, request['input'] = _save_uploads(files, type)
+            request['upload_digest'] = _upload_digest(upload_dir)
+        else:
+            request['input'] = input
+
+        # 재시도 비교에는 업로드 저장 경로를 빼고 내용 해시만 사용
+        comparable = {key: value for key, value in request.items()
+                      if not (upload_dir and key == 'input') and key != 'caller_api_key'}
+        # 행을 넣자마자 워커가 가져갈 수 있으므로 키를 먼저 보관
+        job_id = uuid.uuid4().hex
+        workers.remember_api_key(job_id, api_key)
+        try:
+            job, created = queue.submit(idempotency_key, request, _request_digest(comparable), job_id=job_id)
+        except IdempotencyConflict as e:
+            workers.forget_api_key(job_id)
+            if upload_dir:
+                shutil.rmtree(upload_dir, ignore_errors=True)
+            raise HTTPException(409, str(e))
+
+        if created:
+            workers.notify()
+            metrics.increment('jobs_submitted_total', type=type)
+            return job_status(job)
+        # 같은 키의 재시도: 기존 작업을 그대로 반환하고 이번에 올린 파일은 버림
+        workers.forget_api_key(job_id)
+        if upload_dir:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+        metrics.increment('jobs_deduplicated_total', type=type)
+        return JSONResponse(job_status(job), status_code=200)
+
+    def load_job(job_id):
+        job = queue.get(job_id)
+        if job is None:
+            raise HTTPException(404, "job not found")
+        return job
+
+    def artifact_file(job_id, key, ready_status='done'):
+        job = load_job(job_id)
+        if ready_status and job['status'] != ready_status:
+            raise HTTPException(409, f"job is {job['status']}")
+        path = (job['result'] or {}).get(key)
+        if not path or not os.path.exists(path):
+            raise HTTPException(404, "artifact not available")
+        return FileResponse(path, filename=os.path.basename(path))
+
+    @app.get("/jobs/{job_id}")
+    def get_job(job_id: str):
+        return job_status(load_job(job_id))
+
+    @app.get("/jobs/{job_id}/audio")
+    def get_audio(job_id: str):
+        return artifact_file(job_id, 'music_path')
+
+    @app.get("/jobs/{job_id}/draft")
+    def get_draft(job_id: str):
+        return artifact_file(job_id, 'draft_path', ready_status=None)
+
+    @app.get("/jobs/{job_id}/visualization")
+    def get_visualization(job_id: str):
+        return artifact_file(job_id, 'visualization_path')
+
+    @app.get("/jobs/{job_id}/keywords")
+    def get_keywords(job_id: str):
+        job = load_job(job_id)
+        if job['status'] != 'done':
+            raise HTTPException(409, f"job is {job['status']}")
+        return job['result']['keywords']
+
+    @app.get("/health")
+    def health():
+        return {'status': 'ok', 'jobs': queue.counts()}
+
+    @app.get("/metrics")
+    def prometheus_metrics():
+        return PlainTextResponse(metrics.to_prometheus(), media_type="text/plain; version=0.0.4")
+
+    return app
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser(description='Headless job API for webtoon & novel music generation')
+    parser.add_argument('--host', default='127.0.0.1', help='Host to bind')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on')
+    parser.add_argument('--db', default=JOB_DB_PATH, help='SQLite job queue path')
+    parser.add_argument('--workers', type=int, default=JOB_WORKERS, help='Background worker threads')
+    args = parser.parse_args()
+
+    job_queue = JobQueue(args.db)
+    uvicorn.run(create_job_app(job_queue, JobWorkers(job_queue, args.workers)), host=args.host, port=args.port)
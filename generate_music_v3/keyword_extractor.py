@@ -14,6 +14,13 @@ import hashlib
 import json
 import base64
 import traceback
+import threading
+import metrics
+from lexicon import score_categories, select_dominant
+from image_mood import local_mood_keywords
+from resilient_client import REQUEST_DEADLINE, Deadline, get_resilient_client
+from embedding_store import get_embedding_store
+from chapter_analysis import analyze_chapter, aggregate_chapters
 
 # NLTK 데이터 다운로드
 nltk.download('punkt', quiet=True)
@@ -34,6 +41,27 @@ except Exception as e:
     print(f"Warning: KoNLPy initialization failed: {e}")
     KONLPY_AVAILABLE = False
 
+# KeyBERT 임베딩 모델 (임베딩 저장소도 모델 이름별로 나뉨)
+KEYBERT_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# KeyBERT 모델은 프로세스당 한 번만 로드해서 재사용
+_kw_model = None
+_kw_model_lock = threading.Lock()
+
+def get_keybert_model():
+    """
+    KeyBERT 모델을 처음 호출될 때 로드하고 이후에는 같은 인스턴스를 반환합니다.
+
+    Returns:
+        KeyBERT: KeyBERT 모델 인스턴스
+    """
+    global _kw_model
+    with _kw_model_lock:
+        if _kw_model is None:
+            with metrics.timer('keybert_load'):
+                _kw_model = KeyBERT(model=KEYBERT_MODEL_NAME)
+        return _kw_model
+
 # def get_openai_client():
 #     """OpenAI 클라이언트를 필요할 때만 초기화합니다."""
 #     try:
@@ -61,45 +89,234 @@ def get_openai_client(api_key):
     try:
         import openai
         openai.api_key = api_key
+        # 제한 시간과 재시도는 resilient_client에서 처리
+        openai.max_retries = 0
         return openai
     except Exception as e:
         print(f"Error initializing OpenAI client: {e}")
         return None
     
-def analyze_image_content(image_path, api_key):
+# 이미지 분석 프롬프트
+IMAGE_ANALYSIS_PROMPT = "이 웹툰 이미지를 분석해서 감정과 분위기를 나타내는 키워드를 5-10개 추출해주세요."
+
+# 한 번의 Vision 요청에 함께 보낼 이미지 수
+IMAGE_BATCH_SIZE = 4
+
+# 여러 이미지를 한 번에 분석할 때의 프롬프트 (이미지별 JSON 결과 요청)
+IMAGE_BATCH_PROMPT = (
+    "다음 {count}개의 웹툰 이미지를 순서대로 각각 분석해서, 이미지마다 감정과 분위기를 나타내는 키워드를 5-10개 추출해주세요. "
+    "다른 설명 없이 JSON으로만 답해주세요: "
+    '{{"images": [{{"index": 1, "keywords": ["키워드", ...]}}, ...]}}'
+)
+
+# 한국어/영어 감정 키워드 목록
+EMOTION_TERMS = [
+    'happy', 'sad', 'angry', 'surprised', 'scared', 'disgusted', 'confused', 
+    'excited', 'worried', 'nervous', 'calm', 'relaxed', 'tense', 'frustrated',
+    'joyful', 'depressed', 'anxious', 'content', 'disappointed', 'embarrassed',
+    '행복', '슬픔', '분노', '놀람', '공포', '혐오', '혼란', '흥분', '걱정', '긴장',
+    '평온', '편안', '불안', '좌절', '기쁨', '우울', '불안', '만족', '실망', '당황'
+]
+
+# 행동 키워드 목록
+ACTION_TERMS = [
+    'smiling', 'crying', 'laughing', 'shouting', 'running', 'walking', 'fighting',
+    'hugging', 'kissing', 'talking', 'whispering', 'sleeping', 'eating', 'drinking',
+    '웃음', '울음', '달리기', '걷기', '싸움', '포옹', '키스', '대화', '속삭임', '잠', '식사'
+]
+
+# 분위기 키워드 목록
+MOOD_TERMS = [
+    'romantic', 'dramatic', 'mysterious', 'thrilling', 'peaceful', 'chaotic',
+    'tense', 'comical', 'nostalgic', 'dreamy', 'nightmarish', 'magical',
+    '로맨틱', '드라마틱', '미스터리', '스릴', '평화로운', '혼란스러운',
+    '긴장된', '코믹', '향수', '꿈같은', '악몽', '마법'
+]
+
+def image_analysis_cache_path(img_hash):
+    """이미지 내용 해시로 이미지 분석 캐시 파일 경로를 만든다"""
+    return os.path.join("cache", "image_analysis", f"{img_hash}.json")
+
+def _image_file_hash(image_path):
+    """이미지 파일 내용의 MD5 해시 (읽을 수 없으면 빈 문자열)"""
+    try:
+        with open(image_path, 'rb') as f:
+            return hashlib.md5(f.read()).hexdigest()
+    except Exception as e:
+        print(f"Error calculating image hash: {e}")
+        return ""
+
+def load_cached_image_analysis(img_hash):
+    """
+    캐시된 Vision 이미지 분석 키워드를 불러옵니다.
+    예전 버전이 같은 경로에 저장한 로컬 분류기 결과(source='local')는 Vision 결과로 쓰지 않습니다.
+
+    Returns:
+        list: 캐시된 키워드 리스트 (캐시가 없으면 None)
+    """
+    cache_path = image_analysis_cache_path(img_hash)
+    if not img_hash or not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("source", "vision") != "vision":
+            return None
+        return cached.get("keywords", [])
+    except Exception as e:
+        print(f"Error loading image analysis cache: {e}")
+        return None
+
+def save_cached_image_analysis(img_hash, keywords, analysis_text):
+    """이미지별 Vision 분석 키워드를 캐시에 저장"""
+    if not img_hash:
+        return
+    try:
+        os.makedirs(os.path.join("cache", "image_analysis"), exist_ok=True)
+        with open(image_analysis_cache_path(img_hash), "w", encoding="utf-8") as f:
+            json.dump({"keywords": keywords, "analysis": analysis_text, "source": "vision"},
+                      f, ensure_ascii=False, indent=2)
+    except Exception as cache_error:
+        print(f"Error saving to cache: {cache_error}")
+
+def _image_property_keywords(img):
+    """이미지 크기와 모드로 기본 키워드 추출"""
+    try:
+        width, height = img.size
+        aspect_ratio = width / height
+        
+        # 이미지 크기에 따른 키워드
+        keywords = []
+        if width > 1000:
+            keywords.append("high_resolution")
+        if aspect_ratio > 1.5:
+            keywords.append("wide_format")
+        elif aspect_ratio < 0.7:
+            keywords.append("vertical_format")
+        
+        # 이미지 모드에 따른 키워드
+        if img.mode == "L":
+            keywords.append("black_and_white")
+        elif img.mode == "RGB":
+            keywords.append("color")
+        return keywords
+    except Exception as img_error:
+        print(f"Error analyzing image properties: {img_error}")
+        return []
+
+def _keywords_from_analysis(analysis_text, img, extra_keywords=()):
     """
-    이미지 내용을 분석하여 캐릭터의 표정, 행동, 감정 등을 추출합니다.
-    OpenAI의 Vision API를 사용합니다.
+    Vision 응답 텍스트와 이미지 특성으로 최종 키워드 리스트를 만듭니다.
+
+    Args:
+        analysis_text (str): Vision API 응답 텍스트
+        img (PIL.Image): 분석한 이미지
+        extra_keywords (iterable): 응답에서 이미 구조화된 형태로 받은 키워드
+
+    Returns:
+        list: 키워드 리스트
+    """
+    # 감정 키워드 추출
+    emotion_keywords = [k.strip().lower() for k in extra_keywords if isinstance(k, str) and len(k.strip()) > 1]
+    
+    # 분석 텍스트에서 키워드 추출
+    if analysis_text:
+        for term in EMOTION_TERMS + ACTION_TERMS + MOOD_TERMS:
+            if term.lower() in analysis_text.lower():
+                emotion_keywords.append(term.lower())
+        
+        # 분석 텍스트에서 직접 키워드 추출 (콜론 뒤에 오는 단어들)
+        if "keywords:" in analysis_text.lower() or "키워드:" in analysis_text.lower():
+            keyword_section = analysis_text.lower().split("keywords:")[1] if "keywords:" in analysis_text.lower() else analysis_text.lower().split("키워드:")[1]
+            extracted_keywords = [k.strip() for k in keyword_section.split(",")]
+            emotion_keywords.extend([k for k in extracted_keywords if k and len(k) > 1])
+    
+    # 모든 키워드 결합
+    all_keywords = emotion_keywords + _image_property_keywords(img) + ["visual", "graphic"]
+    
+    # 중복 제거
+    all_keywords = list(set(all_keywords))
+    
+    # 키워드가 너무 적으면 기본 키워드 추가
+    if len(all_keywords) < 5:
+        all_keywords.extend(["scene", "character", "emotion", "story", "webtoon"])
+        all_keywords = list(set(all_keywords))
+    return all_keywords
+
+def _image_data_url(image_path):
+    """이미지 파일을 Vision API용 base64 data URL로 인코딩"""
+    with open(image_path, "rb") as image_file:
+        base64_image = base64.b64encode(image_file.read()).decode('utf-8')
+    metrics.increment('bytes_uploaded_total', len(base64_image), api='vision')
+    return f"data:image/jpeg;base64,{base64_image}"
+
+def _vision_completion(client, deadline=None, **request):
+    """
+    Vision 요청을 제한 시간, 재시도, 헤지 요청, 회로 차단기와 함께 보냅니다.
+    업스트림이 비정상이면 회로가 열려 바로 CircuitOpenError가 발생합니다.
+    """
+    return get_resilient_client('vision').call(
+        lambda timeout: client.chat.completions.create(timeout=timeout, **request), deadline=deadline
+    )
+
+def _record_vision_usage(response, images=1):
+    """Vision 응답의 토큰 사용량 기록"""
+    metrics.increment('vision_requests_total', images=images)
+    usage = getattr(response, 'usage', None)
+    if usage is not None and getattr(usage, 'total_tokens', None):
+        metrics.increment('api_tokens_total', usage.total_tokens, api='vision')
+
+def _local_image_analysis(img, local_threshold):
+    """
+    로컬 색/밝기 특징 분류기로 분위기를 추정합니다. 신뢰도가 충분하면 결과를 반환합니다.
+    결과는 캐시하지 않습니다 (계산이 몇 ms이고, Vision 캐시에 섞이면 나중에 Vision 분석을 받을 수 없음).
+
+    Returns:
+        list: 키워드 리스트 (로컬 분류를 쓰지 않거나 신뢰도가 낮으면 None)
+    """
+    if local_threshold is None:
+        return None
+    try:
+        mood_keywords, mood, confidence = local_mood_keywords(img, local_threshold)
+    except Exception as e:
+        print(f"Local image mood error: {e}")
+        return None
+    if mood is None:
+        # 학습된 분류기가 없거나 보정에 실패함
+        return None
+    if mood_keywords is None:
+        print(f"Local mood '{mood}' not confident enough ({confidence:.2f}), using vision API")
+        metrics.increment('image_mood_total', path='remote')
+        return None
+
+    print(f"Local mood '{mood}' ({confidence:.2f}), skipping vision API")
+    metrics.increment('image_mood_total', path='local')
+    analysis_text = f"local mood: {', '.join(mood_keywords)} (confidence {confidence:.2f})"
+    return _keywords_from_analysis(analysis_text, img, extra_keywords=mood_keywords)
+
+def analyze_image_content(image_path, api_key, local_threshold=None, deadline=None):
+    """
+    이미지 내용을 분석하여 캐릭터의 표정, 행동, 감정 등을 추출합니다 (OpenAI의 Vision API).
+    local_threshold를 주면 먼저 학습된 로컬 특징 분류기로 분위기를 추정하고, 신뢰도가 낮을 때만 API를 호출합니다.
     
     Args:
         image_path (str): 이미지 파일 경로
+        local_threshold (float): 로컬 분류 결과를 쓸 최소 신뢰도 (기본 None: 로컬 분류를 쓰지 않고 항상 Vision API 사용)
+        deadline (Deadline): 요청 전체 제한 시간 (None이면 REQUEST_DEADLINE초)
         
     Returns:
         list: 추출된 키워드 리스트
     """
-    # 이미지 분석 캐시 확인
-    cache_dir = os.path.join("cache", "image_analysis")
-    os.makedirs(cache_dir, exist_ok=True)
-    
     # 이미지 해시 계산
-    img_hash = ""
-    try:
-        with open(image_path, 'rb') as f:
-            img_hash = hashlib.md5(f.read()).hexdigest()
-    except Exception as e:
-        print(f"Error calculating image hash: {e}")
-    
-    cache_path = os.path.join(cache_dir, f"{img_hash}.json")
+    img_hash = _image_file_hash(image_path)
     
     # 캐시 확인
-    if img_hash and os.path.exists(cache_path):
-        try:
-            with open(cache_path, "r", encoding="utf-8") as f:
-                cached_data = json.load(f)
-                print(f"Using cached image analysis for: {image_path}")
-                return cached_data.get("keywords", [])
-        except Exception as e:
-            print(f"Error loading image analysis cache: {e}")
+    cached_keywords = load_cached_image_analysis(img_hash)
+    if cached_keywords is not None:
+        print(f"Using cached image analysis for: {image_path}")
+        metrics.increment('cache_hits_total', cache='image_analysis')
+        return cached_keywords
+    metrics.increment('cache_misses_total', cache='image_analysis')
     
     print(f"Analyzing image content and emotions: {image_path}")
     
@@ -110,6 +327,11 @@ def analyze_image_content(image_path, api_key):
             print(f"Image too small for analysis: {img.width}x{img.height}")
             return ["image", "visual", "graphic"]
         
+        # 로컬 분류가 충분히 확실하면 API 호출 생략
+        local_keywords = _local_image_analysis(img, local_threshold)
+        if local_keywords is not None:
+            return local_keywords
+        
         # OpenAI 클라이언트 초기화 (필요할 때만)
         client = get_openai_client(api_key)
         if not client:
@@ -117,116 +339,42 @@ def analyze_image_content(image_path, api_key):
             return ["image", "visual", "graphic", "scene", "character"]
         
         # 이미지를 base64로 인코딩
-        with open(image_path, "rb") as image_file:
-            base64_image = base64.b64encode(image_file.read()).decode('utf-8')
+        image_url = _image_data_url(image_path)
         
         # OpenAI API 호출
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": "이 웹툰 이미지를 분석해서 감정과 분위기를 나타내는 키워드를 5-10개 추출해주세요."},
-                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
-                        ]
-                    }
-                ],
-                max_tokens=200
-            )
-            
+            with metrics.timer('vision_api'):
+                response = _vision_completion(
+                    client, deadline or Deadline(REQUEST_DEADLINE),
+                    model="gpt-4o",
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {"type": "text", "text": IMAGE_ANALYSIS_PROMPT},
+                                {"type": "image_url", "image_url": {"url": image_url}}
+                            ]
+                        }
+                    ],
+                    max_tokens=200
+                )
+            _record_vision_usage(response)
+
             # 응답 텍스트 가져오기
             analysis_text = response.choices[0].message.content
             print(f"Image analysis result: {analysis_text[:100]}...")
             
         except Exception as api_error:
             print(f"OpenAI API error: {api_error}")
+            metrics.increment('api_errors_total', api='vision')
             # API 호출 실패 시 기본 키워드 반환
             return ["image", "visual", "scene", "character", "emotion"]
         
-        # 감정 키워드 추출
-        emotion_keywords = []
-        
-        # 한국어/영어 감정 키워드 목록
-        emotion_terms = [
-            'happy', 'sad', 'angry', 'surprised', 'scared', 'disgusted', 'confused', 
-            'excited', 'worried', 'nervous', 'calm', 'relaxed', 'tense', 'frustrated',
-            'joyful', 'depressed', 'anxious', 'content', 'disappointed', 'embarrassed',
-            '행복', '슬픔', '분노', '놀람', '공포', '혐오', '혼란', '흥분', '걱정', '긴장',
-            '평온', '편안', '불안', '좌절', '기쁨', '우울', '불안', '만족', '실망', '당황'
-        ]
-        
-        # 행동 키워드 목록
-        action_terms = [
-            'smiling', 'crying', 'laughing', 'shouting', 'running', 'walking', 'fighting',
-            'hugging', 'kissing', 'talking', 'whispering', 'sleeping', 'eating', 'drinking',
-            '웃음', '울음', '달리기', '걷기', '싸움', '포옹', '키스', '대화', '속삭임', '잠', '식사'
-        ]
-        
-        # 분위기 키워드 목록
-        mood_terms = [
-            'romantic', 'dramatic', 'mysterious', 'thrilling', 'peaceful', 'chaotic',
-            'tense', 'comical', 'nostalgic', 'dreamy', 'nightmarish', 'magical',
-            '로맨틱', '드라마틱', '미스터리', '스릴', '평화로운', '혼란스러운',
-            '긴장된', '코믹', '향수', '꿈같은', '악몽', '마법'
-        ]
-        
-        # 분석 텍스트에서 키워드 추출
-        if analysis_text:
-            for term in emotion_terms + action_terms + mood_terms:
-                if term.lower() in analysis_text.lower():
-                    emotion_keywords.append(term.lower())
-            
-            # 분석 텍스트에서 직접 키워드 추출 (콜론 뒤에 오는 단어들)
-            if "keywords:" in analysis_text.lower() or "키워드:" in analysis_text.lower():
-                keyword_section = analysis_text.lower().split("keywords:")[1] if "keywords:" in analysis_text.lower() else analysis_text.lower().split("키워드:")[1]
-                extracted_keywords = [k.strip() for k in keyword_section.split(",")]
-                emotion_keywords.extend([k for k in extracted_keywords if k and len(k) > 1])
-        
-        # 기본 이미지 특성 추출
-        try:
-            width, height = img.size
-            aspect_ratio = width / height
-            
-            # 이미지 크기에 따른 키워드
-            size_keywords = []
-            if width > 1000:
-                size_keywords.append("high_resolution")
-            if aspect_ratio > 1.5:
-                size_keywords.append("wide_format")
-            elif aspect_ratio < 0.7:
-                size_keywords.append("vertical_format")
-            
-            # 이미지 모드에 따른 키워드
-            mode_keywords = []
-            if img.mode == "L":
-                mode_keywords.append("black_and_white")
-            elif img.mode == "RGB":
-                mode_keywords.append("color")
-        except Exception as img_error:
-            print(f"Error analyzing image properties: {img_error}")
-            size_keywords = []
-            mode_keywords = []
-        
-        # 모든 키워드 결합
-        all_keywords = emotion_keywords + size_keywords + mode_keywords + ["visual", "graphic"]
-        
-        # 중복 제거
-        all_keywords = list(set(all_keywords))
-        
-        # 키워드가 너무 적으면 기본 키워드 추가
-        if len(all_keywords) < 5:
-            all_keywords.extend(["scene", "character", "emotion", "story", "webtoon"])
-            all_keywords = list(set(all_keywords))
+        # 감정 키워드 추출 + 기본 이미지 특성
+        all_keywords = _keywords_from_analysis(analysis_text, img)
         
         # 캐시에 결과 저장
-        if img_hash:
-            try:
-                with open(cache_path, "w", encoding="utf-8") as f:
-                    json.dump({"keywords": all_keywords, "analysis": analysis_text}, f, ensure_ascii=False, indent=2)
-            except Exception as cache_error:
-                print(f"Error saving to cache: {cache_error}")
+        save_cached_image_analysis(img_hash, all_keywords, analysis_text)
         
         return all_keywords
     except Exception as e:
@@ -234,7 +382,247 @@ def analyze_image_content(image_path, api_key):
         traceback.print_exc()
         return ["image", "visual", "scene", "character", "emotion"]
 
-def extract_keywords(content, content_type='webtoon', api_key=None, num_keywords=15):
+def _parse_batch_analysis(analysis_text, count):
+    """
+    여러 이미지 분석 응답(JSON)을 이미지별 키워드 리스트로 나눕니다.
+
+    Returns:
+        dict: 이미지 순서(0부터) → 키워드 리스트 (응답에 없는 이미지는 빠짐)
+    """
+    text = (analysis_text or "").strip()
+    # ```json ... ``` 형태로 감싸서 답하는 경우
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if not match:
+        return {}
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return {}
+
+    results = {}
+    entries = data.get("images", []) if isinstance(data, dict) else []
+    for position, entry in enumerate(entries):
+        if not isinstance(entry, dict) or not isinstance(entry.get("keywords"), list):
+            continue
+        try:
+            index = int(entry.get("index", position + 1)) - 1
+        except (TypeError, ValueError):
+            index = position
+        if 0 <= index < count:
+            results[index] = entry["keywords"]
+    return results
+
+def _analyze_image_chunk(client, chunk, deadline=None):
+    """
+    이미지 여러 장을 Vision 요청 한 번으로 분석하고 이미지별로 캐시합니다.
+
+    Args:
+        client: OpenAI 클라이언트
+        chunk (list): (이미지 경로, 이미지 해시, PIL.Image) 리스트
+        deadline (Deadline): 요청 전체 제한 시간
+
+    Returns:
+        dict: 이미지 경로 → 키워드 리스트 (응답에서 빠진 이미지는 포함되지 않음)
+    """
+    content = [{"type": "text", "text": IMAGE_BATCH_PROMPT.format(count=len(chunk))}]
+    for position, (image_path, _, _) in enumerate(chunk, 1):
+        content.append({"type": "text", "text": f"이미지 {position}:"})
+        content.append({"type": "image_url", "image_url": {"url": _image_data_url(image_path)}})
+
+    with metrics.timer('vision_api', batch=len(chunk)):
+        response = _vision_completion(
+            client, deadline,
+            model="gpt-4o",
+            messages=[{"role": "user", "content": content}],
+            response_format={"type": "json_object"},
+            max_tokens=150 * len(chunk)
+        )
+    _record_vision_usage(response, images=len(chunk))
+    analysis_text = response.choices[0].message.content
+    parsed = _parse_batch_analysis(analysis_text, len(chunk))
+
+    results = {}
+    for position, (image_path, img_hash, img) in enumerate(chunk):
+        if position not in parsed:
+            continue
+        image_analysis = ", ".join(str(k) for k in parsed[position])
+        keywords = _keywords_from_analysis(image_analysis, img, extra_keywords=parsed[position])
+        save_cached_image_analysis(img_hash, keywords, image_analysis)
+        results[image_path] = keywords
+    return results
+
+def analyze_images_batch(image_paths, api_key, batch_size=IMAGE_BATCH_SIZE, local_threshold=None, deadline=None):
+    """
+    여러 이미지를 batch_size장씩 묶어 Vision 요청 한 번에 분석합니다.
+    지시 프롬프트는 요청마다 한 번만 들어가고, 응답은 이미지별 JSON으로 받아
+    각 이미지의 해시로 따로 캐시합니다 (analyze_image_content와 같은 캐시).
+    응답에서 빠진 이미지는 한 장씩 다시 분석합니다.
+    local_threshold를 주면 로컬 분류기의 신뢰도가 충분한 이미지는 요청에 넣지 않습니다.
+    모든 요청은 하나의 제한 시간을 공유하고, 시간이 지나거나 회로가 열리면 남은 이미지는 기본 키워드를 씁니다.
+    OPENAI_BASE_URL 환경 변수로 로컬 테스트 서버를 지정할 수 있습니다.
+
+    Args:
+        image_paths (list): 이미지 파일 경로 리스트
+        api_key (str): OpenAI API 키
+        batch_size (int): 요청당 이미지 수
+        local_threshold (float): 로컬 분류 결과를 쓸 최소 신뢰도 (기본 None: 로컬 분류를 쓰지 않고 항상 Vision API 사용)
+        deadline (Deadline): 요청 전체 제한 시간 (None이면 REQUEST_DEADLINE초)
+
+    Returns:
+        list: 이미지 순서대로 키워드 리스트
+    """
+    deadline = deadline or Deadline(REQUEST_DEADLINE)
+    results = {}
+    pending = []
+    for image_path in image_paths:
+        img_hash = _image_file_hash(image_path)
+        cached_keywords = load_cached_image_analysis(img_hash)
+        if cached_keywords is not None:
+            metrics.increment('cache_hits_total', cache='image_analysis')
+            results[image_path] = cached_keywords
+            continue
+        metrics.increment('cache_misses_total', cache='image_analysis')
+        try:
+            img = Image.open(image_path)
+        except Exception as e:
+            print(f"Error opening image {image_path}: {e}")
+            results[image_path] = ["image", "visual", "scene", "character", "emotion"]
+            continue
+        if img.width < 100 or img.height < 100:
+            print(f"Image too small for analysis: {img.width}x{img.height}")
+            results[image_path] = ["image", "visual", "graphic"]
+            continue
+        local_keywords = _local_image_analysis(img, local_threshold)
+        if local_keywords is not None:
+            results[image_path] = local_keywords
+            continue
+        pending.append((image_path, img_hash, img))
+
+    if pending:
+        client = get_openai_client(api_key)
+        if not client:
+            print("OpenAI client initialization failed, using basic keywords")
+            for image_path, _, _ in pending:
+                results[image_path] = ["image", "visual", "graphic", "scene", "character"]
+            pending = []
+
+    for start in range(0, len(pending), batch_size):
+        chunk = pending[start:start + batch_size]
+        print(f"Analyzing {len(chunk)} images in one request...")
+        try:
+            results.update(_analyze_image_chunk(client, chunk, deadline))
+        except Exception as api_error:
+            print(f"OpenAI API error: {api_error}")
+            metrics.increment('api_errors_total', api='vision')
+            for image_path, _, _ in chunk:
+                results[image_path] = ["image", "visual", "scene", "character", "emotion"]
+            continue
+        # 응답에서 빠진 이미지는 한 장씩 다시 요청
+        for image_path, _, _ in chunk:
+            if image_path not in results:
+                metrics.increment('vision_batch_misses_total')
+                results[image_path] = analyze_image_content(image_path, api_key, local_threshold=None,
+                                                            deadline=deadline)
+
+    return [results[image_path] for image_path in image_paths]
+
+# 한국어 불용어 설정 (확장)
+KOREAN_STOP_WORDS = {
+    '이', '그', '저', '것', '이것', '저것', '그것', '및', '등', '등등',
+    '나', '너', '우리', '저희', '당신', '그들', '그녀', '이런', '저런', '그런',
+    '하다', '되다', '있다', '없다', '같다', '보다', '이다', '아니다',
+    '그리고', '또는', '그러나', '하지만', '또한', '그래서', '왜냐하면',
+    '에러', '오류', '에러가', '오류가', 'error', 'exception'  # 오류 관련 단어 추가
+}
+
+# 영어 불용어에 추가할 오류 관련 단어
+ERROR_STOP_WORDS = {'error', 'exception', 'traceback', 'failed', 'failure', 'broken'}
+
+def _is_korean_dominant(text):
+    return sum(1 for char in text if ord('가') <= ord(char) <= ord('힣')) > len(text) / 3
+
+def _preprocess_text(text, use_konlpy):
+    """
+    소문자 텍스트를 KeyBERT 입력으로 전처리합니다.
+    한국어는 형태소 분석 후 한국어 불용어를, 그 외(또는 형태소 분석 실패 시)는 특수 문자를 지우고 영어 불용어를 사용합니다.
+
+    Returns:
+        tuple: (전처리된 텍스트, 불용어 리스트)
+    """
+    if use_konlpy:
+        try:
+            # 전역 변수로 초기화된 Okt 인스턴스 사용
+            with metrics.timer('okt'):
+                tokens = okt_initialized.morphs(text)
+            return ' '.join(tokens), list(KOREAN_STOP_WORDS)
+        except Exception as e:
+            print(f"Error in Korean text processing: {e}")
+
+    # 영어 및 기타 언어 처리: 특수 문자 제거
+    stop_words = set(stopwords.words('english'))
+    stop_words.update(ERROR_STOP_WORDS)
+    return re.sub(r'[^\w\s]', '', text), list(stop_words)
+
+def _preprocess_chapter(text):
+    """챕터마다 언어를 판단해 전처리 (analyze_chapter에 넘기는 함수)"""
+    return _preprocess_text(text, KONLPY_AVAILABLE and _is_korean_dominant(text))
+
+def _keybert_extract(kw_model, doc, stop_words, top_n, candidates=None):
+    """
+    KeyBERT로 키워드를 추출합니다.
+    후보 구문은 KeyBERT와 같은 CountVectorizer 설정으로 미리 만들고 (candidates로 직접 줄 수도 있음),
+    문서와 후보 구문의 임베딩은 디스크 임베딩 저장소에서 먼저 찾아 없는 것만 계산해 KeyBERT에 넘깁니다.
+    """
+    from sklearn.feature_extraction.text import CountVectorizer
+    options = dict(keyphrase_ngram_range=(1, 2), stop_words=stop_words, use_mmr=True, diversity=0.7, top_n=top_n)
+    if candidates is None:
+        try:
+            candidates = CountVectorizer(ngram_range=(1, 2), stop_words=stop_words).fit([doc]).get_feature_names_out().tolist()
+        except ValueError:
+            candidates = []
+    if not candidates:
+        # 불용어만 있는 문서 등 후보가 없으면 KeyBERT 기본 동작에 맡김
+        return kw_model.extract_keywords(doc, **options)
+
+    store = get_embedding_store(KEYBERT_MODEL_NAME)
+    with metrics.timer('keybert_embed'):
+        doc_embeddings = store.embed([doc], kw_model.model.embed)
+        word_embeddings = store.embed(candidates, kw_model.model.embed)
+    stats = store.stats()
+    print(f"Embedding store: {stats['entries']} entries, hit rate {stats['hit_rate']:.0%}")
+    # KeyBERT는 문서 텍스트를 후보가 문서에 있는지 거르는 데만 쓰므로 (임베딩은 직접 넘김)
+    # 후보를 이어 붙인 텍스트를 넘겨 모든 후보가 남게 함
+    return kw_model.extract_keywords(' '.join(candidates), candidates=candidates, doc_embeddings=doc_embeddings,
+                                     word_embeddings=word_embeddings, **options)
+
+def analyze_novel_chapters(chapter_data, use_cache=True):
+    """
+    챕터마다 렉시콘 점수와 후보 구문 횟수를 계산합니다 (챕터 내용 해시로 캐시).
+
+    Returns:
+        list: chapter_data 순서의 analyze_chapter 결과 (빈 챕터는 None)
+    """
+    config = f"konlpy={KONLPY_AVAILABLE}"
+    return [analyze_chapter(chapter['content'], _preprocess_chapter, config, use_cache)
+            if chapter['content'].strip() else None
+            for chapter in chapter_data]
+
+def _extract_novel_keywords(kw_model, chapter_data, num_keywords, use_cache=True):
+    """
+    웹소설을 챕터 단위로 분석합니다. 챕터별 렉시콘 점수와 후보 구문 횟수는 챕터 내용 해시로 캐시되고
+    합산되므로, 챕터가 추가되면 새 챕터만 분석합니다.
+
+    Returns:
+        tuple: (KeyBERT 키워드 리스트, score_categories 형식의 점수)
+    """
+    records = [record for record in analyze_novel_chapters(chapter_data, use_cache) if record]
+    scores, candidates, doc = aggregate_chapters(records)
+    # 불용어는 챕터 분석 때 이미 걸렀으므로 후보에는 없음
+    with metrics.timer('keybert'):
+        keywords = _keybert_extract(kw_model, doc, None, num_keywords, candidates=candidates)
+    return keywords, scores
+
+def extract_keywords(content, content_type='webtoon', api_key=None, num_keywords=15, local_threshold=None):
     """
     콘텐츠에서 키워드와 분위기를 추출합니다.
     
@@ -243,6 +631,7 @@ def extract_keywords(content, content_type='webtoon', api_key=None, num_keywords
         content_type (str): 콘텐츠 타입 ('webtoon' 또는 'novel')
         api_key (str): OpenAI API 키 (선택 사항)
         num_keywords (int): 추출할 키워드 수
+        local_threshold (float): 웹툰 이미지에 로컬 분위기 분류기를 쓸 최소 신뢰도 (None이면 사용 안 함)
         
     Returns:
         tuple: (키워드 리스트, 장르, 분위기, 시대 배경, 음악 스타일)
@@ -250,8 +639,8 @@ def extract_keywords(content, content_type='webtoon', api_key=None, num_keywords
     print(f"Extracting detailed keywords and mood from {content_type} content...")
     
     try:
-        # KeyBERT 모델 초기화
-        kw_model = KeyBERT()
+        # KeyBERT 모델 (프로세스 내에서 재사용)
+        kw_model = get_keybert_model()
         client = get_openai_client(api_key) if api_key else None
         
         # 텍스트 추출
@@ -273,15 +662,14 @@ def extract_keywords(content, content_type='webtoon', api_key=None, num_keywords
             # 그룹 이미지 분석 (5개씩 묶은 이미지)
             if 'group_image_paths' in content and content['group_image_paths']:
                 group_keywords = []
-                for group_path in content['group_image_paths']:
-                    if os.path.exists(group_path):
-                        try:
-                            # 그룹 이미지 분석
-                            group_img_keywords = analyze_image_content(group_path, api_key)
-                            group_keywords.extend(group_img_keywords)
-                            print(f"Keywords from group image analysis: {group_img_keywords}")
-                        except Exception as group_error:
-                            print(f"Error in group image analysis: {group_error}")
+                group_paths = [path for path in content['group_image_paths'] if os.path.exists(path)]
+                try:
+                    # 그룹 이미지 분석 (여러 장을 한 번에 요청)
+                    for group_img_keywords in analyze_images_batch(group_paths, api_key, local_threshold=local_threshold):
+                        group_keywords.extend(group_img_keywords)
+                        print(f"Keywords from group image analysis: {group_img_keywords}")
+                except Exception as group_error:
+                    print(f"Error in group image analysis: {group_error}")
                 
                 # 중복 제거
                 image_keywords = list(set(group_keywords))
@@ -289,7 +677,8 @@ def extract_keywords(content, content_type='webtoon', api_key=None, num_keywords
             # 그룹 이미지가 없거나 분석 실패한 경우 전체 이미지 분석
             if not image_keywords and 'combined_image_path' in content and content['combined_image_path'] and os.path.exists(content['combined_image_path']):
                 try:
-                    image_keywords = analyze_image_content(content['combined_image_path'], api_key)
+                    image_keywords = analyze_image_content(content['combined_image_path'], api_key,
+                                                           local_threshold=local_threshold)
                     print(f"Keywords from combined image analysis: {image_keywords}")
                 except Exception as img_error:
                     print(f"Error in combined image analysis: {img_error}")
@@ -300,62 +689,18 @@ def extract_keywords(content, content_type='webtoon', api_key=None, num_keywords
         # 텍스트 전처리
         text = text.lower()
         
-        # 한국어 텍스트 처리
-        is_korean_dominant = sum(1 for char in text if ord('가') <= ord(char) <= ord('힣')) > len(text) / 3
-        
-        # KoNLPy 사용 여부 결정 (오류 방지)
-        use_konlpy = KONLPY_AVAILABLE and is_korean_dominant
-        
-        if use_konlpy:
-            # 한국어 형태소 분석
-            try:
-                # 전역 변수로 초기화된 Okt 인스턴스 사용
-                tokens = okt_initialized.morphs(text)
-                processed_text = ' '.join(tokens)
-                
-                # 한국어 불용어 설정 (확장)
-                korean_stop_words = {
-                    '이', '그', '저', '것', '이것', '저것', '그것', '및', '등', '등등',
-                    '나', '너', '우리', '저희', '당신', '그들', '그녀', '이런', '저런', '그런',
-                    '하다', '되다', '있다', '없다', '같다', '보다', '이다', '아니다',
-                    '그리고', '또는', '그러나', '하지만', '또한', '그래서', '왜냐하면',
-                    '에러', '오류', '에러가', '오류가', 'error', 'exception'  # 오류 관련 단어 추가
-                }
-                
-                # 키워드 추출
-                keywords = kw_model.extract_keywords(
-                    processed_text,
-                    keyphrase_ngram_range=(1, 2),
-                    stop_words=list(korean_stop_words),
-                    use_mmr=True,
-                    diversity=0.7,
-                    top_n=num_keywords
-                )
-            except Exception as e:
-                print(f"Error in Korean text processing: {e}")
-                # 오류 발생 시 영어 처리 방식으로 대체
-                use_konlpy = False
-        
-        if not use_konlpy:
-            # 영어 및 기타 언어 처리
-            # 특수 문자 제거
-            text = re.sub(r'[^\w\s]', '', text)
-            
-            # 영어 불용어 설정
-            stop_words = set(stopwords.words('english'))
-            # 오류 관련 단어 추가
-            error_words = {'error', 'exception', 'traceback', 'failed', 'failure', 'broken'}
-            stop_words.update(error_words)
+        if content_type == 'novel' and content.get('chapter_data'):
+            # 챕터별 캐시를 합산 (새로 추가된 챕터만 분석)
+            keywords, scores = _extract_novel_keywords(kw_model, content['chapter_data'], num_keywords)
+        else:
+            # 한국어 텍스트 처리 (KoNLPy 사용 여부 결정, 오류 방지)
+            use_konlpy = KONLPY_AVAILABLE and _is_korean_dominant(text)
+            processed_text, stop_words = _preprocess_text(text, use_konlpy)
             
             # 키워드 추출
-            keywords = kw_model.extract_keywords(
-                text, 
-                keyphrase_ngram_range=(1, 2), 
-                stop_words=list(stop_words),
-                use_mmr=True,
-                diversity=0.7,
-                top_n=num_keywords
-            )
+            with metrics.timer('keybert'):
+                keywords = _keybert_extract(kw_model, processed_text, stop_words, num_keywords)
+            scores = score_categories(text)
         
         # 키워드와 점수 분리
         keyword_list = [keyword for keyword, _ in keywords]
@@ -367,100 +712,8 @@ def extract_keywords(content, content_type='webtoon', api_key=None, num_keywords
         # 이미지 키워드 추가
         keyword_list.extend(image_keywords)
         
-        # 웹툰/웹소설 장르 분류 (확장된 장르 목록)
-        genre_keywords = {
-            'romance': ['love', 'romance', 'relationship', 'couple', 'dating', '사랑', '연애', '로맨스', '커플', '연인'],
-            'action': ['fight', 'battle', 'action', 'war', 'combat', '전투', '액션', '싸움', '전쟁', '격투'],
-            'fantasy': ['magic', 'dragon', 'wizard', 'elf', 'fantasy', '마법', '판타지', '용', '마법사', '요정'],
-            'horror': ['ghost', 'zombie', 'horror', 'scary', 'fear', '귀신', '공포', '좀비', '무서움', '두려움'],
-            'comedy': ['funny', 'comedy', 'laugh', 'humor', 'joke', '코미디', '웃음', '유머', '재미', '농담'],
-            'thriller': ['suspense', 'mystery', 'crime', 'detective', '스릴러', '서스펜스', '미스터리', '범죄', '탐정'],
-            'sci-fi': ['future', 'space', 'alien', 'robot', 'technology', '미래', '우주', '외계인', '로봇', '기술'],
-            'slice_of_life': ['daily', 'life', 'school', 'ordinary', '일상', '학교', '생활', '평범한', '일상생활'],
-            'historical': ['history', 'dynasty', 'kingdom', 'ancient', 'period', '역사', '왕조', '왕국', '고대', '시대극'],
-            'sports': ['sports', 'game', 'competition', 'athlete', 'team', '스포츠', '경기', '선수', '팀', '대회'],
-            'drama': ['drama', 'emotional', 'family', 'conflict', 'tragedy', '드라마', '감정', '가족', '갈등', '비극'],
-            'supernatural': ['ghost', 'spirit', 'psychic', 'paranormal', '초자연', '영혼', '귀신', '초능력', '신비']
-        }
-        
-        # 분위기 분류 (더 세분화된 분위기 목록)
-        mood_keywords = {
-            'happy': ['happy', 'joy', 'laugh', 'cheerful', 'bright', '행복', '기쁨', '웃음', '명랑', '밝음'],
-            'sad': ['sad', 'cry', 'tear', 'sorrow', 'melancholy', '슬픔', '눈물', '아픔', '우울', '비통'],
-            'exciting': ['exciting', 'thrill', 'adventure', 'dynamic', 'intense', '흥미', '모험', '스릴', '역동적', '강렬'],
-            'scary': ['scary', 'horror', 'fear', 'terror', 'dread', '공포', '두려움', '무서움', '공포감', '전율'],
-            'romantic': ['love', 'romance', 'kiss', 'heart', 'affection', '사랑', '로맨스', '키스', '애정', '설렘'],
-            'mysterious': ['mystery', 'secret', 'puzzle', 'enigma', 'curious', '미스터리', '비밀', '수수께끼', '의문', '호기심'],
-            'peaceful': ['peace', 'calm', 'quiet', 'relax', 'serene', '평화', '고요', '휴식', '평온', '차분'],
-            'tense': ['tension', 'anxiety', 'nervous', 'suspense', 'stress', '긴장', '불안', '초조', '서스펜스', '스트레스'],
-            'nostalgic': ['nostalgia', 'memory', 'reminisce', 'past', 'childhood', '향수', '추억', '회상', '과거', '어린 시절'],
-            'epic': ['epic', 'grand', 'majestic', 'magnificent', 'heroic', '서사시', '웅장', '장엄', '영웅적', '대서사'],
-            'comical': ['funny', 'comedy', 'humorous', 'witty', 'silly', '코믹', '유머', '재미있는', '익살', '우스운'],
-            'dreamy': ['dream', 'fantasy', 'surreal', 'ethereal', 'magical', '꿈같은', '환상적', '초현실적', '신비로운', '마법같은']
-        }
-        
-        # 시대 배경 분류
-        era_keywords = {
-            'modern': ['modern', 'contemporary', 'today', 'present', 'current', '현대', '현재', '요즘', '지금', '현시대'],
-            'future': ['future', 'futuristic', 'sci-fi', 'advanced', 'dystopian', '미래', '미래적', 'SF', '첨단', '디스토피아'],
-            'medieval': ['medieval', 'castle', 'knight', 'kingdom', 'sword', '중세', '성', '기사', '왕국', '검'],
-            'ancient': ['ancient', 'historical', 'old', 'traditional', 'classic', '고대', '역사적', '옛날', '전통적', '고전'],
-            'prehistoric': ['prehistoric', 'dinosaur', 'primitive', 'caveman', '선사시대', '공룡', '원시', '동굴인'],
-            'victorian': ['victorian', '19th century', 'industrial', '빅토리아', '19세기', '산업혁명'],
-            'renaissance': ['renaissance', 'baroque', 'artistic', '르네상스', '바로크', '예술적'],
-            'post_apocalyptic': ['apocalypse', 'post-apocalyptic', 'ruins', 'wasteland', '종말', '포스트 아포칼립스', '폐허', '황무지']
-        }
-        
-        # 음악 스타일 분류
-        music_style_keywords = {
-            'orchestral': ['orchestra', 'symphony', 'classical', 'epic', 'grand', '오케스트라', '교향곡', '클래식', '웅장한'],
-            'electronic': ['electronic', 'synth', 'techno', 'digital', 'edm', '일렉트로닉', '신스', '테크노', '디지털', 'EDM'],
-            'acoustic': ['acoustic', 'guitar', 'piano', 'soft', 'unplugged', '어쿠스틱', '기타', '피아노', '부드러운'],
-            'rock': ['rock', 'guitar', 'band', 'electric', 'heavy', '록', '기타', '밴드', '일렉트릭', '헤비'],
-            'jazz': ['jazz', 'saxophone', 'trumpet', 'swing', 'blues', '재즈', '색소폰', '트럼펫', '스윙', '블루스'],
-            'pop': ['pop', 'catchy', 'upbeat', 'mainstream', 'melody', '팝', '캐치한', '경쾌한', '대중적인', '멜로디'],
-            'ambient': ['ambient', 'atmospheric', 'background', 'calm', 'space', '앰비언트', '대기적', '배경', '고요한', '공간감'],
-            'folk': ['folk', 'traditional', 'acoustic', 'country', 'ballad', '포크', '전통적', '어쿠스틱', '컨트리', '발라드'],
-            'cinematic': ['cinematic', 'soundtrack', 'film', 'score', 'theme', '영화음악', '사운드트랙', '영화', '스코어', '테마'],
-            'hip_hop': ['hip hop', 'rap', 'beat', 'urban', 'rhythm', '힙합', '랩', '비트', '어반', '리듬'],
-            'lo_fi': ['lo-fi', 'chill', 'relaxed', 'mellow', 'calm', '로파이', '칠', '편안한', '차분한']
-        }
-        
-        # 텍스트에서 각 카테고리별 키워드 빈도 계산
-        genre_scores = {genre: 0 for genre in genre_keywords}
-        mood_scores = {mood: 0 for mood in mood_keywords}
-        era_scores = {era: 0 for era in era_keywords}
-        music_style_scores = {style: 0 for style in music_style_keywords}
-        
-        # 장르 점수 계산
-        for genre, words in genre_keywords.items():
-            for word in words:
-                if word in text.lower():
-                    genre_scores[genre] += text.lower().count(word)
-        
-        # 분위기 점수 계산
-        for mood, words in mood_keywords.items():
-            for word in words:
-                if word in text.lower():
-                    mood_scores[mood] += text.lower().count(word)
-        
-        # 시대 배경 점수 계산
-        for era, words in era_keywords.items():
-            for word in words:
-                if word in text.lower():
-                    era_scores[era] += text.lower().count(word)
-        
-        # 음악 스타일 점수 계산
-        for style, words in music_style_keywords.items():
-            for word in words:
-                if word in text.lower():
-                    music_style_scores[style] += text.lower().count(word)
-        
-        # 가장 높은 점수의 카테고리 선택
-        dominant_genre = max(genre_scores, key=genre_scores.get) if any(genre_scores.values()) else 'slice_of_life'
-        dominant_mood = max(mood_scores, key=mood_scores.get) if any(mood_scores.values()) else 'peaceful'
-        dominant_era = max(era_scores, key=era_scores.get) if any(era_scores.values()) else 'modern'
-        dominant_music_style = max(music_style_scores, key=music_style_scores.get) if any(music_style_scores.values()) else 'cinematic'
+        # 장르/분위기/시대 배경/음악 스타일 중 가장 높은 점수의 항목 선택
+        dominant_genre, dominant_mood, dominant_era, dominant_music_style = select_dominant(scores)
         
         # 결과 출력
         print(f"Extracted {len(keyword_list)} keywords")
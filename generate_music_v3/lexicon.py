@@ -0,0 +1,116 @@
+# 웹툰/웹소설 텍스트에서 장르, 분위기, 시대 배경, 음악 스타일을 판별하기 위한 키워드 사전
+
+# 웹툰/웹소설 장르 분류 (확장된 장르 목록)
+GENRE_KEYWORDS = {
+    'romance': ['love', 'romance', 'relationship', 'couple', 'dating', '사랑', '연애', '로맨스', '커플', '연인'],
+    'action': ['fight', 'battle', 'action', 'war', 'combat', '전투', '액션', '싸움', '전쟁', '격투'],
+    'fantasy': ['magic', 'dragon', 'wizard', 'elf', 'fantasy', '마법', '판타지', '용', '마법사', '요정'],
+    'horror': ['ghost', 'zombie', 'horror', 'scary', 'fear', '귀신', '공포', '좀비', '무서움', '두려움'],
+    'comedy': ['funny', 'comedy', 'laugh', 'humor', 'joke', '코미디', '웃음', '유머', '재미', '농담'],
+    'thriller': ['suspense', 'mystery', 'crime', 'detective', '스릴러', '서스펜스', '미스터리', '범죄', '탐정'],
+    'sci-fi': ['future', 'space', 'alien', 'robot', 'technology', '미래', '우주', '외계인', '로봇', '기술'],
+    'slice_of_life': ['daily', 'life', 'school', 'ordinary', '일상', '학교', '생활', '평범한', '일상생활'],
+    'historical': ['history', 'dynasty', 'kingdom', 'ancient', 'period', '역사', '왕조', '왕국', '고대', '시대극'],
+    'sports': ['sports', 'game', 'competition', 'athlete', 'team', '스포츠', '경기', '선수', '팀', '대회'],
+    'drama': ['drama', 'emotional', 'family', 'conflict', 'tragedy', '드라마', '감정', '가족', '갈등', '비극'],
+    'supernatural': ['ghost', 'spirit', 'psychic', 'paranormal', '초자연', '영혼', '귀신', '초능력', '신비']
+}
+
+# 분위기 분류 (더 세분화된 분위기 목록)
+MOOD_KEYWORDS = {
+    'happy': ['happy', 'joy', 'laugh', 'cheerful', 'bright', '행복', '기쁨', '웃음', '명랑', '밝음'],
+    'sad': ['sad', 'cry', 'tear', 'sorrow', 'melancholy', '슬픔', '눈물', '아픔', '우울', '비통'],
+    'exciting': ['exciting', 'thrill', 'adventure', 'dynamic', 'intense', '흥미', '모험', '스릴', '역동적', '강렬'],
+    'scary': ['scary', 'horror', 'fear', 'terror', 'dread', '공포', '두려움', '무서움', '공포감', '전율'],
+    'romantic': ['love', 'romance', 'kiss', 'heart', 'affection', '사랑', '로맨스', '키스', '애정', '설렘'],
+    'mysterious': ['mystery', 'secret', 'puzzle', 'enigma', 'curious', '미스터리', '비밀', '수수께끼', '의문', '호기심'],
+    'peaceful': ['peace', 'calm', 'quiet', 'relax', 'serene', '평화', '고요', '휴식', '평온', '차분'],
+    'tense': ['tension', 'anxiety', 'nervous', 'suspense', 'stress', '긴장', '불안', '초조', '서스펜스', '스트레스'],
+    'nostalgic': ['nostalgia', 'memory', 'reminisce', 'past', 'childhood', '향수', '추억', '회상', '과거', '어린 시절'],
+    'epic': ['epic', 'grand', 'majestic', 'magnificent', 'heroic', '서사시', '웅장', '장엄', '영웅적', '대서사'],
+    'comical': ['funny', 'comedy', 'humorous', 'witty', 'silly', '코믹', '유머', '재미있는', '익살', '우스운'],
+    'dreamy': ['dream', 'fantasy', 'surreal', 'ethereal', 'magical', '꿈같은', '환상적', '초현실적', '신비로운', '마법같은']
+}
+
+# 시대 배경 분류
+ERA_KEYWORDS = {
+    'modern': ['modern', 'contemporary', 'today', 'present', 'current', '현대', '현재', '요즘', '지금', '현시대'],
+    'future': ['future', 'futuristic', 'sci-fi', 'advanced', 'dystopian', '미래', '미래적', 'SF', '첨단', '디스토피아'],
+    'medieval': ['medieval', 'castle', 'knight', 'kingdom', 'sword', '중세', '성', '기사', '왕국', '검'],
+    'ancient': ['ancient', 'historical', 'old', 'traditional', 'classic', '고대', '역사적', '옛날', '전통적', '고전'],
+    'prehistoric': ['prehistoric', 'dinosaur', 'primitive', 'caveman', '선사시대', '공룡', '원시', '동굴인'],
+    'victorian': ['victorian', '19th century', 'industrial', '빅토리아', '19세기', '산업혁명'],
+    'renaissance': ['renaissance', 'baroque', 'artistic', '르네상스', '바로크', '예술적'],
+    'post_apocalyptic': ['apocalypse', 'post-apocalyptic', 'ruins', 'wasteland', '종말', '포스트 아포칼립스', '폐허', '황무지']
+}
+
+# 음악 스타일 분류
+MUSIC_STYLE_KEYWORDS = {
+    'orchestral': ['orchestra', 'symphony', 'classical', 'epic', 'grand', '오케스트라', '교향곡', '클래식', '웅장한'],
+    'electronic': ['electronic', 'synth', 'techno', 'digital', 'edm', '일렉트로닉', '신스', '테크노', '디지털', 'EDM'],
+    'acoustic': ['acoustic', 'guitar', 'piano', 'soft', 'unplugged', '어쿠스틱', '기타', '피아노', '부드러운'],
+    'rock': ['rock', 'guitar', 'band', 'electric', 'heavy', '록', '기타', '밴드', '일렉트릭', '헤비'],
+    'jazz': ['jazz', 'saxophone', 'trumpet', 'swing', 'blues', '재즈', '색소폰', '트럼펫', '스윙', '블루스'],
+    'pop': ['pop', 'catchy', 'upbeat', 'mainstream', 'melody', '팝', '캐치한', '경쾌한', '대중적인', '멜로디'],
+    'ambient': ['ambient', 'atmospheric', 'background', 'calm', 'space', '앰비언트', '대기적', '배경', '고요한', '공간감'],
+    'folk': ['folk', 'traditional', 'acoustic', 'country', 'ballad', '포크', '전통적', '어쿠스틱', '컨트리', '발라드'],
+    'cinematic': ['cinematic', 'soundtrack', 'film', 'score', 'theme', '영화음악', '사운드트랙', '영화', '스코어', '테마'],
+    'hip_hop': ['hip hop', 'rap', 'beat', 'urban', 'rhythm', '힙합', '랩', '비트', '어반', '리듬'],
+    'lo_fi': ['lo-fi', 'chill', 'relaxed', 'mellow', 'calm', '로파이', '칠', '편안한', '차분한']
+}
+
+# 매칭되는 키워드가 없을 때의 기본값
+DEFAULT_GENRE = 'slice_of_life'
+DEFAULT_MOOD = 'peaceful'
+DEFAULT_ERA = 'modern'
+DEFAULT_MUSIC_STYLE = 'cinematic'
+
+# 카테고리 이름 → (키워드 사전, 기본값)
+LEXICONS = {
+    'genre': (GENRE_KEYWORDS, DEFAULT_GENRE),
+    'mood': (MOOD_KEYWORDS, DEFAULT_MOOD),
+    'era': (ERA_KEYWORDS, DEFAULT_ERA),
+    'music_style': (MUSIC_STYLE_KEYWORDS, DEFAULT_MUSIC_STYLE)
+}
+
+def count_lexicon(text, lexicon):
+    """
+    텍스트에서 키워드 사전의 각 항목별 키워드 등장 횟수를 셉니다.
+
+    Args:
+        text (str): 소문자로 변환된 텍스트
+        lexicon (dict): 항목 → 키워드 리스트
+
+    Returns:
+        dict: 항목 → 등장 횟수 합계
+    """
+    return {category: sum(text.count(word) for word in words) for category, words in lexicon.items()}
+
+def score_categories(text):
+    """
+    텍스트의 장르/분위기/시대 배경/음악 스타일 점수를 계산합니다.
+
+    Args:
+        text (str): 분석할 텍스트
+
+    Returns:
+        dict: 카테고리 이름 → (항목 → 점수)
+    """
+    text = text.lower()
+    return {name: count_lexicon(text, lexicon) for name, (lexicon, _) in LEXICONS.items()}
+
+def select_dominant(scores):
+    """
+    카테고리별로 가장 높은 점수의 항목을 선택합니다 (점수가 모두 0이면 기본값).
+
+    Args:
+        scores (dict): score_categories의 결과
+
+    Returns:
+        tuple: (장르, 분위기, 시대 배경, 음악 스타일)
+    """
+    dominant = []
+    for name, (_, default) in LEXICONS.items():
+        category_scores = scores[name]
+        dominant.append(max(category_scores, key=category_scores.get) if any(category_scores.values()) else default)
+    return tuple(dominant)
@@ -3,11 +3,17 @@ import os
 import datetime
 import uuid
 import traceback
+from contextlib import nullcontext
 from webtoon_processor import extract_webtoon_content
 from novel_processor import process_novel_file
-from keyword_extractor import extract_keywords
-from music_generator import generate_music
-from utils import visualize_keywords
+from keyword_extractor import extract_keywords, analyze_novel_chapters
+from music_generator import generate_music, AUDIO_FORMATS
+from soundtrack import build_soundtrack
+from utils import submit_visualization, wait_for_visualization
+from prompt_cache import DEFAULT_SIMILARITY_THRESHOLD
+from image_mood import LOCAL_MOOD_CONFIDENCE
+import metrics
+from memory_profiling import MemoryProfiler
 
 def create_output_directory(content_type, input_source):
     """
@@ -38,6 +44,181 @@ def create_output_directory(content_type, input_source):
     print(f"Created output directory: {output_dir}")
     return output_dir
 
+def prepare_job(content_type, input_source, api_key, output=None, use_cache=False, output_format=None,
+                similarity_threshold=None, instant=False, live_fallback=True, soundtrack=False,
+                local_mood_threshold=None):
+    """
+    입력 하나를 처리하기 위한 작업 정보를 만들고 출력 디렉토리를 생성합니다.
+
+    Args:
+        content_type (str): 콘텐츠 타입 ('webtoon' 또는 'novel')
+        input_source (str): 웹툰 URL, 쉼표로 구분된 이미지 경로 또는 소설 파일 경로
+        api_key (str): OpenAI API 키
+        output (str): 출력 음악 파일 경로 (파일명만 사용, 선택 사항)
+        use_cache (bool): 캐시 사용 여부
+        output_format (str): 음악 파일 형식 ('wav', 'flac', 'opus', 'mp3', None이면 출력 파일 확장자로 결정)
+        similarity_threshold (float): 유사 프롬프트 음악 캐시 임계값 (None이면 사용 안 함)
+        instant (bool): 미리 생성한 음악 라이브러리에서 바로 가져오기
+        live_fallback (bool): instant 모드에서 라이브러리에 없으면 새로 생성할지 여부
+        soundtrack (bool): 웹소설 챕터별 분위기에 맞춘 사운드트랙도 생성
+        local_mood_threshold (float): 웹툰 이미지에 로컬 분위기 분류기를 쓸 최소 신뢰도 (None이면 항상 Vision API)
+
+    Returns:
+        dict: 작업 정보 (각 단계를 거치며 결과가 채워짐)
+    """
+    output_dir = create_output_directory(content_type, input_source)
+    output_filename = os.path.basename(output) if output else "generated_music.wav"
+    if output_format:
+        output_filename = os.path.splitext(output_filename)[0] + "." + output_format
+    output_path = os.path.join(output_dir, output_filename)
+
+    print(f"Processing {content_type} content from {input_source}...")
+    print(f"Output will be saved to: {output_path}")
+
+    return {
+        'type': content_type,
+        'input': input_source,
+        'api_key': api_key,
+        'use_cache': use_cache,
+        'output_format': output_format,
+        'similarity_threshold': similarity_threshold,
+        'instant': instant,
+        'live_fallback': live_fallback,
+        'soundtrack': soundtrack,
+        'local_mood_threshold': local_mood_threshold,
+        'output_dir': output_dir,
+        'output_filename': output_filename,
+        'output_path': output_path
+    }
+
+def extract_stage(job):
+    """웹툰/소설 콘텐츠 추출 단계"""
+    content = {}
+    if job['type'] == 'webtoon':
+        if job['input'].startswith('http'):
+            content = extract_webtoon_content(job['input'], use_cache=job['use_cache'], output_dir=job['output_dir'], api_key=job['api_key'],
+                                              local_threshold=job.get('local_mood_threshold'))
+        else:
+            image_files = job['input'].split(',')
+            content = extract_webtoon_content(image_files, use_cache=job['use_cache'], output_dir=job['output_dir'], api_key=job['api_key'],
+                                              local_threshold=job.get('local_mood_threshold'))
+
+    elif job['type'] == 'novel':
+        content = process_novel_file(job['input'])
+        preview_path = os.path.join(job['output_dir'], "novel_preview.txt")
+        with open(preview_path, "w", encoding="utf-8") as f:
+            preview_text = content['full_text'][:1000] + "..." if len(content['full_text']) > 1000 else content['full_text']
+            f.write(preview_text)
+
+    job['content'] = content
+    return job
+
+def keyword_stage(job):
+    """키워드/분위기 추출 단계"""
+    keywords, genre, mood, era, music_style = extract_keywords(job['content'], content_type=job['type'], api_key=job['api_key'],
+                                                               local_threshold=job.get('local_mood_threshold'))
+
+    # 키워드 정보 저장
+    keywords_info_path = os.path.join(job['output_dir'], "keywords_info.txt")
+    with open(keywords_info_path, "w", encoding="utf-8") as f:
+        f.write(f"Detected genre: {genre}\n")
+        f.write(f"Detected mood: {mood}\n")
+        f.write(f"Detected era: {era}\n")
+        f.write(f"Suggested music style: {music_style}\n")
+
+    print(f"Extracted keywords: {keywords}")
+    print(f"Detected genre: {genre}")
+    print(f"Detected mood: {mood}")
+    print(f"Detected era: {era}")
+    print(f"Suggested music style: {music_style}")
+
+    job.update({'keywords': keywords, 'genre': genre, 'mood': mood, 'era': era, 'music_style': music_style})
+    return job
+
+def visualize_stage(job):
+    """키워드 시각화 단계 (백그라운드 워커에 맡기고 바로 다음 단계로 진행)"""
+    visualization_path = os.path.join(job['output_dir'], "keywords_visualization.png")
+    job['visualization_future'] = submit_visualization(job['keywords'], output_path=visualization_path)
+    return job
+
+def finish_visualization(job):
+    """백그라운드 시각화가 끝날 때까지 기다리고 응답 지연에서 빠진 시간 출력"""
+    future = job.pop('visualization_future', None)
+    if future is None:
+        return
+    try:
+        timing = wait_for_visualization(future)
+        print(f"Keyword visualization rendered in background: {timing['render_seconds']:.2f}s "
+              f"(waited {timing['wait_seconds']:.2f}s, {timing['saved_seconds']:.2f}s off the critical path)")
+    except Exception as e:
+        print(f"Error in background keyword visualization: {e}")
+
+def music_stage(job):
+    """음악 생성 단계 (성공 시 요약 파일 저장)"""
+    music_path = generate_music(job['keywords'], job['genre'], job['mood'], job['era'], job['music_style'], job['output_path'],
+                                output_format=job.get('output_format'),
+                                similarity_threshold=job.get('similarity_threshold'),
+                                instant=job.get('instant', False), live_fallback=job.get('live_fallback', True))
+    job['music_path'] = music_path
+
+    # 챕터별 사운드트랙 (챕터 분석은 키워드 단계의 캐시를 그대로 사용)
+    if job.get('soundtrack') and job['type'] == 'novel' and job['content'].get('chapter_data'):
+        try:
+            chapter_data = job['content']['chapter_data']
+            job['soundtrack_index'] = build_soundtrack(chapter_data, analyze_novel_chapters(chapter_data),
+                                                       job['keywords'], job['genre'], job['mood'], job['era'],
+                                                       job['music_style'], job['output_dir'],
+                                                       output_format=job.get('output_format') or os.path.splitext(job['output_path'])[1][1:],
+                                                       use_cache=job['use_cache'])
+        except Exception as e:
+            print(f"Error generating soundtrack: {e}")
+
+    # 요약을 쓰기 전에 시각화 파일이 완성되었는지 확인
+    finish_visualization(job)
+
+    if music_path:
+        print(f"Music generated successfully at {music_path}")
+        summary_path = os.path.join(job['output_dir'], "summary.txt")
+        with open(summary_path, "w", encoding="utf-8") as f:
+            f.write(f"Content Type: {job['type']}\n")
+            f.write(f"Input Source: {job['input']}\n")
+            f.write(f"Generated Music: {os.path.basename(music_path)}\n")
+            f.write(f"Genre: {job['genre']}\n")
+            f.write(f"Mood: {job['mood']}\n")
+            f.write(f"Era: {job['era']}\n")
+            f.write(f"Music Style: {job['music_style']}\n")
+            f.write(f"Keywords: {', '.join(job['keywords'])}\n")
+            if job.get('soundtrack_index'):
+                f.write(f"Soundtrack Index: {os.path.relpath(job['soundtrack_index'], job['output_dir'])}\n")
+            f.write(f"Processed on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+
+        print(f"All output files saved to directory: {job['output_dir']}")
+    else:
+        print("Failed to generate music")
+    return job
+
+# 입력 하나를 처리하는 단계 순서
+PIPELINE_STAGES = [
+    ('extract', extract_stage),
+    ('keywords', keyword_stage),
+    ('visualize', visualize_stage),
+    ('music', music_stage)
+]
+
+def run_job(job, profiler=None):
+    """
+    작업의 모든 단계를 순서대로 실행합니다.
+
+    Args:
+        job (dict): prepare_job으로 만든 작업 정보
+        profiler (MemoryProfiler): 단계별 메모리 측정기 (선택 사항)
+    """
+    for name, stage in PIPELINE_STAGES:
+        memory_stage = profiler.stage(name, input=job['input']) if profiler else nullcontext()
+        with metrics.timer(f"pipeline_{name}"), memory_stage:
+            stage(job)
+    return job
+
 def main():
     """
     프로그램의 메인 엔트리 포인트. 웹툰 또는 소설을 입력으로 받아 음악을 생성합니다.
@@ -49,77 +230,33 @@ def main():
         parser.add_argument('--output', default=None, help='Output music file path (optional)')
         parser.add_argument('--api_key', required=True, help='OpenAI API key')
         parser.add_argument('--use_cache', action='store_true', help='Use cached content if available')
+        parser.add_argument('--format', choices=sorted(AUDIO_FORMATS), default=None, help='Output audio format (default: output file extension, or wav)')
+        parser.add_argument('--semantic_cache', type=float, nargs='?', const=DEFAULT_SIMILARITY_THRESHOLD, default=None,
+                            metavar='THRESHOLD', help=f'Reuse cached music for similar prompts (default threshold: {DEFAULT_SIMILARITY_THRESHOLD})')
+        parser.add_argument('--instant', action='store_true', help='Serve music from the pre-generated library (see music_library.py)')
+        parser.add_argument('--no_live_fallback', action='store_true', help='With --instant, fail instead of generating when the library has no track')
+        parser.add_argument('--soundtrack', action='store_true', help='For novels, also generate a per-chapter soundtrack of mood cues')
+        parser.add_argument('--local_mood', type=float, nargs='?', const=LOCAL_MOOD_CONFIDENCE, default=None, metavar='THRESHOLD',
+                            help='Skip the vision API for webtoon images the fitted local mood classifier is confident about '
+                                 '(see image_mood.py fit; the calibrated threshold is used if higher)')
+        parser.add_argument('--profile-memory', dest='profile_memory', action='store_true', help='Record per-stage memory usage (tracemalloc, RSS, JVM heap)')
 
         args = parser.parse_args()
 
-        output_dir = create_output_directory(args.type, args.input)
-
-        if args.output:
-            output_filename = os.path.basename(args.output)
-        else:
-            output_filename = "generated_music.wav"
-
-        output_path = os.path.join(output_dir, output_filename)
-
-        print(f"Processing {args.type} content from {args.input}...")
-        print(f"Output will be saved to: {output_path}")
-
-        content = {}
-        if args.type == 'webtoon':
-            if args.input.startswith('http'):
-                content = extract_webtoon_content(args.input, use_cache=args.use_cache, output_dir=output_dir)
-            else:
-                image_files = args.input.split(',')
-                content = extract_webtoon_content(image_files, use_cache=args.use_cache, output_dir=output_dir)
-
-        elif args.type == 'novel':
-            content = process_novel_file(args.input)
-            preview_path = os.path.join(output_dir, "novel_preview.txt")
-            with open(preview_path, "w", encoding="utf-8") as f:
-                preview_text = content['full_text'][:1000] + "..." if len(content['full_text']) > 1000 else content['full_text']
-                f.write(preview_text)
-
-        # 키워드 추출
-        keywords, genre, mood, era, music_style = extract_keywords(content, content_type=args.type, api_key=args.api_key)
-
-        # 키워드 정보 저장
-        keywords_info_path = os.path.join(output_dir, "keywords_info.txt")
-        with open(keywords_info_path, "w", encoding="utf-8") as f:
-            f.write(f"Detected genre: {genre}\n")
-            f.write(f"Detected mood: {mood}\n")
-            f.write(f"Detected era: {era}\n")
-            f.write(f"Suggested music style: {music_style}\n")
-
-        print(f"Extracted keywords: {keywords}")
-        print(f"Detected genre: {genre}")
-        print(f"Detected mood: {mood}")
-        print(f"Detected era: {era}")
-        print(f"Suggested music style: {music_style}")
-
-        # 키워드 시각화 저장
-        visualization_path = os.path.join(output_dir, "keywords_visualization.png")
-        visualize_keywords(keywords, output_path=visualization_path)
-
-        # 음악 생성
-        music_path = generate_music(keywords, genre, mood, era, music_style, output_path)
-
-        if music_path:
-            print(f"Music generated successfully at {music_path}")
-            summary_path = os.path.join(output_dir, "summary.txt")
-            with open(summary_path, "w", encoding="utf-8") as f:
-                f.write(f"Content Type: {args.type}\n")
-                f.write(f"Input Source: {args.input}\n")
-                f.write(f"Generated Music: {output_filename}\n")
-                f.write(f"Genre: {genre}\n")
-                f.write(f"Mood: {mood}\n")
-                f.write(f"Era: {era}\n")
-                f.write(f"Music Style: {music_style}\n")
-                f.write(f"Keywords: {', '.join(keywords)}\n")
-                f.write(f"Processed on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-
-            print(f"All output files saved to directory: {output_dir}")
-        else:
-            print("Failed to generate music")
+        profiler = MemoryProfiler() if args.profile_memory else None
+        job = prepare_job(args.type, args.input, args.api_key, output=args.output, use_cache=args.use_cache,
+                          output_format=args.format, similarity_threshold=args.semantic_cache,
+                          instant=args.instant, live_fallback=not args.no_live_fallback,
+                          soundtrack=args.soundtrack, local_mood_threshold=args.local_mood)
+        try:
+            run_job(job, profiler=profiler)
+        finally:
+            if profiler:
+                profiler.print_table()
+                profiler.write_json(os.path.join(job['output_dir'], "memory_profile.json"))
+            # 단계별 시간, 캐시 적중률 등 실행 메트릭 저장
+            metrics.write_json(os.path.join(job['output_dir'], "run_metrics.json"),
+                               extra={'type': args.type, 'input': args.input})
 
     except Exception as e:
         print(f"An error occurred: {e}")
@@ -0,0 +1,228 @@
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+MB = 1024 * 1024
+
+def current_rss_mb():
+    """현재 프로세스 RSS(MB)를 반환합니다. 측정할 수 없으면 None"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / MB
+    except Exception:
+        pass
+    try:
+        # Linux: /proc/self/statm의 두 번째 값이 RSS 페이지 수
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / MB
+    except Exception:
+        return None
+
+def current_uss_mb():
+    """
+    현재 프로세스 USS(MB, 이 프로세스만 쓰는 메모리)를 반환합니다.
+    여러 워커가 공유하는 페이지(메모리 맵 모델 가중치 등)는 빠집니다. 측정할 수 없으면 None
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_full_info().uss / MB
+    except Exception:
+        pass
+    try:
+        # Linux: smaps_rollup의 Private_Clean + Private_Dirty가 USS
+        private_kb = 0
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                    private_kb += int(line.split()[1])
+        return private_kb / 1024
+    except Exception:
+        return None
+
+def peak_rss_mb():
+    """프로세스의 최대 RSS(MB)를 반환합니다. 측정할 수 없으면 None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS는 바이트, Linux는 KB 단위
+        return peak / MB if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / MB
+    except Exception:
+        return None
+
+def _jvm_heap_pools():
+    """JPype로 시작된 JVM의 힙 메모리 풀 목록 (JVM이 없으면 빈 리스트)"""
+    try:
+        import jpype
+        if not jpype.isJVMStarted():
+            return []
+        management = jpype.JPackage('java').lang.management
+        heap = management.MemoryType.HEAP
+        return [pool for pool in management.ManagementFactory.getMemoryPoolMXBeans() if pool.getType() == heap]
+    except Exception:
+        return []
+
+def _jvm_heap_used_mb():
+    """JVM 힙 사용량(MB). JVM이 없으면 None"""
+    try:
+        import jpype
+        if not jpype.isJVMStarted():
+            return None
+        runtime = jpype.JPackage('java').lang.Runtime.getRuntime()
+        return (runtime.totalMemory() - runtime.freeMemory()) / MB
+    except Exception:
+        return None
+
+class RssSampler:
+    """with 블록 실행 중 RSS를 주기적으로 측정해 최댓값을 기록하는 백그라운드 스레드 (peak는 블록 구간의 최댓값)"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            rss = current_rss_mb()
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        rss = current_rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+class MemoryProfiler:
+    """
+    파이프라인 단계별 메모리 사용량을 기록합니다.
+    단계마다 tracemalloc 최대 할당량과 상위 할당 위치, 프로세스 RSS 최댓값,
+    JPype JVM 힙 최댓값을 측정합니다.
+
+    Args:
+        top_n (int): 단계별로 기록할 상위 할당 위치 개수
+        sample_interval (float): RSS 측정 간격(초)
+    """
+
+    def __init__(self, top_n=10, sample_interval=0.05):
+        self.top_n = top_n
+        self.sample_interval = sample_interval
+        self.records = []
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name, **info):
+        """
+        with 블록 하나를 단계로 측정합니다.
+
+        Args:
+            name (str): 단계 이름
+            **info: 함께 기록할 정보 (입력 등)
+        """
+        pools = _jvm_heap_pools()
+        for pool in pools:
+            pool.resetPeakUsage()
+
+        rss_before = current_rss_mb()
+        tracemalloc.reset_peak()
+        snapshot_before = tracemalloc.take_snapshot()
+        traced_before, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+
+        with RssSampler(self.sample_interval) as sampler:
+            try:
+                yield
+            finally:
+                elapsed = time.perf_counter() - start
+
+        traced_after, traced_peak = tracemalloc.get_traced_memory()
+        snapshot_after = tracemalloc.take_snapshot()
+        top_stats = snapshot_after.compare_to(snapshot_before, 'lineno')[:self.top_n]
+
+        jvm_peak = sum(pool.getPeakUsage().getUsed() for pool in pools) / MB if pools else None
+
+        record = {
+            'stage': name,
+            'seconds': elapsed,
+            'rss_before_mb': rss_before,
+            'rss_peak_mb': sampler.peak,
+            'rss_after_mb': current_rss_mb(),
+            'python_peak_mb': (traced_peak - traced_before) / MB,
+            'python_retained_mb': (traced_after - traced_before) / MB,
+            'jvm_heap_peak_mb': jvm_peak,
+            'jvm_heap_used_mb': _jvm_heap_used_mb(),
+            'top_allocators': [
+                {'location': str(stat.traceback[0]), 'size_diff_mb': stat.size_diff / MB, 'count_diff': stat.count_diff}
+                for stat in top_stats
+            ]
+        }
+        record.update(info)
+        self.records.append(record)
+
+    def summary(self):
+        """
+        단계별 최댓값 요약 (같은 단계가 여러 번 실행되면 가장 큰 값)
+
+        Returns:
+            dict: 단계 이름 → 요약
+        """
+        summary = {}
+        for record in self.records:
+            entry = summary.setdefault(record['stage'], {'runs': 0, 'seconds': 0.0, 'rss_peak_mb': None,
+                                                         'python_peak_mb': None, 'jvm_heap_peak_mb': None})
+            entry['runs'] += 1
+            entry['seconds'] += record['seconds']
+            for key in ('rss_peak_mb', 'python_peak_mb', 'jvm_heap_peak_mb'):
+                if record[key] is not None and (entry[key] is None or record[key] > entry[key]):
+                    entry[key] = record[key]
+        return summary
+
+    def print_table(self):
+        """단계별 메모리 사용량 표 출력"""
+        def fmt(value):
+            return f"{value:.1f}" if value is not None else "-"
+
+        print(f"{'stage':<14}{'runs':>6}{'time(s)':>10}{'RSS peak(MB)':>14}{'py peak(MB)':>13}{'JVM peak(MB)':>14}")
+        for name, entry in self.summary().items():
+            print(f"{name:<14}{entry['runs']:>6}{entry['seconds']:>10.1f}{fmt(entry['rss_peak_mb']):>14}"
+                  f"{fmt(entry['python_peak_mb']):>13}{fmt(entry['jvm_heap_peak_mb']):>14}")
+        overall = peak_rss_mb()
+        if overall is not None:
+            print(f"Process peak RSS: {overall:.1f} MB")
+
+        # 단계별로 가장 많이 할당한 위치
+        for record in self.records:
+            if record['top_allocators']:
+                top = record['top_allocators'][0]
+                print(f"  {record['stage']}: top allocator {top['location']} ({top['size_diff_mb']:+.1f} MB)")
+
+    def write_json(self, path):
+        """단계별 측정 결과를 JSON으로 저장"""
+        data = {
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'process_peak_rss_mb': peak_rss_mb(),
+            'summary': self.summary(),
+            'records': self.records
+        }
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            print(f"Memory profile saved to {path}")
+        except Exception as e:
+            print(f"Error saving memory profile: {e}")
+        return path
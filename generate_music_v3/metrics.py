@@ -0,0 +1,162 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# 프로메테우스 메트릭 이름 접두사
+METRIC_PREFIX = "lyr_"
+
+# 히스토그램 버킷 (초 단위 타이밍 기준)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+def _label_key(labels):
+    """라벨 딕셔너리를 정렬된 튜플로 변환 (딕셔너리 키로 사용)"""
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def increment(name, value=1, **labels):
+    """
+    카운터를 증가시킵니다.
+
+    Args:
+        name (str): 카운터 이름 (예: 'cache_hits_total')
+        value (float): 증가량
+        **labels: 라벨 (예: cache='ocr')
+    """
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    """
+    히스토그램에 값을 기록합니다.
+
+    Args:
+        name (str): 히스토그램 이름 (예: 'stage_seconds')
+        value (float): 기록할 값
+        buckets (tuple): 버킷 상한값
+        **labels: 라벨 (예: stage='ocr')
+    """
+    key = (name, _label_key(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = {'buckets': tuple(buckets), 'bucket_counts': [0] * len(buckets),
+                    'count': 0, 'sum': 0.0, 'min': None, 'max': None}
+            _histograms[key] = hist
+        for i, bound in enumerate(hist['buckets']):
+            if value <= bound:
+                hist['bucket_counts'][i] += 1
+        hist['count'] += 1
+        hist['sum'] += value
+        hist['min'] = value if hist['min'] is None else min(hist['min'], value)
+        hist['max'] = value if hist['max'] is None else max(hist['max'], value)
+
+@contextmanager
+def timer(stage, **labels):
+    """
+    with 블록의 실행 시간을 'stage_seconds' 히스토그램에 기록합니다.
+
+    Args:
+        stage (str): 단계 이름 (예: 'ocr', 'vision_api', 'musicgen_load')
+        **labels: 추가 라벨
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('stage_seconds', time.perf_counter() - start, stage=stage, **labels)
+
+def reset():
+    """모든 메트릭 초기화"""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+def snapshot():
+    """
+    현재 메트릭을 JSON으로 직렬화할 수 있는 형태로 반환합니다.
+
+    Returns:
+        dict: {'counters': [...], 'histograms': [...]}
+    """
+    with _lock:
+        counters = [
+            {'name': name, 'labels': dict(labels), 'value': value}
+            for (name, labels), value in sorted(_counters.items())
+        ]
+        histograms = []
+        for (name, labels), hist in sorted(_histograms.items()):
+            histograms.append({
+                'name': name,
+                'labels': dict(labels),
+                'count': hist['count'],
+                'sum': hist['sum'],
+                'min': hist['min'],
+                'max': hist['max'],
+                'mean': hist['sum'] / hist['count'] if hist['count'] else 0.0,
+                'buckets': dict(zip((str(b) for b in hist['buckets']), hist['bucket_counts']))
+            })
+    return {'counters': counters, 'histograms': histograms}
+
+def write_json(path, extra=None):
+    """
+    메트릭을 JSON 파일로 저장합니다.
+
+    Args:
+        path (str): 저장 경로
+        extra (dict): 함께 저장할 실행 정보 (입력, 출력 디렉토리 등)
+    """
+    data = {'created_at': time.strftime('%Y-%m-%d %H:%M:%S')}
+    if extra:
+        data.update(extra)
+    data.update(snapshot())
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        print(f"Metrics saved to {path}")
+    except Exception as e:
+        print(f"Error saving metrics: {e}")
+    return path
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (list(extra) if extra else [])
+    if not items:
+        return ""
+    escaped = []
+    for k, v in items:
+        v = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{k}="{v}"')
+    return "{" + ",".join(escaped) + "}"
+
+def to_prometheus():
+    """
+    메트릭을 Prometheus 텍스트 형식(0.0.4)으로 변환합니다.
+
+    Returns:
+        str: Prometheus 텍스트
+    """
+    lines = []
+    with _lock:
+        typed = set()
+        for (name, labels), value in sorted(_counters.items()):
+            metric = METRIC_PREFIX + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+        for (name, labels), hist in sorted(_histograms.items()):
+            metric = METRIC_PREFIX + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            for bound, count in zip(hist['buckets'], hist['bucket_counts']):
+                lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist['count']}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {hist['sum']}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {hist['count']}")
+    return "\n".join(lines) + "\n"
@@ -1,194 +1,326 @@
 from transformers import AutoProcessor, MusicgenForConditionalGeneration
 import torch
-import scipy.io.wavfile
 import numpy as np
 import os
 import random
-from pydub import AudioSegment
+import shutil
 import hashlib
 import json
+import threading
+import time
+import metrics
+from audio_engine import AUDIO_FORMATS, OPUS_SAMPLING_RATES, BLOCK_FRAMES, audio_format_for, open_writer, write_block
 
-def generate_music(keywords, genre, mood, era, music_style, output_path, use_cache=True):
+# MusicGen 모델은 프로세스당 한 번만 로드해서 재사용
+MUSICGEN_MODEL_NAME = "facebook/musicgen-small"
+_musicgen = None
+_musicgen_lock = threading.Lock()
+
+# 장르별 음악 스타일 매핑
+GENRE_STYLE_MAP = {
+    'romance': 'emotional and tender melody with soft instrumentation',
+    'action': 'energetic and powerful music with strong percussion and dynamic rhythm',
+    'fantasy': 'magical and enchanting composition with mystical elements',
+    'horror': 'eerie and tense atmospheric music with dissonant tones',
+    'comedy': 'light and playful melody with quirky elements',
+    'thriller': 'suspenseful music with building tension and dramatic moments',
+    'sci-fi': 'futuristic electronic sounds with innovative textures',
+    'slice_of_life': 'gentle and simple melody reflecting everyday moments',
+    'historical': 'traditional instrumentation with cultural elements',
+    'sports': 'energetic and triumphant music with motivational elements',
+    'drama': 'emotional and moving composition with heartfelt melody',
+    'supernatural': 'mysterious and otherworldly sounds with ethereal elements'
+}
+
+# 분위기별 음악 특성 매핑
+MOOD_STYLE_MAP = {
+    'happy': 'upbeat and cheerful with bright tones',
+    'sad': 'melancholic and emotional with minor key progression',
+    'exciting': 'thrilling and dynamic with energetic rhythm',
+    'scary': 'dark and ominous with unsettling elements',
+    'romantic': 'tender and intimate with warm harmonies',
+    'mysterious': 'intriguing and enigmatic with curious progression',
+    'peaceful': 'calm and serene with gentle flow',
+    'tense': 'suspenseful and anxious with building intensity',
+    'nostalgic': 'wistful and sentimental with reflective quality',
+    'epic': 'grand and majestic with powerful dynamics',
+    'comical': 'playful and light with quirky elements',
+    'dreamy': 'ethereal and floating with surreal quality'
+}
+
+# 시대별 음악 특성 매핑
+ERA_STYLE_MAP = {
+    'modern': 'contemporary sound with current production techniques',
+    'future': 'futuristic electronic elements with advanced sound design',
+    'medieval': 'ancient instruments and traditional melodies',
+    'ancient': 'classical elements with timeless quality',
+    'prehistoric': 'primitive percussion and primal sounds',
+    'victorian': 'elegant classical instrumentation with refined quality',
+    'renaissance': 'artistic classical arrangements with cultural elements',
+    'post_apocalyptic': 'desolate atmosphere with sparse instrumentation'
+}
+
+# 음악 스타일별 특성 매핑
+MUSIC_STYLE_MAP = {
+    'orchestral': 'grand orchestral arrangement with rich instrumentation',
+    'electronic': 'modern electronic production with digital elements',
+    'acoustic': 'natural acoustic instruments with organic quality',
+    'rock': 'electric guitars and drums with strong energy',
+    'jazz': 'smooth jazz elements with sophisticated harmonies',
+    'pop': 'catchy pop melody with contemporary production',
+    'ambient': 'atmospheric textures with spacious sound design',
+    'folk': 'traditional folk instruments with authentic feel',
+    'cinematic': 'dramatic film score style with emotional impact',
+    'hip_hop': 'rhythmic beats with urban feel',
+    'lo_fi': 'relaxed lo-fi beats with warm nostalgic quality'
+}
+
+# 세그먼트별 프롬프트 변형
+SEGMENT_DESCRIPTORS = ["intro", "building", "main theme", "variation", "bridge", "outro"]
+
+# 고정된 세그먼트 수 (3분 = 6개 세그먼트)
+NUM_SEGMENTS = 2
+
+# 각 세그먼트에 대한 최대 토큰 수 (약 30초)
+MAX_TOKENS = 1000
+
+# MusicGen의 샘플링 레이트
+SAMPLING_RATE = 16000
+
+# classifier-free guidance 강도 (1이면 guidance 없이 한 번만 계산)
+GUIDANCE_SCALE = 3
+
+# 초안 설정: 짧은 세그먼트 하나, guidance 없음, 생성 시간 상한(초)
+DRAFT_MAX_TOKENS = 250
+DRAFT_GUIDANCE_SCALE = 1
+DRAFT_MAX_TIME = 10.0
+
+def load_musicgen_model():
     """
-    키워드와 분위기를 기반으로 3분 길이의 음악을 생성합니다.
-    
+    MusicGen 프로세서와 모델을 처음 호출될 때 로드하고 이후에는 같은 인스턴스를 반환합니다.
+
+    Returns:
+        tuple: (processor, model)
+    """
+    global _musicgen
+    with _musicgen_lock:
+        if _musicgen is None:
+            from musicgen_loader import MUSICGEN_MODEL_DIR, load_musicgen_from_dir
+            from memory_profiling import current_uss_mb
+            source = 'local' if MUSICGEN_MODEL_DIR else 'hub'
+            start = time.perf_counter()
+            with metrics.timer('musicgen_load', source=source):
+                if MUSICGEN_MODEL_DIR:
+                    # 고정된 로컬 디렉토리에서 오프라인으로, 가중치는 메모리 맵으로 로드 (워커 간 페이지 공유)
+                    processor, model = load_musicgen_from_dir(MUSICGEN_MODEL_DIR)
+                else:
+                    processor = AutoProcessor.from_pretrained(MUSICGEN_MODEL_NAME)
+                    model = MusicgenForConditionalGeneration.from_pretrained(MUSICGEN_MODEL_NAME)
+
+                # 메모리 사용량 최적화를 위한 설정
+                if torch.cuda.is_available():
+                    model = model.to("cuda")
+            uss = current_uss_mb()
+            if uss is not None:
+                metrics.observe('worker_uss_mb', uss, buckets=(256, 512, 1024, 2048, 4096, 8192))
+            print(f"MusicGen loaded from {MUSICGEN_MODEL_DIR or MUSICGEN_MODEL_NAME} in {time.perf_counter() - start:.2f}s"
+                  f" (worker USS {f'{uss:.0f} MB' if uss is not None else 'unknown'})")
+            _musicgen = (processor, model)
+        return _musicgen
+
+def use_musicgen_model(processor, model):
+    """
+    이미 준비된 MusicGen 프로세서와 모델을 사용하도록 설정합니다 (벤치마크용 소형 모델 등).
+
     Args:
-        keywords (list): 키워드 리스트
-        genre (str): 장르
-        mood (str): 분위기
-        era (str): 시대 배경
-        music_style (str): 음악 스타일
-        output_path (str): 출력 파일 경로
-        use_cache (bool): 캐시 사용 여부
-        
+        processor: 텍스트 프롬프트를 모델 입력으로 변환하는 프로세서
+        model: MusicgenForConditionalGeneration 호환 모델
+    """
+    global _musicgen
+    with _musicgen_lock:
+        _musicgen = (processor, model)
+
+def append_segment(combined_audio, data, sampling_rate, crossfade_duration=1000):
+    """
+    생성된 세그먼트를 지금까지의 오디오 뒤에 크로스페이드로 이어 붙입니다.
+
+    Args:
+        combined_audio (numpy.ndarray): 지금까지 연결된 오디오 (첫 세그먼트면 None)
+        data (numpy.ndarray): 세그먼트 샘플
+        sampling_rate (int): 샘플링 레이트
+        crossfade_duration (int): 크로스페이드 시간(ms)
+
     Returns:
-        str: 생성된 음악 파일 경로
+        numpy.ndarray: 연결된 오디오 (float32)
+    """
+    segment = np.asarray(data, dtype=np.float32)
+
+    # 첫 번째 세그먼트이거나 이전 세그먼트와 연결
+    if combined_audio is None:
+        return segment
+
+    # 크로스페이드 길이는 두 세그먼트 중 짧은 쪽을 넘지 않음
+    fade_len = min(int(sampling_rate * crossfade_duration / 1000), len(combined_audio), len(segment))
+    if fade_len == 0:
+        return np.concatenate([combined_audio, segment])
+
+    fade_in = np.linspace(0.0, 1.0, fade_len, dtype=np.float32)
+    overlap = combined_audio[-fade_len:] * (1.0 - fade_in) + segment[:fade_len] * fade_in
+    return np.concatenate([combined_audio[:-fade_len], overlap, segment[fade_len:]])
+
+def write_audio(path, data, sampling_rate, audio_format=None):
+    """
+    메모리의 PCM 샘플을 블록 단위로 인코더에 넘겨 바로 파일로 저장합니다.
+
+    Args:
+        path (str): 저장 경로
+        data (numpy.ndarray): 모노 float 샘플 (-1.0 ~ 1.0)
+        sampling_rate (int): 샘플링 레이트
+        audio_format (str): 'wav', 'flac', 'opus', 'mp3' 중 하나 (None이면 확장자로 결정)
+
+    Returns:
+        str: 저장된 파일 경로
+    """
+    audio_format = audio_format or audio_format_for(path)
+    data = np.asarray(data, dtype=np.float32)
+
+    if audio_format == 'opus' and sampling_rate not in OPUS_SAMPLING_RATES:
+        from scipy.signal import resample_poly
+        data = resample_poly(data, 48000, sampling_rate).astype(np.float32)
+        sampling_rate = 48000
+
+    with open_writer(path, sampling_rate, 1, audio_format=audio_format) as f:
+        for start in range(0, len(data), BLOCK_FRAMES):
+            write_block(f, data[start:start + BLOCK_FRAMES])
+    return path
+
+def describe_style(genre, mood, era, music_style):
+    """
+    장르, 분위기, 시대, 음악 스타일을 프롬프트에 넣을 설명으로 바꿉니다.
+
+    Returns:
+        tuple: (genre_style, mood_style, era_style, music_style_desc)
+    """
+    return (GENRE_STYLE_MAP.get(genre, 'melodic instrumental music'),
+            MOOD_STYLE_MAP.get(mood, 'emotional and expressive'),
+            ERA_STYLE_MAP.get(era, 'contemporary sound'),
+            MUSIC_STYLE_MAP.get(music_style, 'cinematic instrumental music'))
+
+def canonical_prompt(keywords, genre, mood, era, music_style):
+    """
+    유사 프롬프트 캐시에서 비교할 정규화된 프롬프트를 만듭니다.
+    템플릿을 무작위로 고르지 않고 키워드를 정렬하므로 순서만 다른 입력은 같은 문장이 됩니다.
+
+    Returns:
+        str: 정규화된 프롬프트
+    """
+    genre_style, mood_style, era_style, music_style_desc = describe_style(genre, mood, era, music_style)
+    themes = ', '.join(sorted({keyword.strip().lower() for keyword in keywords[:5]}))
+    return f"{music_style_desc}, {genre_style}, {mood_style}, {era_style}, inspired by {themes}"
+
+def build_base_prompt(keywords, genre, mood, era, music_style):
+    """
+    키워드와 분위기로 MusicGen 기본 프롬프트를 만듭니다 (템플릿은 무작위 선택).
+
+    Returns:
+        str: 기본 프롬프트
     """
-    print("Generating 3-minute music based on content analysis...")
-    
-    # 출력 디렉토리 확인 및 생성
-    output_dir = os.path.dirname(output_path)
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
-    # 캐시 디렉토리 확인
-    cache_dir = os.path.join("cache", "music")
-    os.makedirs(cache_dir, exist_ok=True)
-    
-    # 입력 파라미터를 기반으로 캐시 키 생성
-    cache_key = f"{'-'.join(keywords[:5])}-{genre}-{mood}-{era}-{music_style}"
-    cache_key_hash = hashlib.md5(cache_key.encode()).hexdigest()
-    cache_path = os.path.join(cache_dir, f"{cache_key_hash}.wav")
-    metadata_path = os.path.join(cache_dir, f"{cache_key_hash}_metadata.json")
-    
-    # 캐시 확인
-    if use_cache and os.path.exists(cache_path) and os.path.exists(metadata_path):
-        try:
-            # 메타데이터 확인
-            with open(metadata_path, "r", encoding="utf-8") as f:
-                metadata = json.load(f)
-                print(f"Using cached music for: {metadata.get('prompt', 'Unknown prompt')}")
-            
-            # 캐시된 음악 파일 복사
-            audio = AudioSegment.from_wav(cache_path)
-            audio.export(output_path, format="wav")
-            
-            # 메타데이터 파일 생성 (출력 디렉토리에)
-            output_metadata_path = output_path.replace('.wav', '_metadata.txt')
-            with open(output_metadata_path, 'w', encoding='utf-8') as f:
-                f.write(f"Generated Music Metadata (from cache)\n")
-                f.write(f"----------------------\n")
-                f.write(f"Keywords: {', '.join(keywords)}\n")
-                f.write(f"Genre: {genre}\n")
-                f.write(f"Mood: {mood}\n")
-                f.write(f"Era: {era}\n")
-                f.write(f"Music Style: {music_style}\n")
-                f.write(f"Base Prompt: {metadata.get('prompt', 'Unknown')}\n")
-            
-            print(f"Music loaded from cache and saved to {output_path}")
-            return output_path
-        except Exception as e:
-            print(f"Error loading music cache: {e}")
-    
     # 키워드를 문자열로 변환 (상위 5개만)
     keywords_str = ', '.join(keywords[:5])
     
-    # 장르별 음악 스타일 매핑
-    genre_style_map = {
-        'romance': 'emotional and tender melody with soft instrumentation',
-        'action': 'energetic and powerful music with strong percussion and dynamic rhythm',
-        'fantasy': 'magical and enchanting composition with mystical elements',
-        'horror': 'eerie and tense atmospheric music with dissonant tones',
-        'comedy': 'light and playful melody with quirky elements',
-        'thriller': 'suspenseful music with building tension and dramatic moments',
-        'sci-fi': 'futuristic electronic sounds with innovative textures',
-        'slice_of_life': 'gentle and simple melody reflecting everyday moments',
-        'historical': 'traditional instrumentation with cultural elements',
-        'sports': 'energetic and triumphant music with motivational elements',
-        'drama': 'emotional and moving composition with heartfelt melody',
-        'supernatural': 'mysterious and otherworldly sounds with ethereal elements'
-    }
-    
-    # 분위기별 음악 특성 매핑
-    mood_style_map = {
-        'happy': 'upbeat and cheerful with bright tones',
-        'sad': 'melancholic and emotional with minor key progression',
-        'exciting': 'thrilling and dynamic with energetic rhythm',
-        'scary': 'dark and ominous with unsettling elements',
-        'romantic': 'tender and intimate with warm harmonies',
-        'mysterious': 'intriguing and enigmatic with curious progression',
-        'peaceful': 'calm and serene with gentle flow',
-        'tense': 'suspenseful and anxious with building intensity',
-        'nostalgic': 'wistful and sentimental with reflective quality',
-        'epic': 'grand and majestic with powerful dynamics',
-        'comical': 'playful and light with quirky elements',
-        'dreamy': 'ethereal and floating with surreal quality'
-    }
-    
-    # 시대별 음악 특성 매핑
-    era_style_map = {
-        'modern': 'contemporary sound with current production techniques',
-        'future': 'futuristic electronic elements with advanced sound design',
-        'medieval': 'ancient instruments and traditional melodies',
-        'ancient': 'classical elements with timeless quality',
-        'prehistoric': 'primitive percussion and primal sounds',
-        'victorian': 'elegant classical instrumentation with refined quality',
-        'renaissance': 'artistic classical arrangements with cultural elements',
-        'post_apocalyptic': 'desolate atmosphere with sparse instrumentation'
-    }
-    
-    # 음악 스타일별 특성 매핑
-    music_style_map = {
-        'orchestral': 'grand orchestral arrangement with rich instrumentation',
-        'electronic': 'modern electronic production with digital elements',
-        'acoustic': 'natural acoustic instruments with organic quality',
-        'rock': 'electric guitars and drums with strong energy',
-        'jazz': 'smooth jazz elements with sophisticated harmonies',
-        'pop': 'catchy pop melody with contemporary production',
-        'ambient': 'atmospheric textures with spacious sound design',
-        'folk': 'traditional folk instruments with authentic feel',
-        'cinematic': 'dramatic film score style with emotional impact',
-        'hip_hop': 'rhythmic beats with urban feel',
-        'lo_fi': 'relaxed lo-fi beats with warm nostalgic quality'
-    }
-    
     # 장르와 분위기에 맞는 스타일 선택
-    genre_style = genre_style_map.get(genre, 'melodic instrumental music')
-    mood_style = mood_style_map.get(mood, 'emotional and expressive')
-    era_style = era_style_map.get(era, 'contemporary sound')
-    music_style_desc = music_style_map.get(music_style, 'cinematic instrumental music')
+    genre_style, mood_style, era_style, music_style_desc = describe_style(genre, mood, era, music_style)
     
-    # 고정된 세그먼트 수 (3분 = 6개 세그먼트)
-    num_segments = 2
+    # 프롬프트 템플릿 (기본 템플릿)
+    base_prompt_templates = [
+        f"{genre_style} with {mood_style}, {music_style_desc}, inspired by themes of {keywords_str}, no vocals",
+        f"{music_style_desc} that feels {mood_style}, with elements of {genre_style}, inspired by {keywords_str}, instrumental",
+        f"{era_style} {music_style_desc} with {mood_style} atmosphere, related to {keywords_str}, no lyrics",
+        f"An instrumental {music_style_desc} piece that captures {mood_style} and {genre_style}, inspired by {keywords_str}"
+    ]
     
-    # 각 세그먼트에 대한 최대 토큰 수 (약 30초)
-    max_tokens = 1000
+    # 기본 프롬프트 선택
+    return random.choice(base_prompt_templates)
+
+def render_music(base_prompt, output_path, audio_format=None, num_segments=NUM_SEGMENTS, max_tokens=MAX_TOKENS,
+                 guidance_scale=GUIDANCE_SCALE, max_time=None, tier='full'):
+    """
+    기본 프롬프트로 세그먼트를 생성해 크로스페이드로 연결하고 파일로 저장합니다.
+
+    Args:
+        base_prompt (str): 기본 프롬프트 (세그먼트마다 구간 설명이 붙음)
+        output_path (str): 출력 파일 경로
+        audio_format (str): 출력 형식 (None이면 확장자로 결정)
+        num_segments (int): 세그먼트 수
+        max_tokens (int): 세그먼트당 최대 토큰 수
+        guidance_scale (float): classifier-free guidance 강도 (1이면 사용 안 함)
+        max_time (float): 세그먼트당 생성 시간 상한(초, 넘으면 그때까지 만든 토큰만 사용)
+        tier (str): 메트릭 라벨 ('full' 또는 'draft')
+
+    Returns:
+        str: 저장된 파일 경로
+    """
+    return render_music_batch([base_prompt], [output_path], audio_format, num_segments=num_segments,
+                              max_tokens=max_tokens, guidance_scale=guidance_scale, max_time=max_time, tier=tier)[0]
+
+def generated_tokens(model, audio_values):
+    """
+    디코딩된 오디오 길이로 실제로 생성된 오디오 토큰(코덱 프레임) 수를 계산합니다.
+    max_time이나 조기 종료로 멈추면 max_new_tokens보다 적습니다.
+
+    Args:
+        model: MusicGen 모델
+        audio_values (torch.Tensor): model.generate 결과 (배치, 채널, 샘플)
+
+    Returns:
+        int: 배치 전체에서 생성된 프레임 수
+    """
+    codec_config = model.config.audio_encoder
+    samples_per_frame = codec_config.sampling_rate / codec_config.frame_rate
+    return int(round(audio_values.shape[-1] / samples_per_frame)) * audio_values.shape[0]
+
+def render_music_batch(base_prompts, output_paths, audio_format=None, num_segments=NUM_SEGMENTS, max_tokens=MAX_TOKENS,
+                       guidance_scale=GUIDANCE_SCALE, max_time=None, tier='full', batch_size=None):
+    """
+    여러 기본 프롬프트의 곡을 함께 생성합니다. 세그먼트마다 batch_size개의 프롬프트를
+    model.generate 한 번으로 생성하므로 곡 수만큼 따로 호출하는 것보다 빠릅니다 (특히 GPU).
+
+    Args:
+        base_prompts (list): 곡별 기본 프롬프트
+        output_paths (list): 곡별 출력 파일 경로
+        batch_size (int): 한 번에 생성할 곡 수 (None이면 전부)
+        나머지: render_music과 같음
+
+    Returns:
+        list: 저장된 파일 경로 리스트
+    """
+    # MusicGen 모델 로드 (프로세스 내에서 재사용)
+    processor, model = load_musicgen_model()
+    batch_size = batch_size or len(base_prompts)
     
-    try:
-        # MusicGen 모델 로드
-        processor = AutoProcessor.from_pretrained("facebook/musicgen-small")
-        model = MusicgenForConditionalGeneration.from_pretrained("facebook/musicgen-small")
-        
-        # 메모리 사용량 최적화를 위한 설정
-        if torch.cuda.is_available():
-            model = model.to("cuda")
+    for start in range(0, len(base_prompts), batch_size):
+        prompts = base_prompts[start:start + batch_size]
+        paths = output_paths[start:start + batch_size]
         
         # 출력 디렉토리 확인 및 생성
-        output_dir = os.path.dirname(output_path)
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+        for output_path in paths:
+            output_dir = os.path.dirname(output_path)
+            if output_dir and not os.path.exists(output_dir):
+                os.makedirs(output_dir)
         
         # 여러 세그먼트 생성 및 연결
-        combined_audio = None
-        sampling_rate = 16000  # MusicGen의 샘플링 레이트
+        combined_audio = [None] * len(prompts)
         
         print(f"Generating 6 segments for a 3-minute music piece...")
-        
-        # 프롬프트 템플릿 (기본 템플릿)
-        base_prompt_templates = [
-            f"{genre_style} with {mood_style}, {music_style_desc}, inspired by themes of {keywords_str}, no vocals",
-            f"{music_style_desc} that feels {mood_style}, with elements of {genre_style}, inspired by {keywords_str}, instrumental",
-            f"{era_style} {music_style_desc} with {mood_style} atmosphere, related to {keywords_str}, no lyrics",
-            f"An instrumental {music_style_desc} piece that captures {mood_style} and {genre_style}, inspired by {keywords_str}"
-        ]
-        
-        # 기본 프롬프트 선택
-        base_prompt = random.choice(base_prompt_templates)
-        print(f"Base prompt: {base_prompt}")
+        for base_prompt in prompts:
+            print(f"Base prompt: {base_prompt}")
         
         for i in range(num_segments):
-            # 각 세그먼트에 약간의 변형 추가
-            segment_descriptors = [
-                "intro", "building", "main theme", "variation", "bridge", "outro"
-            ]
-            
-            # 현재 세그먼트에 맞는 프롬프트 생성
-            prompt = f"{base_prompt}, {segment_descriptors[i]} section"
-            print(f"Generating segment {i+1}/6: {segment_descriptors[i]}")
+            print(f"Generating segment {i+1}/6: {SEGMENT_DESCRIPTORS[i]}")
             
-            # 텍스트 프롬프트 처리
+            # 텍스트 프롬프트 처리 (현재 세그먼트에 맞는 프롬프트)
             inputs = processor(
-                text=[prompt],
+                text=[f"{base_prompt}, {SEGMENT_DESCRIPTORS[i]} section" for base_prompt in prompts],
                 padding=True,
                 return_tensors="pt",
             )
@@ -197,37 +329,178 @@ def generate_music(keywords, genre, mood, era, music_style, output_path, use_cac
                 inputs = {k: v.to("cuda") for k, v in inputs.items()}
             
             # 음악 세그먼트 생성
-            audio_values = model.generate(**inputs, do_sample=True, guidance_scale=3, max_new_tokens=max_tokens)
+            with metrics.timer('musicgen_generate', tier=tier):
+                audio_values = model.generate(**inputs, do_sample=True, guidance_scale=guidance_scale,
+                                              max_new_tokens=max_tokens, max_time=max_time)
+            metrics.increment('tokens_generated_total', generated_tokens(model, audio_values), model='musicgen', tier=tier)
             
             # 모델이 GPU에 있다면 CPU로 이동
             if torch.cuda.is_available():
                 audio_values = audio_values.cpu()
             
-            # 현재 세그먼트를 임시 파일로 저장
-            temp_segment_path = f"{output_path}_segment_{i+1}.wav"
-            scipy.io.wavfile.write(temp_segment_path, rate=sampling_rate, data=audio_values[0, 0].numpy())
-            
-            # 세그먼트를 AudioSegment로 로드
-            segment = AudioSegment.from_wav(temp_segment_path)
-            
-            # 첫 번째 세그먼트이거나 이전 세그먼트와 연결
-            if combined_audio is None:
-                combined_audio = segment
-            else:
-                # 크로스페이드로 자연스럽게 연결 (1초 = 1000ms)
-                crossfade_duration = 1000  # 1초 크로스페이드
-                combined_audio = combined_audio.append(segment, crossfade=crossfade_duration)
-            
-            # 임시 파일 삭제
-            os.remove(temp_segment_path)
+            # 이전 세그먼트와 크로스페이드로 연결
+            for j in range(len(prompts)):
+                combined_audio[j] = append_segment(combined_audio[j], audio_values[j, 0].numpy(), SAMPLING_RATE)
         
         # 최종 오디오 저장
-        combined_audio.export(output_path, format="wav")
+        for output_path, audio in zip(paths, combined_audio):
+            with metrics.timer('audio_export', format=audio_format or audio_format_for(output_path)):
+                write_audio(output_path, audio, SAMPLING_RATE, audio_format)
+    return list(output_paths)
+
+def music_cache_paths(keywords, genre, mood, era, music_style, audio_format):
+    """
+    입력 파라미터로 음악 캐시 경로를 만듭니다.
+
+    Returns:
+        tuple: (캐시 키 해시, 음악 파일 경로, 메타데이터 경로)
+    """
+    cache_dir = os.path.join("cache", "music")
+    cache_key = f"{'-'.join(keywords[:5])}-{genre}-{mood}-{era}-{music_style}"
+    cache_key_hash = hashlib.md5(cache_key.encode()).hexdigest()
+    return (cache_key_hash,
+            os.path.join(cache_dir, f"{cache_key_hash}.{audio_format}"),
+            os.path.join(cache_dir, f"{cache_key_hash}_metadata.json"))
+
+def _serve_cached_music(cache_path, metadata_path, output_path, output_metadata_path,
+                        keywords, genre, mood, era, music_style, similarity=None):
+    """캐시된 음악 파일을 출력 경로로 복사하고 출력용 메타데이터를 씁니다."""
+    metadata = {}
+    if os.path.exists(metadata_path):
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+    print(f"Using cached music for: {metadata.get('prompt', 'Unknown prompt')}")
+
+    # 캐시된 음악 파일 복사 (이미 인코딩된 형식 그대로)
+    shutil.copyfile(cache_path, output_path)
+
+    # 메타데이터 파일 생성 (출력 디렉토리에)
+    with open(output_metadata_path, 'w', encoding='utf-8') as f:
+        f.write(f"Generated Music Metadata (from cache)\n")
+        f.write(f"----------------------\n")
+        f.write(f"Keywords: {', '.join(keywords)}\n")
+        f.write(f"Genre: {genre}\n")
+        f.write(f"Mood: {mood}\n")
+        f.write(f"Era: {era}\n")
+        f.write(f"Music Style: {music_style}\n")
+        f.write(f"Base Prompt: {metadata.get('prompt', 'Unknown')}\n")
+        if similarity is not None:
+            f.write(f"Reused Track Keywords: {', '.join(metadata.get('keywords', []))}\n")
+            f.write(f"Prompt Similarity: {similarity:.3f}\n")
+
+    print(f"Music loaded from cache and saved to {output_path}")
+    return output_path
+
+def generate_music(keywords, genre, mood, era, music_style, output_path, use_cache=True, output_format=None,
+                   similarity_threshold=None, instant=False, live_fallback=True):
+    """
+    키워드와 분위기를 기반으로 3분 길이의 음악을 생성합니다.
+    
+    Args:
+        keywords (list): 키워드 리스트
+        genre (str): 장르
+        mood (str): 분위기
+        era (str): 시대 배경
+        music_style (str): 음악 스타일
+        output_path (str): 출력 파일 경로
+        use_cache (bool): 캐시 사용 여부
+        output_format (str): 'wav', 'flac', 'opus', 'mp3' 중 하나 (None이면 출력 경로 확장자로 결정)
+        similarity_threshold (float): 유사 프롬프트 캐시 임계값 (None이면 정확히 같은 입력만 캐시 사용)
+        instant (bool): 미리 생성한 음악 라이브러리에서 바로 가져오기
+        live_fallback (bool): instant 모드에서 라이브러리에 곡이 없으면 새로 생성할지 여부
         
-        # 캐시에 오디오 저장
+    Returns:
+        str: 생성된 음악 파일 경로 (형식에 맞게 확장자가 바뀔 수 있음)
+    """
+    print("Generating 3-minute music based on content analysis...")
+
+    # 출력 형식에 맞게 확장자 정리
+    audio_format = output_format or audio_format_for(output_path)
+    if audio_format not in AUDIO_FORMATS:
+        raise ValueError(f"Unsupported audio format: {audio_format}")
+    output_path = os.path.splitext(output_path)[0] + "." + audio_format
+    output_metadata_path = os.path.splitext(output_path)[0] + "_metadata.txt"
+    
+    # 출력 디렉토리 확인 및 생성
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    
+    # 미리 생성한 라이브러리에서 조합에 맞는 곡 사용
+    if instant:
+        try:
+            from music_library import get_music_library
+            entry = get_music_library().serve(genre, mood, era, music_style, output_path,
+                                              seed_text='-'.join(keywords[:5]))
+            if entry:
+                with open(output_metadata_path, 'w', encoding='utf-8') as f:
+                    f.write(f"Generated Music Metadata (from library)\n")
+                    f.write(f"----------------------\n")
+                    f.write(f"Keywords: {', '.join(keywords)}\n")
+                    f.write(f"Genre: {genre}\n")
+                    f.write(f"Mood: {mood}\n")
+                    f.write(f"Era: {era}\n")
+                    f.write(f"Music Style: {music_style}\n")
+                    f.write(f"Library Track: {entry['path']} ({entry['combo']})\n")
+                    f.write(f"Base Prompt: {entry['prompt']}\n")
+                print(f"Music served from library ({entry['combo']} #{entry['variant']}) to {output_path}")
+                return output_path
+        except Exception as e:
+            print(f"Error loading music library: {e}")
+        if not live_fallback:
+            print("No library track for this combination and live generation is disabled")
+            return None
+        print("No library track for this combination, generating live")
+    
+    # 캐시 디렉토리 확인
+    cache_dir = os.path.join("cache", "music")
+    os.makedirs(cache_dir, exist_ok=True)
+    
+    # 입력 파라미터를 기반으로 캐시 키 생성
+    cache_key_hash, cache_path, metadata_path = music_cache_paths(keywords, genre, mood, era, music_style, audio_format)
+    
+    # 캐시 확인
+    if use_cache and os.path.exists(cache_path) and os.path.exists(metadata_path):
+        try:
+            output_path = _serve_cached_music(cache_path, metadata_path, output_path, output_metadata_path,
+                                              keywords, genre, mood, era, music_style)
+            metrics.increment('cache_hits_total', cache='music')
+            return output_path
+        except Exception as e:
+            print(f"Error loading music cache: {e}")
+    
+    if use_cache:
+        metrics.increment('cache_misses_total', cache='music')
+
+    # 유사 프롬프트 캐시 확인 (키워드 순서나 동의어만 다른 입력으로 만든 곡 재사용)
+    prompt_cache = None
+    semantic_prompt = canonical_prompt(keywords, genre, mood, era, music_style)
+    if use_cache and similarity_threshold is not None:
+        try:
+            from prompt_cache import get_prompt_cache
+            prompt_cache = get_prompt_cache()
+            entry, similarity = prompt_cache.lookup(semantic_prompt, audio_format, exclude_key=cache_key_hash,
+                                                    threshold=similarity_threshold)
+            if entry:
+                print(f"Similar prompt found in music cache (similarity {similarity:.3f})")
+                output_path = _serve_cached_music(entry['path'], os.path.join(cache_dir, f"{entry['cache_key']}_metadata.json"),
+                                                  output_path, output_metadata_path,
+                                                  keywords, genre, mood, era, music_style, similarity=similarity)
+                metrics.increment('cache_hits_total', cache='music_semantic')
+                return output_path
+            metrics.increment('cache_misses_total', cache='music_semantic')
+        except Exception as e:
+            print(f"Error checking similar prompt cache: {e}")
+            prompt_cache = None
+
+    try:
+        base_prompt = build_base_prompt(keywords, genre, mood, era, music_style)
+        render_music(base_prompt, output_path, audio_format)
+        
+        # 캐시에 인코딩된 파일 그대로 저장
         if use_cache:
-            combined_audio.export(cache_path, format="wav")
-            
+            shutil.copyfile(output_path, cache_path)
+
             # 메타데이터 저장
             cache_metadata = {
                 "keywords": keywords,
@@ -236,14 +509,23 @@ def generate_music(keywords, genre, mood, era, music_style, output_path, use_cac
                 "era": era,
                 "music_style": music_style,
                 "prompt": base_prompt,
+                "format": audio_format,
                 "duration": "3 minutes (6 segments)"
             }
-            
+
             with open(metadata_path, "w", encoding="utf-8") as f:
                 json.dump(cache_metadata, f, ensure_ascii=False, indent=2)
+
+            # 유사 프롬프트 인덱스에 추가 (이번 실행의 조회 임계값과 관계없이 새로 캐시한 곡은 모두 색인)
+            try:
+                if prompt_cache is None:
+                    from prompt_cache import get_prompt_cache
+                    prompt_cache = get_prompt_cache()
+                prompt_cache.add(semantic_prompt, cache_key_hash, audio_format, cache_path)
+            except Exception as e:
+                print(f"Error indexing prompt for similar prompt cache: {e}")
         
         # 메타데이터 저장 (출력 파일용)
-        output_metadata_path = output_path.replace('.wav', '_metadata.txt')
         with open(output_metadata_path, 'w', encoding='utf-8') as f:
             f.write(f"Generated Music Metadata\n")
             f.write(f"----------------------\n")
@@ -262,4 +544,24 @@ def generate_music(keywords, genre, mood, era, music_style, output_path, use_cac
         
     except Exception as e:
         print(f"Error generating music: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def generate_music_draft(keywords, genre, mood, era, music_style, output_path, output_format=None,
+                         max_time=DRAFT_MAX_TIME):
+    """
+    짧은 초안을 빠르게 생성합니다 (세그먼트 하나, 적은 토큰, classifier-free guidance 없음, 생성 시간 상한).
+
+    Args:
+        output_path (str): 전체 곡 출력 경로 (초안은 '<이름>_draft.<형식>'으로 저장)
+        max_time (float): 초안 생성 시간 상한(초)
+
+    Returns:
+        str: 초안 파일 경로
+    """
+    audio_format = output_format or audio_format_for(output_path)
+    draft_path = f"{os.path.splitext(output_path)[0]}_draft.{audio_format}"
+    base_prompt = build_base_prompt(keywords, genre, mood, era, music_style)
+    with metrics.timer('music_tier', tier='draft'):
+        render_music(base_prompt, draft_path, audio_format, num_segments=1, max_tokens=DRAFT_MAX_TOKENS,
+                     guidance_scale=DRAFT_GUIDANCE_SCALE, max_time=max_time, tier='draft')
+    return draft_path
@@ -0,0 +1,296 @@
+import argparse
+import datetime
+import glob
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import threading
+import time
+import traceback
+import metrics
+from audio_engine import AUDIO_FORMATS, audio_format_for, transcode
+
+# 미리 생성한 음악 라이브러리 위치
+LIBRARY_DIR = "music_library"
+
+# 조합마다 만들 곡 수
+DEFAULT_VARIANTS = 3
+
+# 라이브러리 저장 형식 (요청 형식이 다르면 꺼낼 때 변환)
+DEFAULT_LIBRARY_FORMAT = 'flac'
+
+COMBO_FIELDS = ('genre', 'mood', 'era', 'music_style')
+
+def combo_id(genre, mood, era, music_style):
+    """조합을 파일 이름에 쓸 수 있는 문자열로 변환"""
+    return f"{genre}__{mood}__{era}__{music_style}"
+
+def all_combinations():
+    """generate_music이 아는 장르 × 분위기 × 시대 × 음악 스타일 전체 조합"""
+    from music_generator import GENRE_STYLE_MAP, MOOD_STYLE_MAP, ERA_STYLE_MAP, MUSIC_STYLE_MAP
+    return [
+        dict(zip(COMBO_FIELDS, combo))
+        for combo in itertools.product(GENRE_STYLE_MAP, MOOD_STYLE_MAP, ERA_STYLE_MAP, MUSIC_STYLE_MAP)
+    ]
+
+def load_combinations(path):
+    """
+    만들 조합 목록(JSONL 또는 CSV)을 읽습니다. 자주 쓰이는 조합만 먼저 만들 때 사용합니다.
+
+    Returns:
+        list: 조합 딕셔너리 리스트
+    """
+    import csv
+    if path.lower().endswith('.csv'):
+        with open(path, "r", encoding="utf-8", newline='') as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    return [{field: row[field].strip() for field in COMBO_FIELDS} for row in rows]
+
+def filter_combinations(combos, **allowed):
+    """필드별로 허용한 값만 남김 (값이 None이면 해당 필드는 전체 허용)"""
+    return [
+        combo for combo in combos
+        if all(values is None or combo[field] in values for field, values in allowed.items())
+    ]
+
+def shard_items(items, shard_index, shard_count):
+    """작업 목록을 shard_count개로 나눈 것 중 shard_index번째 (순서가 고정되어 있어야 함)"""
+    return [item for position, item in enumerate(items) if position % shard_count == shard_index]
+
+class MusicLibrary:
+    """
+    조합별로 미리 생성한 곡의 인덱스.
+    인덱스는 빌드 샤드별 JSONL 파일(index_*.jsonl)에 곡마다 한 줄씩 추가됩니다.
+
+    Args:
+        library_dir (str): 라이브러리 디렉토리
+    """
+
+    def __init__(self, library_dir=LIBRARY_DIR):
+        self.library_dir = library_dir
+        self.tracks = {}
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        tracks = {}
+        for index_path in sorted(glob.glob(os.path.join(self.library_dir, "index_*.jsonl"))):
+            with open(index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except Exception:
+                        # 비정상 종료로 잘린 마지막 줄은 무시
+                        continue
+                    if os.path.exists(os.path.join(self.library_dir, entry['path'])):
+                        tracks.setdefault(entry['combo'], {})[entry['variant']] = entry
+        with self._lock:
+            self.tracks = tracks
+
+    def __len__(self):
+        return sum(len(variants) for variants in self.tracks.values())
+
+    def has(self, combo, variant):
+        return variant in self.tracks.get(combo_id(**combo), {})
+
+    def add(self, index_path, entry):
+        """곡 하나를 인덱스에 추가하고 바로 디스크에 기록"""
+        with open(index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            self.tracks.setdefault(entry['combo'], {})[entry['variant']] = entry
+
+    def lookup(self, genre, mood, era, music_style, seed_text=""):
+        """
+        조합에 맞는 곡을 찾습니다. 정확한 조합이 없으면 장르와 분위기가 같은 곡을 찾습니다.
+        여러 곡 중에서는 seed_text(키워드 등)의 해시로 골라 같은 입력에는 같은 곡을 돌려줍니다.
+
+        Returns:
+            dict: 곡 항목 (절대 경로는 'abs_path') 또는 None
+        """
+        with self._lock:
+            candidates = list(self.tracks.get(combo_id(genre, mood, era, music_style), {}).values())
+            if not candidates:
+                prefix = f"{genre}__{mood}__"
+                candidates = [entry for combo, variants in self.tracks.items() if combo.startswith(prefix)
+                              for entry in variants.values()]
+        if not candidates:
+            return None
+        candidates.sort(key=lambda entry: (entry['combo'], entry['variant']))
+        choice = int(hashlib.md5(seed_text.encode()).hexdigest(), 16) % len(candidates)
+        entry = dict(candidates[choice])
+        entry['abs_path'] = os.path.join(self.library_dir, entry['path'])
+        return entry
+
+    def serve(self, genre, mood, era, music_style, output_path, seed_text=""):
+        """
+        라이브러리의 곡을 출력 경로로 복사합니다 (형식이 다르면 블록 단위로 변환).
+
+        Returns:
+            dict: 사용한 곡 항목 또는 라이브러리에 없으면 None
+        """
+        entry = self.lookup(genre, mood, era, music_style, seed_text)
+        if entry is None:
+            metrics.increment('cache_misses_total', cache='music_library')
+            return None
+        with metrics.timer('music_library_serve'):
+            if audio_format_for(entry['abs_path']) == audio_format_for(output_path):
+                shutil.copyfile(entry['abs_path'], output_path)
+            else:
+                transcode(entry['abs_path'], output_path)
+        metrics.increment('cache_hits_total', cache='music_library')
+        return entry
+
+_library = None
+_library_lock = threading.Lock()
+
+def get_music_library(library_dir=LIBRARY_DIR):
+    """라이브러리 인덱스를 프로세스당 한 번만 읽어 재사용"""
+    global _library
+    with _library_lock:
+        if _library is None or _library.library_dir != library_dir:
+            _library = MusicLibrary(library_dir)
+        return _library
+
+def build_library(combos, library_dir=LIBRARY_DIR, variants=DEFAULT_VARIANTS, audio_format=DEFAULT_LIBRARY_FORMAT,
+                  shard_index=0, shard_count=1, limit=None):
+    """
+    조합별로 곡을 생성해 라이브러리에 추가합니다.
+    이미 인덱스에 있는 곡은 건너뛰므로 중단 후 같은 명령으로 다시 실행하면 이어서 만듭니다.
+    여러 프로세스/머신에서 shard_index만 바꿔 실행하면 작업을 나눠 만들 수 있습니다.
+
+    Args:
+        combos (list): 조합 리스트
+        library_dir (str): 라이브러리 디렉토리
+        variants (int): 조합마다 만들 곡 수
+        audio_format (str): 저장 형식
+        shard_index (int): 이 프로세스가 맡을 샤드 번호 (0부터)
+        shard_count (int): 전체 샤드 수
+        limit (int): 이번 실행에서 만들 최대 곡 수
+
+    Returns:
+        dict: 빌드 결과 통계
+    """
+    from music_generator import build_base_prompt, render_music, load_musicgen_model
+
+    os.makedirs(os.path.join(library_dir, "tracks"), exist_ok=True)
+    library = MusicLibrary(library_dir)
+    index_path = os.path.join(library_dir, f"index_{shard_index}of{shard_count}.jsonl")
+
+    tasks = [(combo, variant) for combo in combos for variant in range(variants)]
+    tasks = shard_items(tasks, shard_index, shard_count)
+    pending = [(combo, variant) for combo, variant in tasks if not library.has(combo, variant)]
+    if limit is not None:
+        pending = pending[:limit]
+
+    print(f"Library shard {shard_index + 1}/{shard_count}: {len(tasks)} tracks, "
+          f"{len(tasks) - len(pending)} already built, {len(pending)} to build")
+    if not pending:
+        return {'total': len(tasks), 'built': 0, 'failed': 0}
+
+    load_musicgen_model()
+    start = time.time()
+    built = failed = 0
+    for position, (combo, variant) in enumerate(pending, 1):
+        cid = combo_id(**combo)
+        relative_path = os.path.join("tracks", f"{cid}__{variant}.{audio_format}")
+        track_start = time.time()
+        try:
+            # 라이브러리 곡은 특정 작품 키워드 없이 조합 이름을 주제로 사용
+            themes = [combo['genre'].replace('_', ' '), combo['mood'], combo['era'].replace('_', ' ')]
+            base_prompt = build_base_prompt(themes, **combo)
+            render_music(base_prompt, os.path.join(library_dir, relative_path), audio_format)
+            library.add(index_path, {
+                'combo': cid,
+                'variant': variant,
+                'path': relative_path,
+                **combo,
+                'prompt': base_prompt,
+                'format': audio_format,
+                'seconds': round(time.time() - track_start, 1),
+                'created_at': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            })
+            built += 1
+            status = "built"
+        except Exception as e:
+            print(f"Error building library track {cid} #{variant}: {e}")
+            traceback.print_exc()
+            failed += 1
+            status = "failed"
+
+        elapsed = time.time() - start
+        eta = elapsed / position * (len(pending) - position)
+        print(f"[{position}/{len(pending)}] {status}: {cid} #{variant} "
+              f"({time.time() - track_start:.1f}s, {position / elapsed * 3600:.1f} tracks/hour, "
+              f"ETA {datetime.timedelta(seconds=int(eta))})")
+
+    return {'total': len(tasks), 'built': built, 'failed': failed}
+
+def library_status(combos, library_dir=LIBRARY_DIR, variants=DEFAULT_VARIANTS):
+    """
+    조합 목록 대비 라이브러리 진행 상황을 출력합니다.
+
+    Returns:
+        dict: 전체/완료 곡 수와 필드별 완료율
+    """
+    library = MusicLibrary(library_dir)
+    total = len(combos) * variants
+    done = sum(1 for combo in combos for variant in range(variants) if library.has(combo, variant))
+    print(f"Library: {done}/{total} tracks ({done / total:.1%})" if total else "Library: no combinations selected")
+
+    coverage = {}
+    for field in COMBO_FIELDS:
+        counts = {}
+        for combo in combos:
+            value_done, value_total = counts.get(combo[field], (0, 0))
+            combo_done = sum(1 for variant in range(variants) if library.has(combo, variant))
+            counts[combo[field]] = (value_done + combo_done, value_total + variants)
+        coverage[field] = counts
+        summary = ", ".join(f"{value} {d}/{t}" for value, (d, t) in sorted(counts.items()))
+        print(f"  {field}: {summary}")
+    return {'total': total, 'done': done, 'coverage': coverage}
+
+def _split(value):
+    return [v.strip() for v in value.split(',')] if value else None
+
+def _parse_shard(spec):
+    index, _, count = spec.partition('/')
+    index, count = int(index), int(count)
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Invalid shard: {spec}")
+    return index, count
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-generate a music library for genre x mood x era x style combinations')
+    parser.add_argument('command', choices=['build', 'status'])
+    parser.add_argument('--library_dir', default=LIBRARY_DIR, help='Library directory')
+    parser.add_argument('--variants', type=int, default=DEFAULT_VARIANTS, help='Tracks per combination')
+    parser.add_argument('--format', choices=sorted(AUDIO_FORMATS), default=DEFAULT_LIBRARY_FORMAT, help='Library audio format')
+    parser.add_argument('--combos', default=None, help='JSONL or CSV of combinations to build (default: full grid)')
+    parser.add_argument('--genres', default=None, help='Comma-separated genres to include')
+    parser.add_argument('--moods', default=None, help='Comma-separated moods to include')
+    parser.add_argument('--eras', default=None, help='Comma-separated eras to include')
+    parser.add_argument('--styles', default=None, help='Comma-separated music styles to include')
+    parser.add_argument('--shard', type=_parse_shard, default=(0, 1), help='Shard to build, e.g. 0/4')
+    parser.add_argument('--limit', type=int, default=None, help='Maximum tracks to build in this run')
+    args = parser.parse_args()
+
+    combos = load_combinations(args.combos) if args.combos else all_combinations()
+    combos = filter_combinations(combos, genre=_split(args.genres), mood=_split(args.moods),
+                                 era=_split(args.eras), music_style=_split(args.styles))
+
+    if args.command == 'build':
+        shard_index, shard_count = args.shard
+        build_library(combos, library_dir=args.library_dir, variants=args.variants, audio_format=args.format,
+                      shard_index=shard_index, shard_count=shard_count, limit=args.limit)
+    library_status(combos, library_dir=args.library_dir, variants=args.variants)
+
+if __name__ == "__main__":
+    main()
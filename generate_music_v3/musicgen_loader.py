@@ -0,0 +1,283 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import subprocess
+import sys
+import threading
+import time
+from contextlib import nullcontext
+import torch
+import metrics
+from memory_profiling import current_rss_mb, current_uss_mb
+
+# 고정된 로컬 모델 디렉토리 (export로 만든 것). 지정하면 허브 캐시를 찾지 않고 오프라인으로 로드
+MUSICGEN_MODEL_DIR = os.environ.get("MUSICGEN_MODEL_DIR")
+
+# 오디오 코덱 가중치를 첫 디코딩 때 연결 (MUSICGEN_LAZY_CODEC=1)
+LAZY_AUDIO_CODEC = os.environ.get("MUSICGEN_LAZY_CODEC", "0") == "1"
+
+# export 디렉토리에 함께 저장하는 고정 정보 파일
+MANIFEST_NAME = "musicgen_manifest.json"
+
+# 오디오 코덱(EnCodec) 가중치 이름 접두어
+AUDIO_ENCODER_PREFIX = "audio_encoder."
+
+# safetensors 헤더의 dtype → torch dtype
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8,
+    "U8": torch.uint8, "BOOL": torch.bool,
+}
+
+def _no_init_weights():
+    """가중치 초기화를 건너뛰는 transformers 컨텍스트 (버전별 위치가 다름, 없으면 그냥 초기화)"""
+    try:
+        from transformers.initialization import no_init_weights
+    except ImportError:
+        try:
+            from transformers.modeling_utils import no_init_weights
+        except ImportError:
+            return nullcontext()
+    return no_init_weights()
+
+def _safetensors_files(model_dir):
+    """모델 디렉토리의 safetensors 파일 목록 (샤딩된 경우 인덱스 순서)"""
+    index_path = os.path.join(model_dir, "model.safetensors.index.json")
+    if os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            weight_map = json.load(f)["weight_map"]
+        return [os.path.join(model_dir, name) for name in sorted(set(weight_map.values()))]
+    path = os.path.join(model_dir, "model.safetensors")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No safetensors weights in {model_dir} (run: python musicgen_loader.py export {model_dir})")
+    return [path]
+
+def mmap_safetensors(path):
+    """
+    safetensors 파일을 메모리 맵으로 열어 복사 없이 텐서로 만듭니다.
+    파일 페이지는 페이지 캐시에서 공유되므로 같은 파일을 여는 워커들이 가중치 메모리를 나눠 씁니다.
+    쓰기 시 복사(MAP_PRIVATE) 매핑이라 텐서를 수정해도 파일과 다른 프로세스에는 영향이 없습니다.
+
+    Returns:
+        dict: 이름 → 텐서
+    """
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    base = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = SAFETENSORS_DTYPES[info["dtype"]]
+        start, end = info["data_offsets"]
+        if end == start:
+            tensors[name] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        count = (end - start) // torch.empty(0, dtype=dtype).element_size()
+        tensors[name] = torch.frombuffer(mapped, dtype=dtype, count=count, offset=base + start).reshape(info["shape"])
+    return tensors
+
+def _assign_weights(module, tensors, prefix=""):
+    """이름이 prefix로 시작하는 텐서를 복사 없이 모듈 파라미터로 연결하고 빠진 키를 반환"""
+    state = {name[len(prefix):]: tensor for name, tensor in tensors.items() if name.startswith(prefix)}
+    result = module.load_state_dict(state, strict=False, assign=True)
+    return result.missing_keys
+
+def _defer_audio_encoder(model, tensors, lock):
+    """
+    오디오 코덱 가중치를 첫 encode/decode 호출 때 연결합니다.
+    그 전까지 코덱 파라미터는 초기화하지 않은 빈 메모리라 페이지가 할당되지 않습니다.
+    """
+    audio_encoder = model.audio_encoder
+    original = {name: getattr(audio_encoder, name) for name in ("encode", "decode")}
+
+    def load_once():
+        with lock:
+            if "decode" not in vars(audio_encoder):
+                return
+            with metrics.timer('musicgen_codec_load'):
+                _assign_weights(audio_encoder, tensors, AUDIO_ENCODER_PREFIX)
+                # assign=True는 파일 텐서(CPU, 파일 dtype)를 그대로 쓰므로, 그 사이 model.to("cuda") 등으로 옮겨진
+                # 모델과 같은 장치/dtype으로 맞춤 (CPU에서 같으면 복사하지 않아 메모리 맵 공유 유지)
+                reference = next(model.decoder.parameters())
+                audio_encoder.to(device=reference.device, dtype=reference.dtype)
+                audio_encoder.eval()
+            for name in original:
+                delattr(audio_encoder, name)
+            print("MusicGen audio codec weights attached on first use")
+
+    def wrap(name):
+        def call(*args, **kwargs):
+            load_once()
+            return original[name](*args, **kwargs)
+        return call
+
+    for name in original:
+        setattr(audio_encoder, name, wrap(name))
+
+def load_musicgen_weights(model_dir, lazy_codec=LAZY_AUDIO_CODEC):
+    """
+    로컬 디렉토리에서 MusicGen 모델을 만듭니다. 가중치 초기화 없이 모델을 만들고,
+    메모리 맵 safetensors 텐서를 load_state_dict(assign=True)로 복사 없이 연결합니다.
+
+    Args:
+        model_dir (str): 모델 디렉토리 (config.json과 safetensors 포함)
+        lazy_codec (bool): 오디오 코덱 가중치를 첫 디코딩 때 연결
+
+    Returns:
+        MusicgenForConditionalGeneration: eval 모드 모델
+    """
+    from transformers import MusicgenConfig, MusicgenForConditionalGeneration
+
+    config = MusicgenConfig.from_pretrained(model_dir, local_files_only=True)
+    with _no_init_weights():
+        model = MusicgenForConditionalGeneration(config)
+
+    tensors = {}
+    for path in _safetensors_files(model_dir):
+        tensors.update(mmap_safetensors(path))
+
+    if lazy_codec:
+        codec_tensors = {name: tensor for name, tensor in tensors.items() if name.startswith(AUDIO_ENCODER_PREFIX)}
+        tensors = {name: tensor for name, tensor in tensors.items() if not name.startswith(AUDIO_ENCODER_PREFIX)}
+        _defer_audio_encoder(model, codec_tensors, threading.Lock())
+
+    missing = _assign_weights(model, tensors)
+    # 공유(tied) 가중치는 파일에 한 번만 저장되므로 다시 묶은 뒤, 파일 텐서를 가리키지 않는 것만 경고
+    model.tie_weights()
+    loaded = {tensor.data_ptr() for tensor in tensors.values()}
+    state = model.state_dict()
+    missing = [name for name in missing if not (lazy_codec and name.startswith(AUDIO_ENCODER_PREFIX))
+               and name in state and state[name].data_ptr() not in loaded]
+    if missing:
+        print(f"Warning: weights missing from {model_dir}: {missing[:5]}")
+    return model.eval()
+
+def load_musicgen_from_dir(model_dir, lazy_codec=LAZY_AUDIO_CODEC):
+    """
+    export로 만든 로컬 디렉토리에서 MusicGen 프로세서와 모델을 오프라인으로 로드합니다.
+
+    Args:
+        model_dir (str): 모델 디렉토리 (config, processor, safetensors 포함)
+        lazy_codec (bool): 오디오 코덱 가중치를 첫 디코딩 때 연결
+
+    Returns:
+        tuple: (processor, model)
+    """
+    from transformers import AutoProcessor
+
+    # 허브에 접속하거나 캐시를 찾지 않음
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+    processor = AutoProcessor.from_pretrained(model_dir, local_files_only=True)
+    return processor, load_musicgen_weights(model_dir, lazy_codec)
+
+def export_musicgen_model(output_dir, model_name="facebook/musicgen-small", revision=None):
+    """
+    허브 모델을 고정된 로컬 디렉토리로 내보냅니다 (safetensors, 한 번만 실행).
+
+    Args:
+        output_dir (str): 저장할 디렉토리
+        model_name (str): 허브 모델 이름
+        revision (str): 고정할 리비전 (None이면 기본 브랜치)
+
+    Returns:
+        str: output_dir
+    """
+    from transformers import AutoProcessor, MusicgenForConditionalGeneration
+    processor = AutoProcessor.from_pretrained(model_name, revision=revision)
+    model = MusicgenForConditionalGeneration.from_pretrained(model_name, revision=revision)
+    os.makedirs(output_dir, exist_ok=True)
+    processor.save_pretrained(output_dir)
+    model.save_pretrained(output_dir, safe_serialization=True)
+    with open(os.path.join(output_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump({
+            "model": model_name,
+            "revision": revision or getattr(model.config, "_commit_hash", None),
+            "exported_at": time.strftime('%Y-%m-%d %H:%M:%S')
+        }, f, ensure_ascii=False, indent=2)
+    print(f"MusicGen exported to {output_dir}")
+    return output_dir
+
+def measure_startup(model_dir=None, lazy_codec=LAZY_AUDIO_CODEC):
+    """
+    이 프로세스에서 MusicGen을 로드하고 시작 시간과 메모리를 측정합니다.
+
+    Args:
+        model_dir (str): 로컬 모델 디렉토리 (None이면 허브 from_pretrained)
+        lazy_codec (bool): 오디오 코덱 가중치를 첫 디코딩 때 연결
+
+    Returns:
+        dict: {'source', 'lazy_codec', 'import_seconds', 'seconds', 'uss_mb', 'rss_mb'}
+    """
+    start = time.perf_counter()
+    from transformers import AutoProcessor, MusicgenForConditionalGeneration
+    import_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if model_dir:
+        load_musicgen_from_dir(model_dir, lazy_codec=lazy_codec)
+    else:
+        from music_generator import MUSICGEN_MODEL_NAME
+        AutoProcessor.from_pretrained(MUSICGEN_MODEL_NAME)
+        MusicgenForConditionalGeneration.from_pretrained(MUSICGEN_MODEL_NAME)
+    return {
+        'source': 'local_mmap' if model_dir else 'hub',
+        'lazy_codec': bool(model_dir and lazy_codec),
+        'import_seconds': round(import_seconds, 3),
+        'seconds': round(time.perf_counter() - start, 3),
+        'uss_mb': current_uss_mb(),
+        'rss_mb': current_rss_mb()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Export MusicGen to a local directory and measure cold start')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Save the hub model as a pinned local safetensors directory')
+    export_parser.add_argument('output_dir', help='Directory to write')
+    export_parser.add_argument('--model', default="facebook/musicgen-small", help='Hub model name')
+    export_parser.add_argument('--revision', default=None, help='Hub revision to pin')
+
+    startup_parser = subparsers.add_parser('startup', help='Measure load time and per-worker USS')
+    startup_parser.add_argument('--model_dir', default=MUSICGEN_MODEL_DIR, help='Local model directory (default: MUSICGEN_MODEL_DIR, hub if unset)')
+    startup_parser.add_argument('--workers', type=int, default=1, help='Number of worker processes to start together')
+    startup_parser.add_argument('--lazy_codec', action='store_true', help='Attach audio codec weights on first decode')
+    startup_parser.add_argument('--json', action='store_true', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    if args.command == 'export':
+        export_musicgen_model(args.output_dir, args.model, args.revision)
+        return
+
+    if args.json:
+        # 워커 프로세스: 결과를 JSON 한 줄로 출력
+        print(json.dumps(measure_startup(args.model_dir, args.lazy_codec or LAZY_AUDIO_CODEC)))
+        return
+
+    # 각 워커를 새 프로세스로 동시에 시작 (같은 파일을 메모리 맵하면 USS만 워커별로 늘어남)
+    command = [sys.executable, os.path.abspath(__file__), 'startup', '--json']
+    if args.model_dir:
+        command += ['--model_dir', args.model_dir]
+    if args.lazy_codec:
+        command.append('--lazy_codec')
+    workers = [subprocess.Popen(command, stdout=subprocess.PIPE, text=True) for _ in range(args.workers)]
+    for number, worker in enumerate(workers, 1):
+        output, _ = worker.communicate()
+        lines = output.strip().splitlines()
+        if worker.returncode != 0 or not lines:
+            print(f"worker {number}: failed (exit code {worker.returncode})")
+            continue
+        result = json.loads(lines[-1])
+        uss = f"{result['uss_mb']:.1f}" if result['uss_mb'] is not None else "-"
+        rss = f"{result['rss_mb']:.1f}" if result['rss_mb'] is not None else "-"
+        print(f"worker {number}: {result['source']} load {result['seconds']:.2f}s (imports {result['import_seconds']:.2f}s), "
+              f"USS {uss} MB, RSS {rss} MB")
+
+if __name__ == "__main__":
+    main()
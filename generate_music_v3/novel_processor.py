@@ -1,7 +1,9 @@
 import os
 import re
 import json
+import time
 import hashlib
+import metrics
 
 def process_novel_file(file_path, use_cache=True):
     """
@@ -36,10 +38,14 @@ def process_novel_file(file_path, use_cache=True):
             with open(cache_path, "r", encoding="utf-8") as f:
                 cached_data = json.load(f)
                 print(f"Using cached content for: {file_path}")
+                metrics.increment('cache_hits_total', cache='novel')
                 return cached_data
         except Exception as e:
             print(f"Error loading cache: {e}. Proceeding with fresh processing.")
+    if use_cache:
+        metrics.increment('cache_misses_total', cache='novel')
     
+    parse_start = time.perf_counter()
     try:
         # 파일 확장자 확인
         _, ext = os.path.splitext(file_path)
@@ -84,6 +90,8 @@ def process_novel_file(file_path, use_cache=True):
                     'content': chapters[i].strip()
                 })
         
+        metrics.observe('stage_seconds', time.perf_counter() - parse_start, stage='novel_parse')
+
         # 결과 저장
         result = {
             'title': title,
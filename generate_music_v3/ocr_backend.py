@@ -0,0 +1,190 @@
+import atexit
+import os
+import threading
+import metrics
+
+# 사용할 OCR 백엔드: 'auto'(tesserocr가 있으면 사용, 없으면 pytesseract), 'tesserocr', 'pytesseract'
+OCR_BACKEND = os.environ.get("OCR_BACKEND", "auto")
+
+# tesseract 실행 파일 경로 (pytesseract 백엔드). 없으면 Windows 기본 설치 경로, 그것도 없으면 PATH의 tesseract
+TESSERACT_CMD = os.environ.get("TESSERACT_CMD")
+WINDOWS_TESSERACT_CMD = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+
+# traineddata 디렉토리 (tesserocr 백엔드, None이면 Tesseract 기본 위치/TESSDATA_PREFIX)
+TESSDATA_PATH = os.environ.get("TESSDATA_PATH")
+
+# 언어별로 남겨 둘 유휴 tesserocr 엔진 수 (동시에 OCR하는 스레드 수 정도면 충분)
+OCR_MAX_IDLE_ENGINES = int(os.environ.get("OCR_MAX_IDLE_ENGINES", "2"))
+
+# tesserocr는 처음 import할 때 시그널 핸들러를 등록하므로(cysignals) 메인 스레드에서만 import할 수 있음.
+# OCR은 그룹 파이프라인의 워커 스레드에서 처음 호출되므로 이 모듈을 불러올 때 미리 import
+if OCR_BACKEND != 'pytesseract':
+    try:
+        import tesserocr  # noqa: F401
+    except (ImportError, ValueError):
+        pass
+
+class OcrEngineInitError(RuntimeError):
+    """OCR 엔진을 초기화하지 못함 (언어 데이터가 없는 경우 등)"""
+
+class TesserocrBackend:
+    """
+    libtesseract를 프로세스 안에서 바로 호출하는 백엔드 (tesserocr).
+    PyTessBaseAPI는 스레드 안전하지 않으므로 호출마다 언어별 엔진 풀에서 하나를 빌려 쓰고 돌려줍니다.
+    엔진은 스레드에 묶이지 않으므로 에피소드마다 OCR 스레드가 새로 만들어져도 언어 데이터는 다시 읽지 않습니다.
+    동시에 쓰인 수만큼만 엔진이 생기고, 언어별로 max_idle개를 넘는 유휴 엔진은 바로 해제합니다.
+    이미지는 파일로 저장하지 않고 8비트 흑백 픽셀 버퍼를 그대로 넘깁니다.
+    """
+
+    name = 'tesserocr'
+
+    def __init__(self, tessdata_path=TESSDATA_PATH, max_idle=OCR_MAX_IDLE_ENGINES):
+        try:
+            import tesserocr
+        except ValueError as e:
+            # 메인 스레드에서 한 번도 import되지 않은 채 워커 스레드에서 처음 import한 경우
+            raise ImportError(f"tesserocr could not be imported outside the main thread ({e})") from e
+        self._tesserocr = tesserocr
+        self.tessdata_path = tessdata_path
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _create_api(self, lang):
+        with metrics.timer('ocr_engine_init', backend=self.name):
+            options = {'lang': lang}
+            if self.tessdata_path:
+                options['path'] = self.tessdata_path
+            try:
+                return self._tesserocr.PyTessBaseAPI(**options)
+            except RuntimeError as e:
+                raise OcrEngineInitError(f"Could not load Tesseract language data '{lang}': {e}") from e
+
+    def _checkout(self, lang):
+        with self._lock:
+            idle = self._idle.get(lang)
+            if idle:
+                return idle.pop()
+        return self._create_api(lang)
+
+    def _checkin(self, lang, api):
+        with self._lock:
+            idle = self._idle.setdefault(lang, [])
+            if len(idle) < self.max_idle:
+                idle.append(api)
+                return
+        api.End()
+
+    def image_to_text(self, image, lang):
+        gray_image = image if image.mode == 'L' else image.convert('L')
+        api = self._checkout(lang)
+        try:
+            api.SetImageBytes(gray_image.tobytes(), gray_image.width, gray_image.height, 1, gray_image.width)
+            return api.GetUTF8Text()
+        finally:
+            api.Clear()
+            self._checkin(lang, api)
+
+    def close(self):
+        """유휴 엔진 모두 해제 (사용 중인 엔진은 반납될 때 새 풀에 들어감)"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for apis in idle.values():
+            for api in apis:
+                api.End()
+
+class PytesseractBackend:
+    """
+    호출마다 tesseract 프로세스를 실행하는 백엔드 (pytesseract).
+    이미지를 임시 파일로 저장하고 언어 데이터도 매번 다시 읽으므로 느리지만 바이너리만 있으면 동작합니다.
+    """
+
+    name = 'pytesseract'
+
+    def __init__(self, tesseract_cmd=TESSERACT_CMD):
+        import pytesseract
+        self._pytesseract = pytesseract
+        if tesseract_cmd:
+            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        elif os.name == 'nt' and os.path.exists(WINDOWS_TESSERACT_CMD):
+            pytesseract.pytesseract.tesseract_cmd = WINDOWS_TESSERACT_CMD
+
+    def image_to_text(self, image, lang):
+        return self._pytesseract.image_to_string(image, lang=lang)
+
+    def close(self):
+        pass
+
+OCR_BACKENDS = {
+    'tesserocr': TesserocrBackend,
+    'pytesseract': PytesseractBackend,
+}
+
+def create_ocr_backend(name=OCR_BACKEND):
+    """
+    OCR 백엔드를 만듭니다. 'auto'이면 tesserocr를 먼저 시도하고, 설치되어 있지 않으면 pytesseract를 사용합니다.
+
+    Args:
+        name (str): 'auto', 'tesserocr', 'pytesseract'
+
+    Returns:
+        TesserocrBackend 또는 PytesseractBackend
+    """
+    if name != 'auto':
+        if name not in OCR_BACKENDS:
+            raise ValueError(f"Unknown OCR backend: {name}")
+        return OCR_BACKENDS[name]()
+    try:
+        return TesserocrBackend()
+    except ImportError as e:
+        print(f"tesserocr is not available ({e}), using pytesseract (one tesseract process per image)")
+        return PytesseractBackend()
+
+_ocr_backend = None
+_ocr_backend_lock = threading.Lock()
+
+def get_ocr_backend():
+    """OCR_BACKEND 설정의 백엔드를 프로세스당 한 번만 만들어 재사용"""
+    global _ocr_backend
+    with _ocr_backend_lock:
+        if _ocr_backend is None:
+            _ocr_backend = create_ocr_backend()
+            print(f"OCR backend: {_ocr_backend.name}")
+        return _ocr_backend
+
+def close_ocr_backend():
+    """프로세스 종료 시 OCR 엔진(네이티브 메모리) 해제"""
+    global _ocr_backend
+    with _ocr_backend_lock:
+        backend, _ocr_backend = _ocr_backend, None
+    if backend is not None:
+        backend.close()
+
+atexit.register(close_ocr_backend)
+
+def image_to_text(image, lang):
+    """
+    이미지 한 장의 텍스트를 추출합니다.
+
+    Args:
+        image (PIL.Image): OCR할 이미지 (전처리된 흑백/이진 이미지)
+        lang (str): Tesseract 언어 (예: 'kor+eng')
+
+    Returns:
+        str: 추출된 텍스트
+    """
+    global _ocr_backend
+    backend = get_ocr_backend()
+    try:
+        with metrics.timer('ocr_engine', backend=backend.name):
+            return backend.image_to_text(image, lang)
+    except OcrEngineInitError as e:
+        if OCR_BACKEND != 'auto':
+            raise
+        # 자동 선택인데 tesserocr가 언어 데이터를 찾지 못하면 tesseract 실행 파일로 전환
+        print(f"{e}, falling back to pytesseract")
+        with _ocr_backend_lock:
+            if _ocr_backend is backend:
+                _ocr_backend = PytesseractBackend()
+        backend.close()
+        return image_to_text(image, lang)
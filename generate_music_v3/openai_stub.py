@@ -0,0 +1,334 @@
+import argparse
+import base64
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 응답 방식 (요청마다 faults에서 하나씩 꺼내 쓰고, 비어 있으면 'ok')
+# 'ok': 정상 응답, 'missing': 여러 이미지 응답에서 마지막 이미지를 뺌, 'malformed': JSON이 아닌 응답,
+# 'error': HTTP 500, 'slow': SLOW_SECONDS초 뒤에 정상 응답
+FAULTS = ('ok', 'missing', 'malformed', 'error', 'slow')
+
+# 'slow' 응답 지연 (초)
+SLOW_SECONDS = 2.0
+
+def stub_keyword(image_hash):
+    """스텁 서버가 이미지 내용 해시마다 돌려주는 키워드 (응답이 어느 이미지 것인지 확인용)"""
+    return f"stub_{image_hash[:8]}"
+
+def _image_hashes(messages):
+    """요청 메시지의 data URL 이미지를 디코딩해 순서대로 MD5 해시 목록을 만듦"""
+    hashes = []
+    for message in messages:
+        content = message.get('content')
+        if not isinstance(content, list):
+            continue
+        for part in content:
+            if part.get('type') == 'image_url':
+                data = part['image_url']['url'].split(',', 1)[1]
+                hashes.append(hashlib.md5(base64.b64decode(data)).hexdigest())
+    return hashes
+
+class StubOpenAIServer(ThreadingHTTPServer):
+    """
+    OpenAI chat completions API를 흉내 내는 로컬 서버 (OPENAI_BASE_URL=<base_url>로 연결).
+    이미지가 여러 장이고 JSON 응답을 요청하면 이미지별 JSON, 한 장이면 '키워드: ...' 텍스트로 답합니다.
+    faults에 넣은 응답 방식을 요청 순서대로 하나씩 적용합니다.
+
+    Args:
+        faults (iterable): 요청별 응답 방식 (FAULTS 항목)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), faults=()):
+        super().__init__(address, _Handler)
+        self.faults = deque(faults)
+        self.lock = threading.Lock()
+        # 받은 요청마다 함께 들어온 이미지 수
+        self.image_counts = []
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/v1"
+
+    def add_faults(self, *faults):
+        with self.lock:
+            self.faults.extend(faults)
+
+    def next_fault(self, image_count):
+        with self.lock:
+            self.image_counts.append(image_count)
+            return self.faults.popleft() if self.faults else 'ok'
+
+    def handle_error(self, request, client_address):
+        # 클라이언트가 제한 시간으로 끊은 연결에 늦게 응답하는 경우는 정상
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        hashes = _image_hashes(request.get("messages", []))
+        fault = self.server.next_fault(len(hashes))
+        if fault == 'error':
+            self._send_json(500, {"error": {"message": "injected failure", "type": "server_error"}})
+            return
+        if fault == 'slow':
+            time.sleep(SLOW_SECONDS)
+
+        batch = len(hashes) > 1 or (request.get("response_format") or {}).get("type") == "json_object"
+        if fault == 'malformed':
+            content = "Sorry, I can only describe these images in prose."
+        elif batch:
+            entries = [{"index": index, "keywords": [stub_keyword(image_hash), "calm"]}
+                       for index, image_hash in enumerate(hashes, 1)]
+            if fault == 'missing':
+                entries = entries[:-1]
+            content = json.dumps({"images": entries}, ensure_ascii=False)
+        else:
+            content = f"키워드: {', '.join(stub_keyword(image_hash) for image_hash in hashes)}, calm"
+
+        self._send_json(200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": 0,
+            "model": request.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10 * max(1, len(hashes)), "completion_tokens": 10, "total_tokens": 10 * max(1, len(hashes)) + 10}
+        })
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(faults=()):
+    """스텁 서버를 백그라운드 스레드로 시작"""
+    server = StubOpenAIServer(faults=faults)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def _write_images(directory, count, seed):
+    """내용이 서로 다른 분석용 이미지 파일 생성, (경로, 해시) 리스트 반환"""
+    import numpy as np
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    images = []
+    for idx in range(count):
+        path = os.path.join(directory, f"group_{seed}_{idx}.png")
+        Image.fromarray(rng.integers(0, 256, size=(160, 120, 3), dtype=np.uint8)).save(path)
+        with open(path, "rb") as f:
+            images.append((path, hashlib.md5(f.read()).hexdigest()))
+    return images
+
+def check_batch_analysis(server):
+    """
+    analyze_images_batch를 스텁 서버로 확인합니다.
+    - 응답에서 빠진 이미지는 한 장씩 다시 요청하고, 모든 결과가 이미지 해시별로 캐시됨
+    - JSON이 아닌 응답이면 묶음의 모든 이미지를 한 장씩 다시 요청
+    - 캐시된 이미지는 다시 보내지 않음
+    """
+    from keyword_extractor import analyze_images_batch, image_analysis_cache_path
+
+    def analyze(images, batch_size=4):
+        before = len(server.image_counts)
+        results = analyze_images_batch([path for path, _ in images], "stub-key", batch_size=batch_size,
+                                       local_threshold=None)
+        for (path, image_hash), keywords in zip(images, results):
+            assert stub_keyword(image_hash) in keywords, f"{path}: 다른 이미지의 키워드 {keywords}"
+            with open(image_analysis_cache_path(image_hash), "r", encoding="utf-8") as f:
+                assert stub_keyword(image_hash) in json.load(f)["keywords"]
+        return server.image_counts[before:]
+
+    images = _write_images(".", 6, seed=1)
+    server.add_faults('missing', 'ok', 'ok')
+    counts = analyze(images)
+    assert counts == [4, 1, 2], counts
+    print(f"missing image: requests with {counts} images (4-image batch, single retry, 2-image batch)")
+
+    assert analyze(images) == [], "cached images were sent again"
+    print("rerun: all 6 images served from the per-hash cache")
+
+    malformed = _write_images(".", 3, seed=2)
+    server.add_faults('malformed')
+    counts = analyze(malformed)
+    assert counts == [3, 1, 1, 1], counts
+    print(f"malformed reply: requests with {counts} images (batch, then one retry per image)")
+
+    mixed = images[:2] + _write_images(".", 1, seed=3)
+    counts = analyze(mixed)
+    assert counts == [1], counts
+    print("mixed batch: only the uncached image was sent")
+
+
+def _counter(name, api):
+    import metrics
+    return sum(counter['value'] for counter in metrics.snapshot()['counters']
+               if counter['name'] == name and counter['labels'].get('api') == api)
+
+def check_resilient_client(server):
+    """
+    resilient_client를 스텁 서버로 확인합니다.
+    - 시도 제한 시간: 느린 응답을 기다리지 않고 제한 시간에 실패
+    - 재시도: 500 두 번 뒤 성공, 지터 백오프로 재시도 두 번
+    - 헤지: 지연 통계가 쌓인 뒤 느린 응답이 오면 두 번째 요청의 결과를 사용
+    - 회로 차단기: 연속 실패로 열림 → 호출 없이 실패 → 시험 호출 실패로 다시 열림 → 시험 호출 성공으로 닫힘
+    """
+    import openai
+    from resilient_client import CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded, ResilientClient
+
+    openai_client = openai.OpenAI(api_key="stub-key", base_url=server.base_url, max_retries=0)
+
+    def request(timeout):
+        return openai_client.chat.completions.create(model="gpt-4o", messages=[{"role": "user", "content": "ping"}],
+                                                     timeout=timeout)
+
+    def call(client, deadline=None):
+        return client.call(request, deadline=deadline)
+
+    def wait_for_requests(count):
+        # 제한 시간으로 버린 시도도 서버에는 도착하므로, 다음 확인의 응답 방식을 가져가지 않도록 기다림
+        while len(server.image_counts) < count:
+            time.sleep(0.01)
+
+    # 연결과 클라이언트 준비 (첫 요청의 준비 시간이 제한 시간에 들어가지 않도록)
+    request(5.0)
+
+    # 시도 제한 시간
+    client = ResilientClient('stub_timeout', call_timeout=0.3, max_retries=0, hedge_quantile=None)
+    before = len(server.image_counts)
+    server.add_faults('slow')
+    start = time.monotonic()
+    try:
+        call(client)
+        raise AssertionError("slow reply did not time out")
+    except DeadlineExceeded:
+        elapsed = time.monotonic() - start
+    assert elapsed < SLOW_SECONDS / 2, f"timed out after {elapsed:.2f}s"
+    wait_for_requests(before + 1)
+    print(f"timeout: gave up on a {SLOW_SECONDS:.0f}s reply after {elapsed:.2f}s")
+
+    # 재시도와 백오프
+    client = ResilientClient('stub_retry', call_timeout=1.0, max_retries=2, backoff_base=0.05, hedge_quantile=None)
+    before = len(server.image_counts)
+    server.add_faults('error', 'error')
+    assert call(client).choices[0].message.content
+    assert len(server.image_counts) - before == 3 and _counter('api_retries_total', 'stub_retry') == 2
+    print("retry: succeeded on the 3rd attempt after 2 backoff retries")
+
+    # 요청 전체 제한 시간은 재시도에도 적용
+    client = ResilientClient('stub_deadline', call_timeout=1.0, max_retries=5, backoff_base=0.05, hedge_quantile=None)
+    before = len(server.image_counts)
+    server.add_faults('slow')
+    start = time.monotonic()
+    try:
+        call(client, Deadline(0.5))
+        raise AssertionError("request outlived its deadline")
+    except DeadlineExceeded:
+        elapsed = time.monotonic() - start
+    assert elapsed < 1.0, f"deadline exceeded after {elapsed:.2f}s"
+    wait_for_requests(before + 1)
+    print(f"deadline: request gave up after {elapsed:.2f}s with a 0.5s deadline")
+
+    # 헤지 요청
+    client = ResilientClient('stub_hedge', call_timeout=5.0, max_retries=0, hedge_quantile=0.95)
+    for _ in range(25):
+        call(client)
+    server.add_faults('slow')
+    start = time.monotonic()
+    call(client)
+    elapsed = time.monotonic() - start
+    assert elapsed < SLOW_SECONDS / 2 and _counter('api_hedges_total', 'stub_hedge') == 1, elapsed
+    print(f"hedge: slow first reply, hedged request answered in {elapsed:.2f}s")
+
+    # 회로 차단기
+    breaker = CircuitBreaker('stub_breaker', failure_threshold=3, reset_timeout=0.3)
+    client = ResilientClient('stub_breaker', call_timeout=1.0, max_retries=0, hedge_quantile=None, breaker=breaker)
+    server.add_faults('error', 'error', 'error')
+    for _ in range(3):
+        try:
+            call(client)
+        except CircuitOpenError:
+            raise
+        except Exception:
+            pass
+    assert breaker.state == 'open'
+    before = len(server.image_counts)
+    try:
+        call(client)
+        raise AssertionError("open circuit let a call through")
+    except CircuitOpenError:
+        assert len(server.image_counts) == before
+    time.sleep(0.35)
+    server.add_faults('error')
+    try:
+        call(client)
+    except CircuitOpenError:
+        raise
+    except Exception:
+        pass
+    assert breaker.state == 'open' and len(server.image_counts) == before + 1
+    time.sleep(0.35)
+    call(client)
+    assert breaker.state == 'closed'
+    print("circuit breaker: opened after 3 failures, short-circuited, reopened on a failed probe, closed on success")
+
+def run_checks(checks):
+    """임시 디렉토리(캐시 위치)에서 스텁 서버로 확인 함수를 차례로 실행"""
+    server = start_stub_server()
+    previous_cwd = os.getcwd()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            for check in checks:
+                print(f"== {check.__name__}")
+                check(server)
+    finally:
+        os.chdir(previous_cwd)
+        server.shutdown()
+    print("OK")
+
+CHECKS = {
+    'batch': check_batch_analysis,
+    'resilience': check_resilient_client,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description='Local OpenAI chat completions stub for testing vision requests')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Run the stub server (set OPENAI_BASE_URL=http://127.0.0.1:<port>/v1)')
+    serve_parser.add_argument('--port', type=int, default=8000)
+    serve_parser.add_argument('--faults', nargs='*', default=[], choices=FAULTS, help='Per-request reply modes, in order')
+
+    check_parser = subparsers.add_parser('check', help='Run the vision request checks against an in-process stub')
+    check_parser.add_argument('--only', nargs='*', choices=sorted(CHECKS), help='Checks to run (default: all)')
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        server = StubOpenAIServer(("127.0.0.1", args.port), args.faults)
+        print(f"Stub OpenAI server: {server.base_url}")
+        server.serve_forever()
+    else:
+        run_checks([CHECKS[name] for name in (args.only or CHECKS)])
+
+if __name__ == "__main__":
+    main()
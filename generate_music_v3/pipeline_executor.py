@@ -0,0 +1,176 @@
+import queue
+import threading
+import time
+import traceback
+
+# 단계 종료 신호
+_END = object()
+
+class _Failed:
+    """어떤 단계에서 실패한 항목 (이후 단계는 건너뛰고 바로 결과로 전달)"""
+    def __init__(self, item, stage_name, error):
+        self.item = item
+        self.stage_name = stage_name
+        self.error = error
+
+class PipelineExecutor:
+    """
+    여러 입력을 단계별 워커 풀로 처리하는 파이프라인 실행기.
+    단계 사이에는 크기가 제한된 큐가 있어서, 항목 N이 음악을 생성하는 동안
+    항목 N+1은 키워드 추출, 항목 N+2는 OCR을 진행할 수 있습니다.
+
+    Args:
+        stages (list): (단계 이름, 처리 함수, 워커 수) 튜플 리스트. 처리 함수는 항목을 받아 다음 단계로 넘길 항목을 반환
+        queue_size (int): 단계 사이 큐의 최대 크기
+    """
+
+    def __init__(self, stages, queue_size=2):
+        self.stages = [(name, func, max(1, workers)) for name, func, workers in stages]
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._wall_time = 0.0
+
+    def _new_stats(self):
+        return {
+            name: {'workers': workers, 'items': 0, 'errors': 0, 'busy': 0.0, 'starved': 0.0, 'blocked': 0.0}
+            for name, _, workers in self.stages
+        }
+
+    def _worker(self, stage_idx, in_queue, out_queue, final_queue, remaining):
+        name, func, _ = self.stages[stage_idx]
+        stats = self._stats[name]
+        while True:
+            wait_start = time.time()
+            item = in_queue.get()
+            waited = time.time() - wait_start
+
+            if item is _END:
+                with self._lock:
+                    stats['starved'] += waited
+                    remaining[stage_idx] -= 1
+                    last_worker = remaining[stage_idx] == 0
+                # 마지막 워커가 다음 단계 워커 수만큼 종료 신호 전달
+                if last_worker:
+                    next_workers = self.stages[stage_idx + 1][2] if stage_idx + 1 < len(self.stages) else 1
+                    for _ in range(next_workers):
+                        out_queue.put(_END)
+                return
+
+            busy_start = time.time()
+            try:
+                result = func(item)
+                error = None
+            except Exception as e:
+                print(f"Pipeline stage '{name}' failed: {e}")
+                traceback.print_exc()
+                result = _Failed(item, name, e)
+                error = e
+            busy = time.time() - busy_start
+
+            put_start = time.time()
+            if error is None:
+                out_queue.put(result)
+            else:
+                final_queue.put(result)
+            blocked = time.time() - put_start
+
+            with self._lock:
+                stats['starved'] += waited
+                stats['busy'] += busy
+                stats['blocked'] += blocked
+                stats['items'] += 1
+                if error is not None:
+                    stats['errors'] += 1
+
+    def run(self, items, on_complete=None, on_error=None):
+        """
+        모든 항목을 파이프라인으로 처리합니다.
+
+        Args:
+            items (iterable): 입력 항목
+            on_complete (callable): 마지막 단계까지 끝난 항목마다 호출 (결과 항목 전달)
+            on_error (callable): 실패한 항목마다 호출 (원래 항목, 단계 이름, 예외 전달)
+
+        Returns:
+            tuple: (완료된 결과 리스트, 실패 리스트[(항목, 단계 이름, 예외)])
+        """
+        self._stats = self._new_stats()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        # 최종 결과 큐는 메인 스레드가 계속 비우므로 크기 제한 없음
+        final_queue = queue.Queue()
+        queues.append(final_queue)
+        remaining = [workers for _, _, workers in self.stages]
+
+        threads = []
+        for stage_idx, (name, _, workers) in enumerate(self.stages):
+            for worker_idx in range(workers):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(stage_idx, queues[stage_idx], queues[stage_idx + 1], final_queue, remaining),
+                    name=f"pipeline-{name}-{worker_idx + 1}",
+                    daemon=True
+                )
+                threads.append(thread)
+
+        def produce():
+            try:
+                for item in items:
+                    queues[0].put(item)
+            finally:
+                for _ in range(self.stages[0][2]):
+                    queues[0].put(_END)
+
+        start = time.time()
+        producer = threading.Thread(target=produce, name="pipeline-producer", daemon=True)
+        for thread in threads:
+            thread.start()
+        producer.start()
+
+        completed = []
+        failed = []
+        while True:
+            result = final_queue.get()
+            if result is _END:
+                break
+            if isinstance(result, _Failed):
+                failed.append((result.item, result.stage_name, result.error))
+                if on_error:
+                    on_error(result.item, result.stage_name, result.error)
+            else:
+                completed.append(result)
+                if on_complete:
+                    on_complete(result)
+
+        producer.join()
+        for thread in threads:
+            thread.join()
+        self._wall_time = time.time() - start
+        return completed, failed
+
+    def stats(self):
+        """
+        마지막 실행의 단계별 통계를 반환합니다.
+        utilisation은 (처리 시간 합) / (전체 시간 × 워커 수)로, 가장 높은 단계가 병목입니다.
+
+        Returns:
+            dict: 단계 이름 → 통계
+        """
+        result = {}
+        for name, stats in self._stats.items():
+            capacity = self._wall_time * stats['workers']
+            result[name] = dict(stats)
+            result[name]['utilisation'] = stats['busy'] / capacity if capacity > 0 else 0.0
+        return result
+
+    def print_stats(self):
+        """단계별 처리량과 사용률을 표로 출력"""
+        stats = self.stats()
+        print(f"Pipeline wall time: {self._wall_time:.1f}s")
+        print(f"{'stage':<12}{'workers':>8}{'items':>7}{'errors':>7}{'busy(s)':>10}{'starved(s)':>12}{'blocked(s)':>12}{'util':>7}")
+        for name, s in stats.items():
+            print(f"{name:<12}{s['workers']:>8}{s['items']:>7}{s['errors']:>7}{s['busy']:>10.1f}"
+                  f"{s['starved']:>12.1f}{s['blocked']:>12.1f}{s['utilisation']:>7.0%}")
+        if stats:
+            bottleneck = max(stats, key=lambda name: stats[name]['utilisation'])
+            print(f"Bottleneck stage: {bottleneck}")
@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+import numpy as np
+import metrics
+
+# 프롬프트 임베딩 모델 (작은 문장 임베딩 모델)
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# 이 값 이상으로 비슷한 프롬프트로 만든 곡이 있으면 새로 생성하지 않고 재사용
+DEFAULT_SIMILARITY_THRESHOLD = 0.92
+
+PROMPT_INDEX_DIR = os.path.join("cache", "music", "prompt_index")
+
+# 유사도 히스토그램 버킷
+SIMILARITY_BUCKETS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.92, 0.95, 0.98, 1.0)
+
+_embedding_model = None
+_embedding_lock = threading.Lock()
+
+def get_embedding_model():
+    """문장 임베딩 모델을 처음 호출될 때 로드하고 이후에는 같은 인스턴스를 반환합니다."""
+    global _embedding_model
+    with _embedding_lock:
+        if _embedding_model is None:
+            from sentence_transformers import SentenceTransformer
+            with metrics.timer('prompt_embedding_load'):
+                _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        return _embedding_model
+
+def embed_prompts(prompts):
+    """
+    프롬프트를 정규화된 임베딩으로 변환합니다.
+
+    Returns:
+        numpy.ndarray: (프롬프트 수, 차원) float32 배열 (L2 노름 1)
+    """
+    with metrics.timer('prompt_embedding'):
+        vectors = get_embedding_model().encode(list(prompts), normalize_embeddings=True)
+    return np.asarray(vectors, dtype=np.float32)
+
+class BruteForceIndex:
+    """
+    정규화된 벡터의 내적(코사인 유사도)으로 가장 가까운 항목을 찾는 단순 인덱스.
+    add/search/vectors만 사용하므로 같은 인터페이스의 ANN 인덱스(faiss, hnswlib 등)로 바꿀 수 있습니다.
+    """
+
+    def __init__(self, vectors=None):
+        self._vectors = vectors
+
+    def __len__(self):
+        return 0 if self._vectors is None else len(self._vectors)
+
+    @property
+    def vectors(self):
+        return self._vectors
+
+    def add(self, vectors):
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        self._vectors = vectors if self._vectors is None else np.vstack([self._vectors, vectors])
+
+    def search(self, query, k=1, mask=None):
+        """
+        Args:
+            query (numpy.ndarray): 정규화된 쿼리 벡터
+            k (int): 반환할 항목 수
+            mask (numpy.ndarray): 후보로 쓸 항목 (bool 배열, None이면 전체)
+
+        Returns:
+            list: (항목 위치, 유사도) 리스트 (유사도 내림차순)
+        """
+        if not len(self):
+            return []
+        scores = self._vectors @ np.asarray(query, dtype=np.float32)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+class PromptCache:
+    """
+    생성된 곡의 프롬프트 임베딩 인덱스. 새 프롬프트와 충분히 비슷한 프롬프트로 만든 곡을 찾습니다.
+    인덱스는 cache/music/prompt_index에 벡터(.npy)와 항목(.json)으로 저장됩니다.
+
+    Args:
+        index_dir (str): 인덱스 저장 디렉토리
+        threshold (float): 재사용할 최소 코사인 유사도
+        embed (callable): 프롬프트 리스트를 정규화된 벡터 배열로 바꾸는 함수 (기본: embed_prompts)
+        index_factory (callable): 저장된 벡터로 인덱스를 만드는 함수 (기본: BruteForceIndex)
+    """
+
+    def __init__(self, index_dir=PROMPT_INDEX_DIR, threshold=DEFAULT_SIMILARITY_THRESHOLD,
+                 embed=embed_prompts, index_factory=BruteForceIndex):
+        self.index_dir = index_dir
+        self.threshold = threshold
+        self.embed = embed
+        self._lock = threading.Lock()
+        self._vectors_path = os.path.join(index_dir, "vectors.npy")
+        self._entries_path = os.path.join(index_dir, "entries.json")
+
+        self.entries = []
+        vectors = None
+        if os.path.exists(self._vectors_path) and os.path.exists(self._entries_path):
+            try:
+                with open(self._entries_path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+                vectors = np.load(self._vectors_path)
+                if len(vectors) != len(self.entries):
+                    raise ValueError("prompt index vectors and entries do not match")
+            except Exception as e:
+                print(f"Error loading prompt index, starting empty: {e}")
+                self.entries, vectors = [], None
+        self.index = index_factory(vectors)
+
+    def _save(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        # 중간에 중단되어도 이전 인덱스가 남도록 임시 파일에 쓴 뒤 교체
+        temp_vectors = self._vectors_path + ".tmp.npy"
+        np.save(temp_vectors, self.index.vectors)
+        temp_entries = self._entries_path + ".tmp"
+        with open(temp_entries, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        os.replace(temp_vectors, self._vectors_path)
+        os.replace(temp_entries, self._entries_path)
+
+    def lookup(self, prompt, audio_format, exclude_key=None, threshold=None):
+        """
+        비슷한 프롬프트로 만든 곡을 찾습니다.
+
+        Args:
+            prompt (str): 정규화된 프롬프트
+            audio_format (str): 필요한 오디오 형식 (같은 형식으로 캐시된 곡만 후보)
+            exclude_key (str): 제외할 캐시 키 (정확히 같은 키는 이미 확인했으므로)
+            threshold (float): 이번 조회에 쓸 임계값 (None이면 self.threshold)
+
+        Returns:
+            tuple: (항목, 유사도) 또는 기준을 넘는 곡이 없으면 (None, 최고 유사도)
+        """
+        query = self.embed([prompt])[0]
+        with self._lock:
+            if not self.entries:
+                return None, None
+            mask = np.array([
+                entry['format'] == audio_format and entry['cache_key'] != exclude_key
+                and os.path.exists(entry['path'])
+                for entry in self.entries
+            ])
+            if not mask.any():
+                return None, None
+            results = self.index.search(query, k=1, mask=mask)
+            if not results:
+                return None, None
+            position, similarity = results[0]
+            metrics.observe('prompt_similarity', similarity, buckets=SIMILARITY_BUCKETS)
+            if similarity >= (self.threshold if threshold is None else threshold):
+                return dict(self.entries[position]), similarity
+            return None, similarity
+
+    def add(self, prompt, cache_key, audio_format, path):
+        """생성해서 캐시에 저장한 곡의 프롬프트를 인덱스에 추가"""
+        vector = self.embed([prompt])[0]
+        with self._lock:
+            if any(e['cache_key'] == cache_key and e['format'] == audio_format for e in self.entries):
+                return
+            self.index.add(vector)
+            self.entries.append({'cache_key': cache_key, 'format': audio_format, 'path': path, 'prompt': prompt})
+            try:
+                self._save()
+            except Exception as e:
+                print(f"Error saving prompt index: {e}")
+
+_prompt_cache = None
+_prompt_cache_lock = threading.Lock()
+
+def get_prompt_cache():
+    """PromptCache를 프로세스당 한 번만 만들어 재사용"""
+    global _prompt_cache
+    with _prompt_cache_lock:
+        if _prompt_cache is None:
+            _prompt_cache = PromptCache()
+        return _prompt_cache
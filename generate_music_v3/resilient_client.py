@@ -0,0 +1,234 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import metrics
+
+# 외부 API 호출 기본값 (초)
+CALL_TIMEOUT = 30.0
+REQUEST_DEADLINE = 90.0
+MAX_RETRIES = 2
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+# 이 횟수만큼 연속으로 실패하면 회로를 열고 RESET_TIMEOUT초 동안 바로 실패 처리
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+
+# 지연 시간 분포를 추정할 최근 호출 수와, 헤지 요청을 보내기 위한 최소 표본 수
+LATENCY_WINDOW = 100
+HEDGE_MIN_SAMPLES = 20
+
+class DeadlineExceeded(TimeoutError):
+    """요청 전체 또는 호출 한 번의 제한 시간 초과"""
+
+class CircuitOpenError(RuntimeError):
+    """업스트림이 비정상이라 회로가 열려 있어 호출하지 않음"""
+
+class Deadline:
+    """
+    요청 전체의 제한 시간. 여러 호출(재시도 포함)이 같은 Deadline을 공유합니다.
+
+    Args:
+        seconds (float): 지금부터 남은 시간 (None이면 제한 없음)
+    """
+
+    def __init__(self, seconds):
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self):
+        """남은 시간(초). 제한이 없으면 None"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+class CircuitBreaker:
+    """
+    연속 실패가 failure_threshold번 나면 회로를 열어 reset_timeout초 동안 호출을 막습니다.
+    시간이 지나면 한 번만 시험 호출을 허용하고(half-open), 성공하면 다시 닫습니다.
+    """
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """지금 호출해도 되는지 여부"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    print(f"Circuit for {self.name} opened after {self.failures} failures")
+                    metrics.increment('circuit_open_total', api=self.name)
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+class LatencyTracker:
+    """최근 성공한 호출의 지연 시간으로 분위수를 추정"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q, min_samples=HEDGE_MIN_SAMPLES):
+        """분위수 (표본이 min_samples보다 적으면 None)"""
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+class ResilientClient:
+    """
+    외부 API 호출에 제한 시간, 지터가 있는 지수 백오프 재시도, 헤지 요청, 회로 차단기를 적용합니다.
+
+    호출할 함수는 timeout 키워드 인자(초)를 받아 그 안에 끝나도록 해야 합니다 (예: openai의 timeout).
+    스레드는 중간에 취소할 수 없으므로, 제한 시간을 넘긴 시도는 자기 timeout이 지나면 끝나고 결과는 버려집니다.
+
+    Args:
+        name (str): 업스트림 이름 (메트릭 라벨)
+        call_timeout (float): 시도 한 번의 제한 시간(초)
+        max_retries (int): 실패 후 재시도 횟수
+        backoff_base (float): 첫 재시도 대기 시간 상한(초), 재시도마다 두 배
+        backoff_max (float): 재시도 대기 시간 최대값(초)
+        hedge_quantile (float): 이 분위수 지연 시간이 지나도 응답이 없으면 같은 요청을 한 번 더 보냄 (None이면 헤지 안 함)
+        breaker (CircuitBreaker): 회로 차단기 (None이면 새로 만듦)
+    """
+
+    def __init__(self, name, call_timeout=CALL_TIMEOUT, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE,
+                 backoff_max=BACKOFF_MAX, hedge_quantile=0.95, breaker=None, max_workers=8):
+        self.name = name
+        self.call_timeout = call_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_quantile = hedge_quantile
+        self.breaker = breaker or CircuitBreaker(name)
+        self.latency = LatencyTracker()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-call")
+
+    def _timed(self, func, timeout):
+        start = time.perf_counter()
+        result = func(timeout=timeout)
+        self.latency.record(time.perf_counter() - start)
+        return result
+
+    def _attempt(self, func, timeout):
+        """
+        시도 한 번. 응답이 p95보다 늦으면 헤지 요청을 하나 더 보내고 먼저 성공한 결과를 사용합니다.
+        """
+        futures = [self._executor.submit(self._timed, func, timeout)]
+        started = time.monotonic()
+        hedge_delay = self.latency.quantile(self.hedge_quantile) if self.hedge_quantile else None
+        errors = []
+
+        while futures:
+            wait_for = timeout - (time.monotonic() - started)
+            if hedge_delay is not None and len(futures) == 1 and not errors:
+                wait_for = min(wait_for, hedge_delay - (time.monotonic() - started))
+            done, _ = wait(futures, timeout=max(0.0, wait_for), return_when=FIRST_COMPLETED)
+            for future in done:
+                futures.remove(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    errors.append(e)
+            if errors and not futures:
+                raise errors[0]
+            elapsed = time.monotonic() - started
+            if elapsed >= timeout:
+                raise DeadlineExceeded(f"{self.name} call timed out after {timeout:.1f}s")
+            if hedge_delay is not None and len(futures) == 1 and not errors and elapsed >= hedge_delay:
+                metrics.increment('api_hedges_total', api=self.name)
+                futures.append(self._executor.submit(self._timed, func, timeout - elapsed))
+                hedge_delay = None
+        raise errors[0]
+
+    def call(self, func, deadline=None):
+        """
+        func(timeout=...)를 호출합니다.
+
+        Args:
+            func (callable): timeout 키워드 인자를 받는 호출 함수
+            deadline (Deadline): 요청 전체 제한 시간 (None이면 시도당 call_timeout만 적용)
+
+        Returns:
+            func의 반환값
+
+        Raises:
+            CircuitOpenError: 회로가 열려 있을 때 (호출하지 않음)
+            DeadlineExceeded: 제한 시간 안에 성공하지 못했을 때
+            Exception: 재시도 후에도 실패하면 마지막 오류
+        """
+        deadline = deadline or Deadline(None)
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                metrics.increment('api_short_circuits_total', api=self.name)
+                raise CircuitOpenError(f"{self.name} circuit is open")
+
+            remaining = deadline.remaining()
+            if remaining is not None and remaining <= 0:
+                break
+            timeout = self.call_timeout if remaining is None else min(self.call_timeout, remaining)
+            try:
+                result = self._attempt(func, timeout)
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                last_error = e
+                self.breaker.record_failure()
+                if isinstance(e, DeadlineExceeded):
+                    metrics.increment('api_timeouts_total', api=self.name)
+                print(f"{self.name} call failed (attempt {attempt + 1}/{self.max_retries + 1}): {e}")
+
+            if attempt < self.max_retries:
+                # full jitter: 0 ~ min(backoff_max, base * 2^attempt) 사이에서 무작위 대기
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                remaining = deadline.remaining()
+                if remaining is not None and remaining <= delay:
+                    break
+                metrics.increment('api_retries_total', api=self.name)
+                time.sleep(delay)
+
+        if deadline.expired or last_error is None:
+            raise DeadlineExceeded(f"{self.name} request deadline exceeded") from last_error
+        raise last_error
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_resilient_client(name, **options):
+    """업스트림 이름별 ResilientClient를 프로세스당 하나씩 만들어 재사용 (회로 상태와 지연 통계 공유)"""
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = ResilientClient(name, **options)
+        return _clients[name]
@@ -0,0 +1,204 @@
+import json
+import os
+import shutil
+import numpy as np
+import metrics
+from lexicon import LEXICONS, select_dominant
+from music_generator import AUDIO_FORMATS, build_base_prompt, music_cache_paths, render_music_batch
+
+# 연속된 챕터의 분위기/장르 벡터가 현재 큐와 이 코사인 유사도 이상이면 같은 큐로 묶음
+CUE_SIMILARITY = 0.8
+
+# MusicGen generate 한 번에 함께 생성할 큐 수 (GPU 메모리에 맞게 조정)
+CUE_BATCH_SIZE = 4
+
+# 큐를 나눌 때 보는 카테고리 (시대 배경/음악 스타일은 소설 전체 값을 사용)
+CUE_CATEGORIES = ('genre', 'mood')
+
+def chapter_vector(record):
+    """
+    챕터 분석 결과를 장르/분위기 벡터로 변환합니다 (카테고리마다 합이 1이 되도록 정규화).
+
+    Returns:
+        numpy.ndarray: 벡터 (점수가 모두 0인 카테고리는 0)
+    """
+    parts = []
+    for name in CUE_CATEGORIES:
+        lexicon, _ = LEXICONS[name]
+        scores = np.array([record['lexicon'][name].get(category, 0) for category in lexicon], dtype=np.float32)
+        total = scores.sum()
+        parts.append(scores / total if total > 0 else scores)
+    return np.concatenate(parts)
+
+def _cosine(a, b):
+    norm = np.linalg.norm(a) * np.linalg.norm(b)
+    return float(a @ b / norm) if norm > 0 else 0.0
+
+def group_cues(records, threshold=CUE_SIMILARITY):
+    """
+    연속된 챕터 중 벡터가 비슷한 것끼리 큐로 묶습니다.
+    챕터 벡터를 현재 큐의 누적 벡터와 비교하고, 렉시콘 단어가 없는 챕터(빈 챕터 포함)는 앞 큐에 붙입니다.
+
+    Args:
+        records (list): chapter_data 순서의 analyze_chapter 결과 (빈 챕터는 None)
+        threshold (float): 같은 큐로 묶을 최소 코사인 유사도
+
+    Returns:
+        list: 큐별 챕터 인덱스 리스트
+    """
+    cues = []
+    cue_vector = None
+    for index, record in enumerate(records):
+        vector = chapter_vector(record) if record else None
+        if vector is None or not vector.any():
+            if cues:
+                cues[-1].append(index)
+            else:
+                cues.append([index])
+            continue
+        if cue_vector is not None and cue_vector.any() and _cosine(vector, cue_vector) >= threshold:
+            cues[-1].append(index)
+            cue_vector = cue_vector + vector
+        elif cues and cue_vector is None:
+            # 앞쪽 빈 챕터로만 이루어진 큐에 첫 벡터를 붙임
+            cues[-1].append(index)
+            cue_vector = vector
+        else:
+            cues.append([index])
+            cue_vector = vector
+    return cues
+
+def _cue_scores(records, chapter_indices):
+    """큐에 속한 챕터들의 렉시콘 점수 합"""
+    scores = {name: {category: 0 for category in lexicon} for name, (lexicon, _) in LEXICONS.items()}
+    for index in chapter_indices:
+        record = records[index]
+        if not record:
+            continue
+        for name, category_scores in record['lexicon'].items():
+            for category, score in category_scores.items():
+                scores[name][category] += score
+    return scores
+
+def build_soundtrack(chapter_data, records, keywords, genre, mood, era, music_style, output_dir,
+                     output_format=None, use_cache=True, threshold=CUE_SIMILARITY, batch_size=CUE_BATCH_SIZE):
+    """
+    챕터별 분위기 흐름에 맞춘 사운드트랙을 만듭니다.
+    비슷한 챕터를 큐로 묶고, 장르/분위기 조합이 같은 큐는 한 곡을 함께 쓰며, 음악 캐시에 없는 조합만
+    batch_size개씩 묶어 생성하므로 생성 비용은 챕터 수가 아니라 서로 다른 큐 수에 비례합니다.
+
+    Args:
+        chapter_data (list): [{'title', 'content'}] 챕터 리스트
+        records (list): chapter_data 순서의 analyze_chapter 결과 (빈 챕터는 None)
+        keywords (list): 소설 전체 키워드 (모든 큐의 프롬프트에 사용)
+        genre, mood (str): 소설 전체 장르/분위기 (챕터에 단서가 없을 때 사용)
+        era, music_style (str): 소설 전체 시대 배경/음악 스타일
+        output_dir (str): 출력 디렉토리 (soundtrack/ 아래에 큐 파일과 인덱스 저장)
+        output_format (str): 오디오 형식 (None이면 wav)
+        use_cache (bool): 음악 캐시 사용 여부
+        threshold (float): 같은 큐로 묶을 최소 코사인 유사도
+        batch_size (int): generate 한 번에 생성할 큐 수
+
+    Returns:
+        str: soundtrack_index.json 경로
+    """
+    audio_format = output_format or 'wav'
+    if audio_format not in AUDIO_FORMATS:
+        raise ValueError(f"Unsupported audio format: {audio_format}")
+    soundtrack_dir = os.path.join(output_dir, "soundtrack")
+    os.makedirs(soundtrack_dir, exist_ok=True)
+
+    with metrics.timer('soundtrack_grouping'):
+        cue_chapters = group_cues(records, threshold)
+
+    # 큐별 조합 결정 (챕터에 렉시콘 단어가 없으면 소설 전체 값)
+    cues = []
+    for chapter_indices in cue_chapters:
+        scores = _cue_scores(records, chapter_indices)
+        cue_genre, cue_mood, _, _ = select_dominant(scores)
+        if not any(scores['genre'].values()):
+            cue_genre = genre
+        if not any(scores['mood'].values()):
+            cue_mood = mood
+        cues.append({'chapters': chapter_indices, 'combo': (cue_genre, cue_mood, era, music_style)})
+
+    # 조합별로 한 번만 생성 (캐시에 있으면 생성하지 않음)
+    tracks = {}
+    missing = []
+    for cue in cues:
+        combo = cue['combo']
+        if combo in tracks:
+            continue
+        cache_key_hash, cache_path, metadata_path = music_cache_paths(keywords, *combo, audio_format)
+        cached = use_cache and os.path.exists(cache_path)
+        tracks[combo] = {'cache_path': cache_path, 'metadata_path': metadata_path, 'cached': cached,
+                         'prompt': build_base_prompt(keywords, *combo)}
+        metrics.increment('cache_hits_total' if cached else 'cache_misses_total', cache='soundtrack_cue')
+        if not cached:
+            missing.append(combo)
+
+    print(f"Soundtrack: {len(chapter_data)} chapters, {len(cues)} cues, {len(tracks)} distinct, "
+          f"{len(missing)} to generate")
+    metrics.observe('soundtrack_distinct_cues', len(tracks), buckets=(1, 2, 4, 8, 16, 32))
+
+    if missing:
+        os.makedirs(os.path.join("cache", "music"), exist_ok=True)
+        render_paths = [os.path.join(soundtrack_dir, f".render_{i}.{audio_format}") for i in range(len(missing))]
+        with metrics.timer('soundtrack_render'):
+            render_music_batch([tracks[combo]['prompt'] for combo in missing], render_paths, audio_format,
+                               batch_size=batch_size)
+        for combo, render_path in zip(missing, render_paths):
+            track = tracks[combo]
+            if use_cache:
+                shutil.move(render_path, track['cache_path'])
+            else:
+                track['cache_path'] = render_path
+            cue_genre, cue_mood, cue_era, cue_style = combo
+            with open(track['metadata_path'], "w", encoding="utf-8") as f:
+                json.dump({
+                    "keywords": keywords,
+                    "genre": cue_genre,
+                    "mood": cue_mood,
+                    "era": cue_era,
+                    "music_style": cue_style,
+                    "prompt": track['prompt'],
+                    "format": audio_format,
+                    "duration": "3 minutes (6 segments)"
+                }, f, ensure_ascii=False, indent=2)
+
+    # 큐 파일 복사 및 챕터 인덱스 작성
+    index = {'format': audio_format, 'keywords': keywords, 'cues': [], 'chapters': []}
+    for cue_number, cue in enumerate(cues, 1):
+        cue_genre, cue_mood, cue_era, cue_style = cue['combo']
+        track = tracks[cue['combo']]
+        filename = f"cue_{cue_number:02d}_{cue_mood}.{audio_format}"
+        shutil.copyfile(track['cache_path'], os.path.join(soundtrack_dir, filename))
+        index['cues'].append({
+            'cue': cue_number,
+            'file': filename,
+            'chapters': cue['chapters'],
+            'genre': cue_genre,
+            'mood': cue_mood,
+            'era': cue_era,
+            'music_style': cue_style,
+            'prompt': track['prompt'],
+            'cached': track['cached']
+        })
+        for chapter_index in cue['chapters']:
+            index['chapters'].append({
+                'index': chapter_index,
+                'title': chapter_data[chapter_index].get('title', f"Chapter {chapter_index + 1}"),
+                'cue': cue_number,
+                'file': filename
+            })
+    index['chapters'].sort(key=lambda chapter: chapter['index'])
+
+    if not use_cache:
+        for combo in missing:
+            os.remove(tracks[combo]['cache_path'])
+
+    index_path = os.path.join(soundtrack_dir, "soundtrack_index.json")
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    print(f"Soundtrack saved to {soundtrack_dir} ({len(cues)} cues)")
+    return index_path
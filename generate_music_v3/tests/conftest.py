@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# 모듈은 generate_music_v3 폴더에서 실행하는 것을 전제로 하므로 그 폴더를 import 경로에 추가
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def isolated_workdir(tmp_path, monkeypatch):
+    """캐시(cache/...)를 상대 경로로 쓰는 모듈이 저장소를 건드리지 않도록 임시 폴더에서 실행"""
+    monkeypatch.chdir(tmp_path)
+    metrics.reset()
+    yield tmp_path
+    metrics.reset()
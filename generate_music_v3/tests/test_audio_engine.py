@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from audio_engine import AudioReader, concat, measure_lufs, measure_rms_dbfs, normalize, trim
+
+RATE = 16000
+
+
+def write_wav(path, data, rate=RATE):
+    data = np.asarray(data, dtype=np.float32)
+    sf.write(path, data, rate, subtype='FLOAT')
+    return str(path)
+
+
+def sine(seconds, amplitude, freq=1000.0, rate=RATE):
+    t = np.arange(int(seconds * rate)) / rate
+    return amplitude * np.sin(2 * np.pi * freq * t)
+
+
+def read(path):
+    with AudioReader(path) as reader:
+        return reader.read(0, reader.frames)
+
+
+def test_lufs_of_1khz_sine_matches_bs1770_calibration(tmp_path):
+    # BS.1770: 한 채널의 0 dBFS 1 kHz 사인파는 -3.01 LKFS
+    path = write_wav(tmp_path / "tone.wav", sine(5, 0.1))
+    assert measure_lufs(path) == pytest.approx(-23.01, abs=0.1)
+
+
+def test_lufs_is_independent_of_block_size(tmp_path):
+    path = write_wav(tmp_path / "tone.wav", sine(3, 0.3, freq=440))
+    assert measure_lufs(path, block_frames=777) == pytest.approx(measure_lufs(path), abs=1e-6)
+
+
+def test_lufs_gates_out_silence(tmp_path):
+    tone = sine(3, 0.1)
+    with_silence = write_wav(tmp_path / "gap.wav", np.concatenate([tone, np.zeros(3 * RATE), tone]))
+    tone_only = measure_lufs(write_wav(tmp_path / "tone.wav", tone))
+    # 게이트가 없으면 9초 중 6초만 소리이므로 10*log10(6/9) = -1.76 LU 낮아짐.
+    # 무음은 빠지고 경계에 걸친 블록만 조금 반영되어야 함
+    assert tone_only - 0.3 < measure_lufs(with_silence) <= tone_only
+    assert measure_lufs(write_wav(tmp_path / "silence.wav", np.zeros(RATE))) == float('-inf')
+
+
+def test_normalize_lufs_reaches_target(tmp_path):
+    path = write_wav(tmp_path / "tone.wav", sine(4, 0.05))
+    output, measured, gain_db = normalize(path, str(tmp_path / "out.wav"), method='lufs', target=-16.0)
+    assert measured + gain_db == pytest.approx(-16.0)
+    assert measure_lufs(output) == pytest.approx(-16.0, abs=0.05)
+
+
+def test_normalize_in_place_and_silence(tmp_path):
+    path = write_wav(tmp_path / "tone.wav", sine(1, 0.5))
+    normalize(path, path, method='rms', target=-20.0)
+    assert measure_rms_dbfs(path) == pytest.approx(-20.0, abs=0.01)
+
+    silence = write_wav(tmp_path / "silence.wav", np.zeros(RATE))
+    _, measured, gain_db = normalize(silence, silence)
+    assert measured == float('-inf') and gain_db == 0.0
+
+
+def test_trim_reads_only_the_requested_range_with_fades(tmp_path):
+    data = np.linspace(-1, 1, 2 * RATE)
+    path = write_wav(tmp_path / "ramp.wav", data)
+    out = trim(path, str(tmp_path / "cut.wav"), start_ms=500, duration_ms=1000, fade_in_ms=100, fade_out_ms=100,
+               block_frames=1000)
+
+    cut = read(out)[:, 0]
+    assert len(cut) == RATE
+    fade = int(0.1 * RATE)
+    np.testing.assert_allclose(cut[fade:-fade], data[RATE // 2 + fade:RATE // 2 + RATE - fade], atol=1e-6)
+    assert cut[0] == 0.0
+    assert abs(cut[-1]) < abs(data[RATE // 2 + RATE - 1]) * 0.01
+
+
+def test_trim_past_end_stops_at_end(tmp_path):
+    path = write_wav(tmp_path / "short.wav", np.ones(RATE) * 0.5)
+    assert len(read(trim(path, str(tmp_path / "cut.wav"), start_ms=800, duration_ms=5000))) == int(0.2 * RATE)
+
+
+def test_concat_crossfades_and_keeps_total_length(tmp_path):
+    a = write_wav(tmp_path / "a.wav", np.full(RATE, 0.5))
+    b = write_wav(tmp_path / "b.wav", np.full(RATE, -0.5))
+    c = write_wav(tmp_path / "c.wav", np.full(RATE // 10, 0.25))
+    out = concat([a, b, c], str(tmp_path / "joined.wav"), crossfade_ms=250, block_frames=1000)
+
+    joined = read(out)[:, 0]
+    crossfade = RATE // 4
+    # 세 번째 파일(0.1초)은 크로스페이드보다 짧으므로 겹치는 길이가 파일 길이로 제한됨
+    assert len(joined) == 2 * RATE + RATE // 10 - crossfade - RATE // 10
+    np.testing.assert_allclose(joined[:RATE - crossfade], 0.5)
+    middle = joined[RATE - crossfade:RATE]
+    assert middle[0] == pytest.approx(0.5) and middle[-1] == pytest.approx(-0.5, abs=1e-3)
+    assert np.all(np.diff(middle) <= 1e-6)
+
+
+def test_concat_rejects_mismatched_sample_rates(tmp_path):
+    a = write_wav(tmp_path / "a.wav", np.zeros(RATE))
+    b = write_wav(tmp_path / "b.wav", np.zeros(8000), rate=8000)
+    with pytest.raises(ValueError):
+        concat([a, b], str(tmp_path / "joined.wav"))
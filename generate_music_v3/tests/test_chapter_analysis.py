@@ -0,0 +1,64 @@
+from chapter_analysis import DOC_PREFIX_CHARS, aggregate_chapters, analyze_chapter
+from lexicon import score_categories
+
+
+def record(lexicon, candidates, doc_prefix=""):
+    return {'lexicon': lexicon, 'candidates': candidates, 'doc_prefix': doc_prefix}
+
+
+def test_scores_and_candidate_counts_are_summed_across_chapters():
+    records = [
+        record({'genre': {'romance': 2}, 'mood': {'sad': 1}}, {'rain': 2, 'letter': 1}, "first"),
+        record({'genre': {'romance': 1, 'action': 3}}, {'letter': 3, 'sword': 1}, "second"),
+    ]
+    scores, candidates, doc = aggregate_chapters(records)
+
+    assert scores['genre']['romance'] == 3 and scores['genre']['action'] == 3
+    assert scores['mood']['sad'] == 1
+    # 렉시콘의 모든 항목이 0으로 채워져 있음
+    assert scores['era']['modern'] == 0
+    assert candidates == ['letter', 'rain', 'sword']
+    assert doc == "first second"
+
+
+def test_candidates_limited_to_most_common():
+    records = [record({}, {'a': 5, 'b': 1}), record({}, {'c': 3, 'b': 1})]
+    assert aggregate_chapters(records, max_candidates=2)[1] == ['a', 'c']
+
+
+def test_document_text_is_capped_at_prefix_length():
+    records = [record({}, {}, "x" * (DOC_PREFIX_CHARS - 10)), record({}, {}, "y" * 100), record({}, {}, "z" * 100)]
+    doc = aggregate_chapters(records)[2]
+    assert len(doc) == DOC_PREFIX_CHARS
+    assert doc.startswith("x") and "z" not in doc
+
+
+def test_empty_input():
+    scores, candidates, doc = aggregate_chapters([])
+    assert candidates == [] and doc == ""
+    assert all(value == 0 for categories in scores.values() for value in categories.values())
+
+
+def identity_preprocess(text):
+    return text, []
+
+
+def test_chapter_results_aggregate_to_the_whole_text_and_are_cached():
+    chapters = ["She read his letter in the rain and cried.",
+                "A sword fight broke out at the castle gate."]
+    calls = []
+
+    def preprocess(text):
+        calls.append(text)
+        return identity_preprocess(text)
+
+    records = [analyze_chapter(text, preprocess, config="test") for text in chapters]
+    scores, candidates, _ = aggregate_chapters(records)
+    assert scores == score_categories(" ".join(chapters).lower())
+    assert 'letter' in candidates and 'sword fight' in candidates
+
+    # 새 챕터가 붙어도 이전 챕터는 캐시에서 읽고 새 챕터만 분석
+    calls.clear()
+    records = [analyze_chapter(text, preprocess, config="test") for text in chapters + ["The dragon slept."]]
+    assert calls == ["the dragon slept."]
+    assert len(records) == 3
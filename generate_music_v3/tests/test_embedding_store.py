@@ -0,0 +1,82 @@
+import numpy as np
+
+from embedding_store import EmbeddingStore
+
+
+class CountingEncoder:
+    """텍스트마다 고정된 벡터를 돌려주고 계산한 텍스트를 기록"""
+
+    def __init__(self, dim=4):
+        self.dim = dim
+        self.computed = []
+
+    def vector(self, text):
+        seed = sum(text.encode("utf-8"))
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+
+    def __call__(self, texts):
+        self.computed.extend(texts)
+        return np.stack([self.vector(text) for text in texts])
+
+
+def test_hits_skip_compute_and_preserve_order(tmp_path):
+    encoder = CountingEncoder()
+    store = EmbeddingStore(str(tmp_path / "store"), model_name="m")
+    store.embed(["a", "b"], encoder)
+    encoder.computed.clear()
+
+    vectors = store.embed(["b", "c", "a"], encoder)
+
+    assert encoder.computed == ["c"]
+    for row, text in zip(vectors, ["b", "c", "a"]):
+        np.testing.assert_allclose(row, encoder.vector(text), atol=1e-2)
+    assert store.stats()['hits'] == 2 and store.stats()['misses'] == 3
+
+
+def test_fifo_eviction_replaces_oldest_entries(tmp_path):
+    encoder = CountingEncoder()
+    store = EmbeddingStore(str(tmp_path / "store"), model_name="m", max_entries=3)
+    store.embed(["a", "b", "c"], encoder)
+    # 다시 조회해도 순서는 바뀌지 않음 (LRU가 아니라 FIFO)
+    store.embed(["a"], encoder)
+    store.embed(["d", "e"], encoder)
+
+    assert len(store) == 3
+    assert store.evictions == 2
+    encoder.computed.clear()
+    store.embed(["c", "d", "e"], encoder)
+    assert encoder.computed == []
+    store.embed(["a"], encoder)
+    assert encoder.computed == ["a"]
+
+
+def test_reload_from_disk_serves_hits(tmp_path):
+    directory = str(tmp_path / "store")
+    encoder = CountingEncoder()
+    first = EmbeddingStore(directory, model_name="m", max_entries=3)
+    first.embed(["a", "b", "c", "d"], encoder)
+    expected = first.embed(["b", "c", "d"], encoder)
+
+    encoder.computed.clear()
+    reloaded = EmbeddingStore(directory, model_name="m", max_entries=3)
+    np.testing.assert_array_equal(reloaded.embed(["b", "c", "d"], encoder), expected)
+    assert encoder.computed == []
+    assert len(reloaded) == 3
+
+    # 다시 불러온 뒤에도 FIFO 위치가 이어져서 가장 오래된 b가 밀려남
+    reloaded.embed(["e"], encoder)
+    encoder.computed.clear()
+    reloaded.embed(["b", "c"], encoder)
+    assert encoder.computed == ["b"]
+
+
+def test_store_built_with_another_model_starts_empty(tmp_path):
+    directory = str(tmp_path / "store")
+    encoder = CountingEncoder()
+    EmbeddingStore(directory, model_name="old").embed(["a"], encoder)
+
+    encoder.computed.clear()
+    store = EmbeddingStore(directory, model_name="new")
+    assert len(store) == 0
+    store.embed(["a"], encoder)
+    assert encoder.computed == ["a"]
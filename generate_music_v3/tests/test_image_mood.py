@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from image_mood import FEATURE_NAMES, _calibrate_threshold, fit_mood_model, load_mood_model, save_mood_model
+
+
+def calibrate(confidences, correct, target=0.9):
+    return _calibrate_threshold(np.array(confidences, dtype=np.float32), np.array(correct, dtype=bool), target)
+
+
+def test_all_correct_picks_lowest_confidence():
+    assert calibrate([0.9, 0.5, 0.7], [True, True, True]) == pytest.approx(0.5)
+
+
+def test_stops_before_wrong_low_confidence_answers():
+    assert calibrate([0.9, 0.8, 0.7, 0.6], [True, True, False, False]) == pytest.approx(0.8)
+
+
+def test_picks_lowest_threshold_that_meets_target_even_after_a_dip():
+    # 가장 높은 신뢰도가 틀려도, 더 낮은 임계값에서 9/10이면 목표(0.9)를 만족
+    confidences = [0.95] + [0.9 - 0.05 * i for i in range(9)] + [0.3]
+    correct = [False] + [True] * 9 + [False]
+    assert calibrate(confidences, correct) == pytest.approx(confidences[9])
+
+
+def test_tied_confidences_are_accepted_or_rejected_together():
+    # 0.8인 두 장 중 하나가 틀림: 0.8로 내리면 2/3이므로 0.9에서 멈춰야 함
+    assert calibrate([0.9, 0.8, 0.8], [True, True, False]) == pytest.approx(0.9)
+    assert calibrate([0.9, 0.8, 0.8], [True, False, True]) == pytest.approx(0.9)
+
+
+def test_returns_none_when_target_unreachable_or_no_confidence():
+    assert calibrate([0.9, 0.8], [False, True]) is None
+    # 최대 거리 밖(신뢰도 0)인 이미지는 맞아도 로컬 처리 대상이 아님
+    assert calibrate([0.0, 0.0], [True, True]) is None
+    assert calibrate([], []) is None
+
+
+def features(rng, center):
+    values = {name: float(center + rng.normal(0, 0.02)) for name in FEATURE_NAMES}
+    values['hue_histogram'] = [1.0 / 12] * 12
+    return values
+
+
+def test_fit_on_separable_moods_enables_local_path_and_round_trips(tmp_path):
+    rng = np.random.default_rng(0)
+    samples = [(features(rng, 0.2), 'dark') for _ in range(10)] + [(features(rng, 0.8), 'bright') for _ in range(10)]
+    model = fit_mood_model(samples, holdout_every=5, target_precision=0.9)
+
+    assert model['moods'] == ['bright', 'dark']
+    assert model['threshold'] is not None
+    assert model['validation']['images'] == 4 and model['validation']['train_images'] == 16
+    assert model['validation']['local_precision'] == 1.0
+
+    loaded = load_mood_model(save_mood_model(model, str(tmp_path / "model.json")))
+    assert loaded['threshold'] == pytest.approx(model['threshold'])
+    np.testing.assert_allclose(loaded['centroids'], model['centroids'])
+
+
+def test_fit_requires_enough_images_per_mood():
+    rng = np.random.default_rng(0)
+    with pytest.raises(ValueError):
+        fit_mood_model([(features(rng, 0.5), 'calm') for _ in range(3)], holdout_every=5)
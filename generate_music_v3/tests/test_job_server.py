@@ -0,0 +1,111 @@
+import os
+
+import pytest
+
+from job_server import JOB_UPLOAD_DIR, IdempotencyConflict, JobQueue, JobWorkers, create_job_app
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_queue_replays_same_request_and_rejects_different_one(queue):
+    job, created = queue.submit("key-1", {'type': 'novel', 'input': 'a.txt'})
+    assert created and job['status'] == 'queued'
+
+    replay, created = queue.submit("key-1", {'type': 'novel', 'input': 'a.txt'})
+    assert not created and replay['id'] == job['id']
+
+    with pytest.raises(IdempotencyConflict):
+        queue.submit("key-1", {'type': 'novel', 'input': 'b.txt'})
+    assert queue.counts() == {'queued': 1}
+
+
+def test_queue_uses_pre_generated_job_id_and_claims_oldest_first(queue):
+    first, _ = queue.submit("key-1", {'n': 1}, job_id="job-a")
+    queue.submit("key-2", {'n': 2})
+    assert first['id'] == "job-a"
+
+    claimed = queue.claim()
+    assert claimed['id'] == "job-a" and claimed['status'] == 'running'
+    assert queue.claim()['request'] == {'n': 2}
+    assert queue.claim() is None
+    assert queue.requeue_running() == 2
+
+
+@pytest.fixture
+def client(queue):
+    from fastapi.testclient import TestClient
+    workers = JobWorkers(queue)
+    # lifespan을 실행하지 않으므로 워커 스레드는 시작되지 않음 (제출/조회만 확인)
+    return TestClient(create_job_app(queue, workers)), workers
+
+
+def submit(test_client, key, content=b"chapter one", **fields):
+    data = {'type': 'novel', 'output_format': 'mp3', **fields}
+    return test_client.post("/jobs", headers={'Idempotency-Key': key}, data=data,
+                            files={'files': ('novel.txt', content, 'text/plain')})
+
+
+def upload_dirs():
+    return os.listdir(JOB_UPLOAD_DIR) if os.path.isdir(JOB_UPLOAD_DIR) else []
+
+
+def test_resubmitting_same_upload_returns_existing_job(client):
+    test_client, _ = client
+    first = submit(test_client, "novel-1")
+    assert first.status_code == 202
+
+    replay = submit(test_client, "novel-1")
+    assert replay.status_code == 200
+    assert replay.json()['id'] == first.json()['id']
+    # 재시도 때 올린 파일은 버림
+    assert len(upload_dirs()) == 1
+
+
+def test_same_key_with_different_request_conflicts(client):
+    test_client, _ = client
+    assert submit(test_client, "novel-1").status_code == 202
+    assert submit(test_client, "novel-1", content=b"another novel").status_code == 409
+    assert submit(test_client, "novel-1", output_format='flac').status_code == 409
+    assert len(upload_dirs()) == 1
+
+
+def test_api_key_is_stored_before_the_job_can_be_claimed(client, queue, monkeypatch):
+    test_client, workers = client
+    seen_at_insert = []
+    original_submit = queue.submit
+
+    def submit_and_check(idempotency_key, request, request_digest=None, job_id=None):
+        seen_at_insert.append(workers._api_keys.get(job_id))
+        return original_submit(idempotency_key, request, request_digest, job_id=job_id)
+
+    monkeypatch.setattr(queue, 'submit', submit_and_check)
+    job_id = submit(test_client, "novel-1", api_key="sk-test").json()['id']
+    assert seen_at_insert == ["sk-test"]
+    assert workers._api_keys == {job_id: "sk-test"}
+
+    # 재시도는 새 작업을 만들지 않으므로 미리 넣은 키도 남지 않음
+    submit(test_client, "novel-1", api_key="sk-test")
+    assert workers._api_keys == {job_id: "sk-test"}
+    # 키는 작업 요청에 저장하지 않고, 키를 보냈다는 사실만 기록
+    assert queue.get(job_id)['request']['caller_api_key'] is True
+    assert "sk-test" not in str(queue.get(job_id))
+
+
+def test_api_key_does_not_change_idempotency_comparison(client):
+    test_client, _ = client
+    first = submit(test_client, "novel-1", api_key="sk-test")
+    assert submit(test_client, "novel-1").json()['id'] == first.json()['id']
+
+
+def test_job_claimed_without_its_callers_key_fails_explicitly(queue, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "server-key")
+    job, _ = queue.submit("novel-1", {'type': 'novel', 'input': 'a.txt', 'caller_api_key': True})
+    # 재시작한 서버의 워커에는 키가 없음. 서버 키로 대신 실행하지 않고 실패 처리
+    JobWorkers(queue)._execute(queue.claim())
+
+    job = queue.get(job['id'])
+    assert job['status'] == 'failed'
+    assert "no longer available" in job['error']
@@ -0,0 +1,91 @@
+import sys
+import threading
+import types
+
+import pytest
+from PIL import Image
+
+import ocr_backend
+
+
+class FakeApi:
+    """PyTessBaseAPI 대신 생성/해제만 기록하는 엔진"""
+
+    created = []
+
+    def __init__(self, lang, **options):
+        self.lang = lang
+        self.ended = False
+        FakeApi.created.append(self)
+
+    def SetImageBytes(self, *args):
+        pass
+
+    def GetUTF8Text(self):
+        return f"text:{self.lang}"
+
+    def Clear(self):
+        pass
+
+    def End(self):
+        self.ended = True
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    FakeApi.created = []
+    monkeypatch.setitem(sys.modules, 'tesserocr', types.SimpleNamespace(PyTessBaseAPI=FakeApi))
+    backend = ocr_backend.TesserocrBackend(max_idle=2)
+    yield backend
+    backend.close()
+
+
+IMAGE = Image.new('L', (8, 8), 255)
+
+
+def run_in_new_threads(backend, lang, count):
+    for _ in range(count):
+        thread = threading.Thread(target=backend.image_to_text, args=(IMAGE, lang))
+        thread.start()
+        thread.join()
+
+
+def test_engine_is_reused_across_short_lived_threads(backend):
+    # 에피소드마다 OCR 스레드가 새로 만들어져도 언어 데이터는 한 번만 로드
+    run_in_new_threads(backend, 'kor+eng', 10)
+    assert len(FakeApi.created) == 1
+
+
+def test_engines_are_pooled_per_language(backend):
+    assert backend.image_to_text(IMAGE, 'kor') == "text:kor"
+    assert backend.image_to_text(IMAGE, 'eng') == "text:eng"
+    backend.image_to_text(IMAGE, 'kor')
+    assert [api.lang for api in FakeApi.created] == ['kor', 'eng']
+
+
+def test_concurrent_calls_get_separate_engines_and_extra_idle_ones_are_released(backend):
+    barrier = threading.Barrier(3)
+    original_checkout = backend._checkout
+
+    def checkout_together(lang):
+        api = original_checkout(lang)
+        barrier.wait(timeout=5)
+        return api
+
+    backend._checkout = checkout_together
+    threads = [threading.Thread(target=backend.image_to_text, args=(IMAGE, 'kor')) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(FakeApi.created) == 3
+    assert sum(api.ended for api in FakeApi.created) == 1
+    assert len(backend._idle['kor']) == 2
+
+
+def test_close_releases_idle_engines(backend):
+    backend.image_to_text(IMAGE, 'kor')
+    backend.close()
+    assert all(api.ended for api in FakeApi.created)
+    assert backend._idle == {}
@@ -0,0 +1,57 @@
+import threading
+
+from pipeline_executor import PipelineExecutor
+
+
+def test_items_flow_through_all_stages_and_end_reaches_every_worker():
+    """단계마다 워커 수가 달라도 모든 항목이 끝까지 처리되고 run이 반환되어야 함"""
+    executor = PipelineExecutor([
+        ('double', lambda x: x * 2, 3),
+        ('inc', lambda x: x + 1, 1),
+        ('square', lambda x: x * x, 2),
+    ], queue_size=1)
+
+    completed, failed = executor.run(range(20))
+
+    assert sorted(completed) == sorted((x * 2 + 1) ** 2 for x in range(20))
+    assert failed == []
+    stats = executor.stats()
+    assert [stats[name]['items'] for name in ('double', 'inc', 'square')] == [20, 20, 20]
+
+
+def test_empty_input_terminates():
+    executor = PipelineExecutor([('a', lambda x: x, 2), ('b', lambda x: x, 3)])
+    assert executor.run([]) == ([], [])
+
+
+def test_failed_item_skips_later_stages_and_is_reported():
+    later_stage_items = []
+    lock = threading.Lock()
+
+    def fail_on_three(x):
+        if x == 3:
+            raise ValueError("bad item")
+        return x
+
+    def record(x):
+        with lock:
+            later_stage_items.append(x)
+        return x
+
+    errors = []
+    executor = PipelineExecutor([('check', fail_on_three, 2), ('record', record, 1)])
+    completed, failed = executor.run(range(5), on_error=lambda item, stage, error: errors.append((item, stage)))
+
+    assert sorted(completed) == [0, 1, 2, 4]
+    assert 3 not in later_stage_items
+    assert [(item, stage, type(error)) for item, stage, error in failed] == [(3, 'check', ValueError)]
+    assert errors == [(3, 'check')]
+    assert executor.stats()['check']['errors'] == 1
+    assert executor.stats()['record']['items'] == 4
+
+
+def test_on_complete_called_for_each_result():
+    seen = []
+    executor = PipelineExecutor([('id', lambda x: x, 1)])
+    executor.run(['a', 'b'], on_complete=seen.append)
+    assert sorted(seen) == ['a', 'b']
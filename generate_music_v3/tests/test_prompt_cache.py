@@ -0,0 +1,114 @@
+import os
+
+import numpy as np
+import pytest
+
+import prompt_cache
+from prompt_cache import PromptCache
+
+
+# 프롬프트 → 정규화된 벡터 (비슷한 프롬프트끼리 코사인 유사도가 높도록 직접 지정)
+VECTORS = {
+    "rain piano": [1.0, 0.0, 0.0],
+    "piano rain": [0.99, 0.141, 0.0],
+    "battle drums": [0.0, 1.0, 0.0],
+    "quiet forest": [0.0, 0.0, 1.0],
+}
+
+
+def fake_embed(prompts):
+    vectors = np.array([VECTORS[prompt] for prompt in prompts], dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def track(tmp_path, name):
+    path = tmp_path / name
+    path.write_bytes(b"audio")
+    return str(path)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PromptCache(str(tmp_path / "index"), threshold=0.95, embed=fake_embed)
+
+
+def test_lookup_finds_similar_prompt_above_threshold(cache, tmp_path):
+    cache.add("rain piano", "key1", "mp3", track(tmp_path, "key1.mp3"))
+    cache.add("battle drums", "key2", "mp3", track(tmp_path, "key2.mp3"))
+
+    entry, similarity = cache.lookup("piano rain", "mp3")
+    assert entry['cache_key'] == "key1"
+    assert similarity == pytest.approx(0.99, abs=1e-3)
+
+    entry, similarity = cache.lookup("quiet forest", "mp3")
+    assert entry is None and similarity == pytest.approx(0.0, abs=1e-6)
+    # 호출별 임계값이 기본 임계값보다 우선
+    assert cache.lookup("piano rain", "mp3", threshold=0.999)[0] is None
+
+
+def test_lookup_filters_format_excluded_key_and_missing_files(cache, tmp_path):
+    cache.add("rain piano", "key1", "wav", track(tmp_path, "key1.wav"))
+    assert cache.lookup("piano rain", "mp3") == (None, None)
+    assert cache.lookup("piano rain", "wav", exclude_key="key1") == (None, None)
+
+    os.remove(tmp_path / "key1.wav")
+    assert cache.lookup("piano rain", "wav") == (None, None)
+
+
+def test_add_ignores_duplicates_and_persists(cache, tmp_path):
+    path = track(tmp_path, "key1.mp3")
+    cache.add("rain piano", "key1", "mp3", path)
+    cache.add("rain piano", "key1", "mp3", path)
+    assert len(cache.entries) == 1 and len(cache.index) == 1
+
+    reloaded = PromptCache(cache.index_dir, threshold=0.95, embed=fake_embed)
+    assert reloaded.entries == cache.entries
+    assert reloaded.lookup("piano rain", "mp3")[0]['cache_key'] == "key1"
+
+
+def test_empty_index_returns_nothing(cache):
+    assert cache.lookup("rain piano", "mp3") == (None, None)
+
+
+@pytest.fixture
+def fake_music(monkeypatch, tmp_path):
+    """MusicGen 대신 파일만 쓰는 render_music과 가짜 임베딩 프롬프트 캐시"""
+    import music_generator
+
+    rendered = []
+
+    def render_music(base_prompt, output_path, audio_format=None, **options):
+        rendered.append(base_prompt)
+        with open(output_path, "wb") as f:
+            f.write(b"audio")
+        return output_path
+
+    canonical = {("rain", "piano"): "rain piano", ("piano", "rain"): "piano rain"}
+    monkeypatch.setattr(music_generator, 'render_music', render_music)
+    monkeypatch.setattr(music_generator, 'canonical_prompt', lambda keywords, *args: canonical[tuple(keywords)])
+    monkeypatch.setattr(prompt_cache, '_prompt_cache',
+                        PromptCache(str(tmp_path / "cache" / "music" / "prompt_index"), embed=fake_embed))
+    return music_generator, rendered
+
+
+def test_generated_track_is_indexed_without_similarity_threshold(fake_music, tmp_path):
+    music_generator, rendered = fake_music
+    style = ("romance", "calm", "modern", "piano ballad")
+
+    music_generator.generate_music(["rain", "piano"], *style, str(tmp_path / "out" / "first.mp3"))
+    assert [entry['prompt'] for entry in prompt_cache.get_prompt_cache().entries] == ["rain piano"]
+
+    # 다음 실행은 임계값을 주면 색인된 곡을 재사용
+    music_generator.generate_music(["piano", "rain"], *style, str(tmp_path / "out" / "second.mp3"),
+                                   similarity_threshold=0.95)
+    assert len(rendered) == 1
+
+
+def test_use_cache_false_writes_nothing_to_music_cache(fake_music, tmp_path):
+    music_generator, rendered = fake_music
+    output = music_generator.generate_music(["rain", "piano"], "romance", "calm", "modern", "piano ballad",
+                                            str(tmp_path / "out" / "track.mp3"), use_cache=False)
+    assert os.path.exists(output) and len(rendered) == 1
+    music_dir = tmp_path / "cache" / "music"
+    assert not music_dir.exists() or os.listdir(music_dir) == []
+    assert prompt_cache.get_prompt_cache().entries == []
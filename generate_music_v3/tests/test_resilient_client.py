@@ -0,0 +1,153 @@
+import threading
+
+import pytest
+
+import metrics
+import resilient_client
+from resilient_client import CircuitBreaker, CircuitOpenError, DeadlineExceeded, ResilientClient
+
+
+class FakeClock:
+    """resilient_client.time.monotonic 대신 쓰는 수동 시계"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(resilient_client.time, 'monotonic', fake.monotonic)
+    return fake
+
+
+def counter(name, **labels):
+    for entry in metrics.snapshot()['counters']:
+        if entry['name'] == name and entry['labels'] == {k: str(v) for k, v in labels.items()}:
+            return entry['value']
+    return 0
+
+
+def test_breaker_opens_after_threshold_and_recovers_through_half_open(clock):
+    breaker = CircuitBreaker('api', failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == 'closed' and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+    assert counter('circuit_open_total', api='api') == 1
+
+    clock.advance(29.9)
+    assert not breaker.allow()
+    clock.advance(0.1)
+    assert breaker.allow()
+    assert breaker.state == 'half_open'
+    # 시험 호출이 진행 중이면 다른 호출은 막힘
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.failures == 0 and breaker.allow()
+
+
+def test_failed_half_open_probe_reopens_immediately(clock):
+    breaker = CircuitBreaker('api', failure_threshold=3, reset_timeout=10)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.advance(10)
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+    assert counter('circuit_open_total', api='api') == 2
+
+
+def test_open_circuit_short_circuits_without_calling(clock):
+    client = ResilientClient('api', breaker=CircuitBreaker('api', failure_threshold=1), hedge_quantile=None)
+    client.breaker.record_failure()
+    calls = []
+
+    with pytest.raises(CircuitOpenError):
+        client.call(lambda timeout: calls.append(timeout))
+    assert calls == []
+    assert counter('api_short_circuits_total', api='api') == 1
+
+
+def test_retries_until_success():
+    attempts = []
+
+    def flaky(timeout):
+        attempts.append(timeout)
+        if len(attempts) < 3:
+            raise ConnectionError("reset")
+        return "ok"
+
+    client = ResilientClient('api', max_retries=2, backoff_base=0, hedge_quantile=None)
+    assert client.call(flaky) == "ok"
+    assert len(attempts) == 3
+    assert counter('api_retries_total', api='api') == 2
+    assert client.breaker.state == 'closed'
+
+
+def test_raises_last_error_when_retries_exhausted():
+    client = ResilientClient('api', max_retries=1, backoff_base=0, hedge_quantile=None)
+
+    def broken(timeout):
+        raise ValueError("bad reply")
+
+    with pytest.raises(ValueError):
+        client.call(broken)
+    assert client.breaker.failures == 2
+
+
+def test_slow_attempt_times_out():
+    release = threading.Event()
+    client = ResilientClient('api', call_timeout=0.05, max_retries=0, hedge_quantile=None)
+    try:
+        with pytest.raises(DeadlineExceeded):
+            client.call(lambda timeout: release.wait(5))
+    finally:
+        release.set()
+    assert counter('api_timeouts_total', api='api') == 1
+
+
+def test_hedge_sent_after_latency_quantile_and_first_result_wins():
+    client = ResilientClient('api', call_timeout=5, max_retries=0, hedge_quantile=0.95)
+    for _ in range(resilient_client.HEDGE_MIN_SAMPLES):
+        client.latency.record(0.01)
+
+    release = threading.Event()
+    calls = []
+    lock = threading.Lock()
+
+    def first_slow(timeout):
+        with lock:
+            calls.append(timeout)
+            call_number = len(calls)
+        if call_number == 1:
+            release.wait(timeout)
+            return "slow"
+        return "hedge"
+
+    try:
+        assert client.call(first_slow) == "hedge"
+    finally:
+        release.set()
+    assert len(calls) == 2
+    assert counter('api_hedges_total', api='api') == 1
+
+
+def test_no_hedge_without_enough_latency_samples():
+    client = ResilientClient('api', call_timeout=5, max_retries=0, hedge_quantile=0.95)
+    calls = []
+    assert client.call(lambda timeout: calls.append(timeout) or "ok") == "ok"
+    assert len(calls) == 1
+    assert counter('api_hedges_total', api='api') == 0
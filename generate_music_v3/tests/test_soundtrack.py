@@ -0,0 +1,37 @@
+from soundtrack import group_cues
+
+
+def record(genre=None, mood=None):
+    """analyze_chapter 결과 형식의 챕터 기록 (필요한 렉시콘 점수만 채움)"""
+    return {'lexicon': {'genre': dict(genre or {}), 'mood': dict(mood or {}),
+                        'era': {}, 'music_style': {}}}
+
+
+ROMANCE = record({'romance': 3}, {'romantic': 2})
+ROMANCE_HAPPY = record({'romance': 3}, {'romantic': 2, 'happy': 1})
+ACTION = record({'action': 4}, {'exciting': 3})
+NO_WORDS = record()
+
+
+def test_similar_consecutive_chapters_share_a_cue():
+    assert group_cues([ROMANCE, ROMANCE_HAPPY, ROMANCE]) == [[0, 1, 2]]
+
+
+def test_mood_change_starts_a_new_cue():
+    assert group_cues([ROMANCE, ROMANCE, ACTION, ACTION, ROMANCE]) == [[0, 1], [2, 3], [4]]
+
+
+def test_chapters_without_lexicon_words_join_the_previous_cue():
+    assert group_cues([ROMANCE, None, NO_WORDS, ACTION]) == [[0, 1, 2], [3]]
+
+
+def test_leading_empty_chapters_join_the_first_real_cue():
+    assert group_cues([None, NO_WORDS, ACTION, ACTION, ROMANCE]) == [[0, 1, 2, 3], [4]]
+    assert group_cues([None, NO_WORDS]) == [[0, 1]]
+    assert group_cues([]) == []
+
+
+def test_threshold_controls_how_much_drift_a_cue_absorbs():
+    chapters = [ROMANCE, ROMANCE_HAPPY]
+    assert group_cues(chapters, threshold=0.8) == [[0, 1]]
+    assert group_cues(chapters, threshold=0.999) == [[0], [1]]
@@ -1,14 +1,34 @@
-# Matplotlib 백엔드를 'Agg'로 설정 (GUI 없는 백엔드)
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+# pyplot 전역 상태 대신 Figure 객체와 Agg 캔버스를 직접 사용 (여러 스레드에서 호출 가능)
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 
-import numpy as np
-from PIL import Image
 import os
 import hashlib
-import json
+import shutil
+import threading
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+
+# 백그라운드 시각화 워커 수
+VISUALIZATION_WORKERS = 2
+_visualization_executor = None
+_visualization_lock = threading.Lock()
+
+def _save_figure(fig, paths):
+    """Figure를 Agg 캔버스로 렌더링해 여러 경로에 저장"""
+    canvas = FigureCanvasAgg(fig)
+    for path in paths:
+        canvas.print_figure(path)
+
+def _render_message(text, output_path):
+    """안내 문구만 있는 이미지 생성"""
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    ax.text(0.5, 0.5, text, ha='center', va='center', fontsize=14)
+    ax.axis('off')
+    _save_figure(fig, [output_path])
 
 def visualize_keywords(keywords, output_path='keywords_visualization.png', use_cache=True):
     """
@@ -33,12 +53,14 @@ def visualize_keywords(keywords, output_path='keywords_visualization.png', use_c
         if use_cache and os.path.exists(cache_path):
             try:
                 # 캐시된 이미지 파일 복사
-                img = Image.open(cache_path)
-                img.save(output_path)
+                shutil.copyfile(cache_path, output_path)
                 print(f"Keyword visualization loaded from cache and saved to {output_path}")
+                metrics.increment('cache_hits_total', cache='visualization')
                 return output_path
             except Exception as e:
                 print(f"Error loading visualization cache: {e}")
+        if use_cache:
+            metrics.increment('cache_misses_total', cache='visualization')
         
         # 키워드 빈도 계산
         keyword_counts = {}
@@ -54,30 +76,25 @@ def visualize_keywords(keywords, output_path='keywords_visualization.png', use_c
         if not top_keywords:
             print("No keywords to visualize")
             # 빈 이미지 생성
-            plt.figure(figsize=(10, 6))
-            plt.text(0.5, 0.5, "No keywords available", ha='center', va='center', fontsize=14)
-            plt.axis('off')
-            plt.savefig(output_path)
-            plt.close()
+            _render_message("No keywords available", output_path)
             return output_path
         
         # 시각화
-        plt.figure(figsize=(10, 6))
-        plt.bar([kw for kw, _ in top_keywords], [count for _, count in top_keywords])
-        plt.xlabel('Keywords')
-        plt.ylabel('Frequency')
-        plt.title('Top Keywords')
-        plt.xticks(rotation=45, ha='right')
-        plt.tight_layout()
-        
-        # 이미지 저장
-        plt.savefig(output_path)
-        
-        # 캐시에 저장
-        if use_cache:
-            plt.savefig(cache_path)
-        
-        plt.close()
+        render_start = time.perf_counter()
+        fig = Figure(figsize=(10, 6))
+        ax = fig.add_subplot()
+        ax.bar([kw for kw, _ in top_keywords], [count for _, count in top_keywords])
+        ax.set_xlabel('Keywords')
+        ax.set_ylabel('Frequency')
+        ax.set_title('Top Keywords')
+        ax.tick_params(axis='x', labelrotation=45)
+        for label in ax.get_xticklabels():
+            label.set_horizontalalignment('right')
+        fig.tight_layout()
+        
+        # 이미지 저장 (캐시에도 저장)
+        _save_figure(fig, [output_path, cache_path] if use_cache else [output_path])
+        metrics.observe('stage_seconds', time.perf_counter() - render_start, stage='visualize_render')
         
         print(f"Keyword visualization saved to {output_path}")
         return output_path
@@ -88,16 +105,47 @@ def visualize_keywords(keywords, output_path='keywords_visualization.png', use_c
         
         # 오류 발생 시 빈 이미지 생성
         try:
-            plt.figure(figsize=(10, 6))
-            plt.text(0.5, 0.5, f"Visualization error: {str(e)}", ha='center', va='center', fontsize=14)
-            plt.axis('off')
-            plt.savefig(output_path)
-            plt.close()
+            _render_message(f"Visualization error: {str(e)}", output_path)
         except:
             pass
         
         return output_path
 
+def _timed_visualize(keywords, output_path, use_cache):
+    start = time.perf_counter()
+    visualize_keywords(keywords, output_path=output_path, use_cache=use_cache)
+    return time.perf_counter() - start
+
+def submit_visualization(keywords, output_path='keywords_visualization.png', use_cache=True):
+    """
+    키워드 시각화를 백그라운드 워커에 맡기고 바로 반환합니다.
+
+    Returns:
+        concurrent.futures.Future: 결과는 렌더링에 걸린 시간(초)
+    """
+    global _visualization_executor
+    with _visualization_lock:
+        if _visualization_executor is None:
+            _visualization_executor = ThreadPoolExecutor(max_workers=VISUALIZATION_WORKERS,
+                                                         thread_name_prefix="visualize")
+    return _visualization_executor.submit(_timed_visualize, list(keywords), output_path, use_cache)
+
+def wait_for_visualization(future, timeout=None):
+    """
+    백그라운드 시각화가 끝날 때까지 기다리고, 응답 경로에서 빠진 시간을 기록합니다.
+
+    Returns:
+        dict: render_seconds(렌더링 시간), wait_seconds(기다린 시간), saved_seconds(줄어든 지연 시간)
+    """
+    wait_start = time.perf_counter()
+    render_seconds = future.result(timeout=timeout)
+    wait_seconds = time.perf_counter() - wait_start
+    saved_seconds = max(0.0, render_seconds - wait_seconds)
+
+    metrics.observe('stage_seconds', wait_seconds, stage='visualize_wait')
+    metrics.increment('latency_saved_seconds_total', saved_seconds, stage='visualize')
+    return {'render_seconds': render_seconds, 'wait_seconds': wait_seconds, 'saved_seconds': saved_seconds}
+
 def save_webtoon_images(images, output_dir='webtoon_images'):
     """
     웹툰 이미지를 저장합니다.
@@ -126,7 +174,7 @@ def save_webtoon_images(images, output_dir='webtoon_images'):
 
 def combine_audio_files(audio_files, output_path, crossfade_duration=1000):
     """
-    여러 오디오 파일을 하나로 합칩니다.
+    여러 오디오 파일을 하나로 합칩니다 (블록 단위로 읽고 써서 전체를 메모리에 올리지 않음).
     
     Args:
         audio_files (list): 오디오 파일 경로 리스트
@@ -140,18 +188,10 @@ def combine_audio_files(audio_files, output_path, crossfade_duration=1000):
         if not audio_files:
             return None
         
-        from pydub import AudioSegment
-        
-        # 첫 번째 오디오 파일 로드
-        combined = AudioSegment.from_file(audio_files[0])
-        
-        # 나머지 오디오 파일 추가
-        for audio_file in audio_files[1:]:
-            next_segment = AudioSegment.from_file(audio_file)
-            combined = combined.append(next_segment, crossfade=crossfade_duration)
+        from audio_engine import concat
         
-        # 결과 저장
-        combined.export(output_path, format="wav")
+        with metrics.timer('combine_audio'):
+            concat(audio_files, output_path, crossfade_ms=crossfade_duration)
         
         return output_path
     except Exception as e:
@@ -159,35 +199,31 @@ def combine_audio_files(audio_files, output_path, crossfade_duration=1000):
         traceback.print_exc()
         return None
 
-def normalize_audio(input_path, output_path=None, target_dBFS=-20.0):
+def normalize_audio(input_path, output_path=None, target_dBFS=-20.0, method='rms', target_lufs=-16.0):
     """
     오디오 파일의 볼륨을 정규화합니다.
+    1차로 파일 전체의 레벨을 블록 단위로 측정하고, 2차로 게인을 적용하며 다시 씁니다.
     
     Args:
         input_path (str): 입력 오디오 파일 경로
         output_path (str): 출력 오디오 파일 경로 (None이면 입력 파일 덮어쓰기)
-        target_dBFS (float): 목표 dBFS 값
+        target_dBFS (float): 목표 dBFS 값 (method='rms')
+        method (str): 'rms' 또는 'lufs' (BS.1770 통합 라우드니스)
+        target_lufs (float): 목표 LUFS 값 (method='lufs')
     
     Returns:
         str: 정규화된 오디오 파일 경로
     """
     try:
-        from pydub import AudioSegment
+        from audio_engine import normalize
         
         if output_path is None:
             output_path = input_path
         
-        # 오디오 로드
-        sound = AudioSegment.from_file(input_path)
-        
-        # 현재 dBFS 계산
-        change_in_dBFS = target_dBFS - sound.dBFS
-        
-        # 볼륨 조정
-        normalized_sound = sound.apply_gain(change_in_dBFS)
-        
-        # 결과 저장
-        normalized_sound.export(output_path, format="wav")
+        target = target_lufs if method == 'lufs' else target_dBFS
+        with metrics.timer('normalize_audio', method=method):
+            _, measured, gain_db = normalize(input_path, output_path, method=method, target=target)
+        print(f"Normalized {input_path}: {measured:.1f} -> {target:.1f} ({method}, {gain_db:+.1f} dB)")
         
         return output_path
     except Exception as e:
@@ -195,39 +231,30 @@ def normalize_audio(input_path, output_path=None, target_dBFS=-20.0):
         traceback.print_exc()
         return input_path
 
-def create_audio_preview(input_path, output_path=None, duration=30000):
+def create_audio_preview(input_path, output_path=None, duration=30000, start=0, fade_in=0, fade_out=2000):
     """
-    오디오 파일의 미리듣기 버전을 생성합니다.
+    오디오 파일의 미리듣기 버전을 생성합니다. 미리듣기 구간의 프레임만 읽습니다.
     
     Args:
         input_path (str): 입력 오디오 파일 경로
         output_path (str): 출력 오디오 파일 경로 (None이면 자동 생성)
-        duration (int): 미리듣기 길이(ms)
+        duration (int): 미리듣기 길이(ms, 원본보다 길면 원본 길이)
+        start (int): 미리듣기 시작 위치(ms)
+        fade_in (int): 페이드 인 길이(ms)
+        fade_out (int): 페이드 아웃 길이(ms)
     
     Returns:
         str: 미리듣기 오디오 파일 경로
     """
     try:
-        from pydub import AudioSegment
+        from audio_engine import trim
         
         if output_path is None:
-            output_path = input_path.replace('.wav', '_preview.wav')
-        
-        # 오디오 로드
-        sound = AudioSegment.from_file(input_path)
-        
-        # 미리듣기 길이가 원본보다 길면 원본 길이로 조정
-        if len(sound) < duration:
-            duration = len(sound)
-        
-        # 미리듣기 생성 (시작 부분부터)
-        preview = sound[:duration]
-        
-        # 페이드 아웃 효과 추가
-        preview = preview.fade_out(2000)
+            root, ext = os.path.splitext(input_path)
+            output_path = f"{root}_preview{ext}"
         
-        # 결과 저장
-        preview.export(output_path, format="wav")
+        with metrics.timer('audio_preview'):
+            trim(input_path, output_path, start_ms=start, duration_ms=duration, fade_in_ms=fade_in, fade_out_ms=fade_out)
         
         return output_path
     except Exception as e:
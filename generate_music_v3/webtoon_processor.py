@@ -3,16 +3,18 @@ from bs4 import BeautifulSoup
 from PIL import Image
 from io import BytesIO
 import os
-import pytesseract
 import hashlib
 import json
 import time
 import random
 import traceback
 import re
-
-# Tesseract OCR 경로 설정 (Windows 기준)
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+import threading
+import queue
+import metrics
+from memory_profiling import RssSampler
+from artifact_store import get_artifact_store
+from ocr_backend import image_to_text
 
 def convert_to_rgb(image):
     """RGBA 이미지를 RGB로 변환"""
@@ -27,25 +29,302 @@ def save_image(image, path):
     image = convert_to_rgb(image)
     image.save(path, 'JPEG')
 
-def preprocess_for_ocr(image):
+# OCR 설정 (전처리 임계값과 언어가 바뀌면 OCR 캐시 키도 바뀜)
+OCR_THRESHOLD = 150
+OCR_LANG = 'kor+eng'
+
+# 원본 이미지의 내용 해시를 보관하는 Image.info 키
+CONTENT_HASH_KEY = 'content_hash'
+
+def preprocess_for_ocr(image, threshold=OCR_THRESHOLD):
     """OCR 전처리를 위해 이미지를 이진화"""
     gray_image = image.convert('L')
-    threshold = 150
     return gray_image.point(lambda x: 0 if x < threshold else 255, '1')
 
+def group_content_hash(content_hashes):
+    """
+    그룹에 들어간 원본 이미지 해시(순서대로)로 그룹 내용 해시를 만듭니다.
+    그룹 이미지는 원본을 순서대로 이어 붙인 것이므로 같은 원본, 같은 순서면 같은 그룹입니다.
+
+    Returns:
+        str: 그룹 내용 해시 (원본 해시를 모르는 이미지가 있으면 None)
+    """
+    if not content_hashes or not all(content_hashes):
+        return None
+    return hashlib.md5("\n".join(content_hashes).encode()).hexdigest()
+
+def _ocr_cache_path(content_hash, threshold=OCR_THRESHOLD, lang=OCR_LANG):
+    """그룹 내용 해시와 전처리 설정으로 OCR 캐시 파일 경로를 만든다"""
+    config_hash = hashlib.md5(f"{threshold}-{lang}".encode()).hexdigest()[:8]
+    return os.path.join("cache", "ocr", f"{content_hash}_{config_hash}.json")
+
+def load_cached_ocr(content_hash, threshold=OCR_THRESHOLD, lang=OCR_LANG):
+    """
+    캐시된 그룹 OCR 텍스트를 불러옵니다.
+
+    Returns:
+        str: 캐시된 텍스트 (캐시가 없으면 None)
+    """
+    cache_path = _ocr_cache_path(content_hash, threshold, lang)
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("text")
+    except Exception as e:
+        print(f"Error loading OCR cache: {e}")
+        return None
+
+def save_cached_ocr(content_hash, text, threshold=OCR_THRESHOLD, lang=OCR_LANG):
+    """그룹 OCR 텍스트를 캐시에 저장"""
+    cache_path = _ocr_cache_path(content_hash, threshold, lang)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, "w", encoding="utf-8") as f:
+            json.dump({"text": text, "threshold": threshold, "lang": lang}, f, ensure_ascii=False)
+    except Exception as e:
+        print(f"Error saving OCR cache: {e}")
+
+def ocr_image(image, content_hash=None, use_cache=True):
+    """
+    이미지 한 장을 OCR 처리합니다. 내용 해시가 있으면 캐시를 먼저 확인합니다.
+
+    Args:
+        image (PIL.Image): 그룹 이미지
+        content_hash (str): 그룹 내용 해시 (group_content_hash)
+        use_cache (bool): 캐시 사용 여부
+
+    Returns:
+        str: 추출된 텍스트
+    """
+    if use_cache and content_hash:
+        cached_text = load_cached_ocr(content_hash)
+        if cached_text is not None:
+            metrics.increment('cache_hits_total', cache='ocr')
+            return cached_text
+        metrics.increment('cache_misses_total', cache='ocr')
+
+    with metrics.timer('ocr'):
+        binary_image = preprocess_for_ocr(image)
+        text = image_to_text(binary_image, OCR_LANG)
+
+    if use_cache and content_hash:
+        save_cached_ocr(content_hash, text)
+    return text
+
 def create_group_image(images):
-    """이미지 그룹을 하나의 이미지로 합치기"""
+    """이미지 그룹을 하나의 이미지로 합치기 (원본 이미지는 닫지 않음)"""
     combined_height = sum(img.height for img in images)
     max_width = max(img.width for img in images)
     group_image = Image.new('RGB', (max_width, combined_height))
     y_offset = 0
     for img in images:
-        img = convert_to_rgb(img)
-        group_image.paste(img, ((max_width - img.width) // 2, y_offset))
-        y_offset += img.height
+        width, height = img.size
+        rgb_image = convert_to_rgb(img)
+        group_image.paste(rgb_image, ((max_width - width) // 2, y_offset))
+        y_offset += height
+        del rgb_image
     return group_image
 
-def extract_webtoon_content(input_data, use_cache=True, output_dir=None, group_size=5):
+# 그룹 이미지 캔버스의 최대 높이 (픽셀). JPEG 저장 한계(65500px)보다 충분히 작게 설정
+MAX_GROUP_HEIGHT = 30000
+
+def _iter_groups(image_iter, group_size, max_height=MAX_GROUP_HEIGHT):
+    """
+    이미지를 group_size개씩 묶되, 합친 높이가 max_height를 넘으면 그룹을 나눕니다.
+    한 장만으로 max_height를 넘는 이미지는 단독 그룹이 됩니다.
+    """
+    group = []
+    group_height = 0
+    for image in image_iter:
+        if group and (len(group) == group_size or group_height + image.height > max_height):
+            yield group
+            group = []
+            group_height = 0
+        if image.height > max_height:
+            print(f"Image taller than max group height ({image.height}px > {max_height}px), using it as a single group")
+        group.append(image)
+        group_height += image.height
+    if group:
+        yield group
+
+def _file_md5(path):
+    """파일 내용의 MD5 해시 (조각 단위로 읽음)"""
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+def _iter_file_images(image_paths):
+    """이미지 파일을 필요한 시점에 하나씩 연다 (헤더만 읽고 픽셀은 붙여 넣을 때 디코딩)"""
+    for image_path in image_paths:
+        try:
+            img = Image.open(image_path)
+            img.info[CONTENT_HASH_KEY] = _file_md5(image_path)
+            print(f"Loaded image: {image_path}")
+            yield img
+        except Exception as e:
+            print(f"Error loading image {image_path}: {e}")
+
+# 파이프라인 단계 사이 큐 크기 (느린 단계가 있으면 앞 단계가 대기하도록 하는 백프레셔)
+PIPELINE_QUEUE_SIZE = 2
+
+# 파이프라인 종료 신호
+_PIPELINE_END = object()
+
+def _iter_url_images(img_urls, headers):
+    """이미지 URL을 순서대로 다운로드하면서 하나씩 반환"""
+    for img_url in img_urls:
+        try:
+            with metrics.timer('image_download'):
+                img_data = requests.get(img_url, headers=headers).content
+            metrics.increment('bytes_downloaded_total', len(img_data), source='webtoon_image')
+            img = Image.open(BytesIO(img_data))
+            img.info[CONTENT_HASH_KEY] = hashlib.md5(img_data).hexdigest()
+            yield img
+        except Exception as e:
+            print(f"Error downloading image {img_url}: {e}")
+
+def _pipeline_stage(func, in_queue, out_queues):
+    """입력 큐의 항목을 처리해 다음 단계 큐로 전달 (종료 신호를 받을 때까지)"""
+    while True:
+        item = in_queue.get()
+        if item is _PIPELINE_END:
+            break
+        try:
+            result = func(item)
+        except Exception as e:
+            print(f"Pipeline stage error: {e}")
+            traceback.print_exc()
+            result = None
+        if result is not None:
+            for out_queue in out_queues:
+                out_queue.put(result)
+    for out_queue in out_queues:
+        out_queue.put(_PIPELINE_END)
+
+def run_group_pipeline(image_iter, output_dir, group_size=5, api_key=None, queue_size=PIPELINE_QUEUE_SIZE,
+                       max_group_height=MAX_GROUP_HEIGHT, use_cache=True, local_threshold=None):
+    """
+    이미지 수신 → 그룹 이미지 생성 → OCR/이미지 분석을 단계별 스레드로 겹쳐 실행합니다.
+    group_size개의 이미지가 도착하는 즉시 해당 그룹을 만들고, 다음 이미지를 받는 동안
+    OCR과 이미지 분석을 진행합니다. 단계 사이에는 크기가 제한된 큐를 둡니다.
+    원본 이미지는 그룹 이미지 생성 단계에서 붙여 넣은 직후 닫히므로 메모리에는 큐에 있는 그룹만 남습니다.
+    OCR은 그룹 이미지 전체에 한 번 수행되어 (이미지 경계에 걸친 말풍선도 한 번에 읽음) 그룹 내용 해시로 캐시됩니다.
+
+    Args:
+        image_iter (iterable): 이미지를 순서대로 반환하는 이터러블 (다운로드 제너레이터 등)
+        output_dir (str): 그룹 이미지를 저장할 디렉토리
+        group_size (int): 그룹당 이미지 개수
+        api_key (str): OpenAI API 키 (있으면 그룹 이미지 분석도 함께 실행)
+        queue_size (int): 단계 사이 큐의 최대 크기
+        max_group_height (int): 그룹 이미지 캔버스의 최대 높이 (넘으면 그룹을 나눔)
+        use_cache (bool): 그룹 OCR 캐시 사용 여부
+        local_threshold (float): 그룹 이미지 분석에 로컬 분위기 분류기를 쓸 최소 신뢰도 (None이면 사용 안 함)
+
+    Returns:
+        tuple: (그룹 이미지 경로 리스트, OCR 텍스트 리스트, 그룹별 원본 이미지 해시 리스트)
+    """
+    group_queue = queue.Queue(maxsize=queue_size)
+    ocr_queue = queue.Queue(maxsize=queue_size)
+    analysis_queue = queue.Queue(maxsize=queue_size) if api_key else None
+
+    group_paths = {}
+    group_texts = {}
+    group_hashes = {}
+
+    def compose(item):
+        group_idx, group = item
+        group_hashes[group_idx] = [img.info.get(CONTENT_HASH_KEY) for img in group]
+
+        try:
+            with metrics.timer('group_compose'):
+                group_image = create_group_image(group)
+                group_path = os.path.join(output_dir, f"group_image_{group_idx}.jpg")
+                save_image(group_image, group_path)
+        finally:
+            # 지연 로딩으로 연 원본 이미지는 이 단계가 소유하므로 붙여 넣은 직후 닫아서 메모리 해제
+            for img in group:
+                img.close()
+        group_paths[group_idx] = group_path
+        return group_idx, group_path, group_image
+
+    def ocr(item):
+        group_idx, _, group_image = item
+        try:
+            group_text = ocr_image(group_image, group_content_hash(group_hashes[group_idx]), use_cache=use_cache)
+            if group_text.strip():
+                group_texts[group_idx] = group_text
+                print(f"Extracted text from group {group_idx}: {group_text[:100]}...")
+        except Exception as ocr_error:
+            print(f"OCR error for group {group_idx}: {ocr_error}")
+
+    # 이미지 분석은 IMAGE_BATCH_SIZE개의 그룹이 모이면 한 번의 요청으로 보냄
+    pending_analysis = []
+
+    def flush_analysis():
+        from keyword_extractor import analyze_images_batch
+        batch = pending_analysis[:]
+        del pending_analysis[:]
+        # 결과는 이미지 분석 캐시에 저장되므로 이후 키워드 추출 단계에서 재사용됩니다
+        for (group_idx, _), group_keywords in zip(batch, analyze_images_batch([path for _, path in batch], api_key,
+                                                                                         local_threshold=local_threshold)):
+            print(f"Keywords from group {group_idx} analysis: {group_keywords}")
+
+    def analyze(item):
+        from keyword_extractor import IMAGE_BATCH_SIZE
+        pending_analysis.append(item[:2])
+        if len(pending_analysis) >= IMAGE_BATCH_SIZE:
+            flush_analysis()
+
+    compose_targets = [ocr_queue] + ([analysis_queue] if analysis_queue else [])
+    workers = [
+        threading.Thread(target=_pipeline_stage, args=(compose, group_queue, compose_targets), daemon=True),
+        threading.Thread(target=_pipeline_stage, args=(ocr, ocr_queue, []), daemon=True)
+    ]
+    if analysis_queue:
+        workers.append(threading.Thread(target=_pipeline_stage, args=(analyze, analysis_queue, []), daemon=True))
+    for worker in workers:
+        worker.start()
+
+    # 이미지를 받는 대로 그룹을 만들어 다음 단계로 전달
+    image_count = 0
+    total_height = 0
+    decoded_bytes = 0
+    # 프로세스 전체 최댓값(ru_maxrss)은 배치/작업 서버에서 이전 에피소드 값이 남으므로 이 에피소드 구간만 측정
+    with RssSampler() as rss_sampler:
+        rss_start = rss_sampler.peak
+        try:
+            for group_idx, group in enumerate(_iter_groups(image_iter, group_size, max_group_height), 1):
+                image_count += len(group)
+                total_height += sum(img.height for img in group)
+                decoded_bytes += sum(img.width * img.height * 3 for img in group)
+                group_queue.put((group_idx, group))
+                del group
+        finally:
+            group_queue.put(_PIPELINE_END)
+            for worker in workers:
+                worker.join()
+            if pending_analysis:
+                try:
+                    flush_analysis()
+                except Exception as e:
+                    print(f"Pipeline stage error: {e}")
+
+    # 에피소드 크기 대비 최대 메모리 사용량 보고
+    if rss_start is not None:
+        print(f"Episode: {image_count} images, {total_height}px tall, "
+              f"{decoded_bytes / (1024 * 1024):.1f} MB decoded RGB; "
+              f"peak RSS: {rss_sampler.peak:.1f} MB (+{rss_sampler.peak - rss_start:.1f} MB during episode)")
+
+    group_image_paths = [group_paths[idx] for idx in sorted(group_paths)]
+    texts = [group_texts[idx] for idx in sorted(group_texts)]
+    image_hashes = [group_hashes[idx] for idx in sorted(group_paths)]
+    return group_image_paths, texts, image_hashes
+
+def extract_webtoon_content(input_data, use_cache=True, output_dir=None, group_size=5, api_key=None,
+                            local_threshold=None):
     """
     웹툰 콘텐츠를 URL 또는 이미지 파일 리스트로부터 추출합니다.
     
@@ -54,6 +333,8 @@ def extract_webtoon_content(input_data, use_cache=True, output_dir=None, group_s
         use_cache (bool): 캐시 사용 여부
         output_dir (str): 출력 디렉토리
         group_size (int): 그룹당 이미지 개수
+        api_key (str): OpenAI API 키 (있으면 OCR과 함께 그룹 이미지 분석을 실행)
+        local_threshold (float): 그룹 이미지 분석에 로컬 분위기 분류기를 쓸 최소 신뢰도 (None이면 사용 안 함)
 
     Returns:
         dict: 추출된 콘텐츠 (텍스트, 이미지 경로)
@@ -61,51 +342,29 @@ def extract_webtoon_content(input_data, use_cache=True, output_dir=None, group_s
     # URL인지 이미지 파일 리스트인지 확인
     if isinstance(input_data, list):
         print("Processing webtoon from image files...")
-        return extract_from_images(input_data, output_dir, group_size)
+        return extract_from_images(input_data, output_dir, group_size, api_key, use_cache, local_threshold)
     else:
         print(f"Processing webtoon from URL: {input_data}")
-        return extract_from_url(input_data, use_cache, output_dir, group_size)
+        return extract_from_url(input_data, use_cache, output_dir, group_size, api_key, local_threshold)
 
-def extract_from_images(image_paths, output_dir, group_size):
+def extract_from_images(image_paths, output_dir, group_size, api_key=None, use_cache=True, local_threshold=None):
     """
     이미지 파일 리스트에서 웹툰 콘텐츠를 추출합니다.
+    이미지는 그룹을 만들 때 하나씩 열리고 붙여 넣은 직후 닫힙니다.
+    OCR 결과는 그룹 내용 해시(원본 이미지 해시와 순서)별로 캐시되므로 같은 이미지를 같은 그룹으로
+    다시 처리하면 Tesseract를 다시 실행하지 않습니다.
     """
-    texts = []
-    group_image_paths = []
-
     try:
-        # 이미지 파일 로드
-        images = []
-        for image_path in image_paths:
-            try:
-                img = Image.open(image_path)
-                images.append(img)
-                print(f"Loaded image: {image_path}")
-            except Exception as e:
-                print(f"Error loading image {image_path}: {e}")
-
-        # 이미지 그룹화 및 OCR 처리
-        for i in range(0, len(images), group_size):
-            group = images[i:i + group_size]
-            group_image = create_group_image(group)
-            group_idx = i // group_size + 1
-            group_path = os.path.join(output_dir, f"group_image_{group_idx}.jpg")
-            save_image(group_image, group_path)
-            group_image_paths.append(group_path)
-
-            try:
-                binary_group = preprocess_for_ocr(group_image)
-                group_text = pytesseract.image_to_string(binary_group, lang='kor+eng')
-                if group_text.strip():
-                    texts.append(group_text)
-                    print(f"Extracted text from group {group_idx}: {group_text[:100]}...")
-            except Exception as ocr_error:
-                print(f"OCR error for group {group_idx}: {ocr_error}")
+        group_image_paths, texts, image_hashes = run_group_pipeline(
+            _iter_file_images(image_paths), output_dir, group_size, api_key=api_key, use_cache=use_cache,
+            local_threshold=local_threshold
+        )
 
         return {
             'title': "Uploaded Images",
             'author': "Unknown",
             'group_image_paths': group_image_paths,
+            'image_hashes': image_hashes,
             'texts': texts
         }
 
@@ -119,75 +378,138 @@ def extract_from_images(image_paths, output_dir, group_size):
             'texts': []
         }
 
-def extract_from_url(url, use_cache=True, output_dir=None, group_size=5):
+def _url_ref_name(url):
+    """URL별 결과를 가리키는 아티팩트 저장소 레퍼런스 이름"""
+    return f"webtoon_url/{hashlib.md5(url.encode()).hexdigest()}"
+
+def store_url_result(store, result):
+    """
+    그룹 이미지, 그룹 OCR 텍스트, 그룹 이미지 분석 결과를 아티팩트 저장소에 넣습니다.
+
+    Returns:
+        dict: 파일 경로 대신 아티팩트 해시로 결과를 가리키는 메타데이터
+    """
+    from keyword_extractor import image_analysis_cache_path, load_cached_image_analysis
+    groups = []
+    for group_path, content_hashes in zip(result['group_image_paths'], result['image_hashes']):
+        group = {'image': store.put_file(group_path), 'ocr': {}, 'analysis': None}
+        ocr_hash = group_content_hash(content_hashes)
+        text = load_cached_ocr(ocr_hash) if ocr_hash else None
+        if text is not None:
+            group['ocr'][ocr_hash] = store.put_json({"text": text, "threshold": OCR_THRESHOLD, "lang": OCR_LANG})
+        # Vision 분석 결과만 저장 (예전 로컬 분류기 결과는 제외)
+        group_hash = _file_md5(group_path)
+        if load_cached_image_analysis(group_hash) is not None:
+            group['analysis'] = store.put_file(image_analysis_cache_path(group_hash))
+        groups.append(group)
+    return {
+        'title': result['title'],
+        'author': result['author'],
+        'texts': result['texts'],
+        'image_hashes': result['image_hashes'],
+        'groups': groups
+    }
+
+def materialize_url_result(store, metadata, output_dir=None):
+    """
+    아티팩트 해시로 된 메타데이터에서 결과를 복원합니다.
+    그룹 이미지는 output_dir로 복사하고 (없으면 저장소 파일을 그대로 사용),
+    그룹 OCR과 이미지 분석 결과는 로컬 캐시에 다시 채워 이후 단계에서 재사용되게 합니다.
+
+    Returns:
+        dict: extract_from_url과 같은 형식의 결과 (필요한 아티팩트가 없으면 None)
+    """
+    from keyword_extractor import image_analysis_cache_path
+    groups = metadata.get('groups', [])
+    if not all(store.has(group['image']) for group in groups):
+        return None
+
+    group_image_paths = []
+    for group_idx, group in enumerate(groups, 1):
+        if output_dir:
+            group_path = store.materialize(group['image'], os.path.join(output_dir, f"group_image_{group_idx}.jpg"))
+        else:
+            group_path = store.path(group['image'])
+        group_image_paths.append(group_path)
+
+        for content_hash, digest in group['ocr'].items():
+            if load_cached_ocr(content_hash) is None and store.has(digest):
+                ocr = store.get_json(digest)
+                if ocr.get("threshold") == OCR_THRESHOLD and ocr.get("lang") == OCR_LANG:
+                    save_cached_ocr(content_hash, ocr["text"])
+
+        if group.get('analysis') and store.has(group['analysis']):
+            analysis_path = image_analysis_cache_path(_file_md5(group_path))
+            if not os.path.exists(analysis_path):
+                store.materialize(group['analysis'], analysis_path)
+
+    return {
+        'title': metadata['title'],
+        'author': metadata['author'],
+        'group_image_paths': group_image_paths,
+        'image_hashes': metadata['image_hashes'],
+        'texts': metadata['texts']
+    }
+
+def extract_from_url(url, use_cache=True, output_dir=None, group_size=5, api_key=None, local_threshold=None):
     """
     웹툰 URL에서 이미지와 텍스트를 추출합니다.
+    이미지 다운로드, 그룹 이미지 생성, OCR은 run_group_pipeline으로 겹쳐서 실행됩니다.
+    결과는 아티팩트 저장소에 내용 해시로 저장되므로, 캐시 적중 시 이전 실행의 출력 폴더가
+    지워졌거나 다른 호스트에서 만든 결과라도 그대로 복원됩니다.
     """
-    cache_dir = os.path.join("cache", hashlib.md5(url.encode()).hexdigest())
+    store = get_artifact_store()
+    ref_name = _url_ref_name(url)
 
     # 캐시 사용 여부 확인
-    if use_cache and os.path.exists(os.path.join(cache_dir, "metadata.json")):
+    if use_cache:
         try:
-            with open(os.path.join(cache_dir, "metadata.json"), "r", encoding="utf-8") as f:
-                cached_data = json.load(f)
+            metadata = store.get_ref(ref_name)
+            cached_data = materialize_url_result(store, metadata, output_dir) if metadata else None
+            if cached_data is not None:
                 print(f"Using cached content for: {url}")
+                metrics.increment('cache_hits_total', cache='webtoon_url')
                 return cached_data
         except Exception as e:
             print(f"Cache loading error: {e}")
+    if use_cache:
+        metrics.increment('cache_misses_total', cache='webtoon_url')
 
     headers = {'User-Agent': 'Mozilla/5.0'}
-    texts = []
-    group_image_paths = []
 
     try:
         response = requests.get(url, headers=headers)
         response.raise_for_status()
         soup = BeautifulSoup(response.content, 'html.parser')
 
-        # 웹툰 이미지 추출
-        img_tags = soup.find_all('img')
-        valid_images = []
-
-        for img_tag in img_tags:
+        # 웹툰 이미지 URL 추출
+        img_urls = []
+        for img_tag in soup.find_all('img'):
             img_url = img_tag.get('src')
             if img_url and img_url.endswith(('jpg', 'jpeg', 'png')):
-                try:
-                    img_data = requests.get(img_url, headers=headers).content
-                    image = Image.open(BytesIO(img_data))
-                    valid_images.append(image)
-                except Exception as e:
-                    print(f"Error downloading image {img_url}: {e}")
-
-        # 이미지 그룹화 및 OCR 처리
-        for i in range(0, len(valid_images), group_size):
-            group = valid_images[i:i + group_size]
-            group_image = create_group_image(group)
-            group_idx = i // group_size + 1
-            group_path = os.path.join(output_dir, f"group_image_{group_idx}.jpg")
-            save_image(group_image, group_path)
-            group_image_paths.append(group_path)
+                img_urls.append(img_url)
 
-            try:
-                binary_group = preprocess_for_ocr(group_image)
-                group_text = pytesseract.image_to_string(binary_group, lang='kor+eng')
-                if group_text.strip():
-                    texts.append(group_text)
-                    print(f"Extracted text from group {group_idx}: {group_text[:100]}...")
-            except Exception as ocr_error:
-                print(f"OCR error for group {group_idx}: {ocr_error}")
+        # 다운로드 → 그룹화 → OCR 파이프라인
+        group_image_paths, texts, image_hashes = run_group_pipeline(
+            _iter_url_images(img_urls, headers), output_dir, group_size, api_key=api_key, use_cache=use_cache,
+            local_threshold=local_threshold
+        )
 
         # 결과 저장
         result = {
             'title': "Webtoon from URL",
             'author': "Unknown",
             'group_image_paths': group_image_paths,
+            'image_hashes': image_hashes,
             'texts': texts
         }
 
-        # 캐시 저장
+        # 캐시 저장 (파일 경로가 아닌 아티팩트 해시로)
         if use_cache:
-            with open(os.path.join(cache_dir, "metadata.json"), "w", encoding="utf-8") as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
+            try:
+                store.set_ref(ref_name, store_url_result(store, result))
+            except Exception as e:
+                print(f"Error saving content to artifact store: {e}")
 
         return result
 
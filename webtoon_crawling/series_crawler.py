@@ -0,0 +1,288 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+
+# 기본 웹툰 서버 (로컬 테스트 서버를 쓸 때는 --base_url로 변경)
+DEFAULT_BASE_URL = "https://m.comic.naver.com"
+
+# 헤더 설정 (중요: Referer 설정이 필요함)
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36',
+    'Referer': 'https://comic.naver.com/',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8'
+}
+
+# 가능한 여러 클래스명 (네이버 웹툰 구조가 변경될 수 있음)
+POSSIBLE_CLASSES = ["wt_viewer", "comic_viewer", "viewer_lst", "view_area", "comic_view", "viewer"]
+
+MANIFEST_NAME = "manifest.json"
+
+
+def episode_url(base_url, title_id, no):
+    """회차 페이지 URL 생성"""
+    return f"{base_url.rstrip('/')}/webtoon/detail?titleId={title_id}&no={no}"
+
+
+def load_manifest(manifest_path, title_id):
+    """로컬 매니페스트를 불러온다 (없으면 새로 만든다)"""
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if str(manifest.get("title_id")) == str(title_id):
+                return manifest
+            print(f"매니페스트의 titleId가 달라 새로 만듭니다: {manifest.get('title_id')}")
+        except Exception as e:
+            print(f"매니페스트를 읽을 수 없습니다: {e}")
+    return {"title_id": str(title_id), "episodes": {}}
+
+
+def save_manifest(manifest, manifest_path):
+    """매니페스트를 임시 파일에 쓴 뒤 교체한다 (중간에 종료돼도 깨지지 않도록)"""
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, manifest_path)
+
+
+def conditional_headers(entry):
+    """이전에 받은 ETag / Last-Modified 값으로 조건부 요청 헤더를 만든다"""
+    headers = dict(HEADERS)
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def find_image_urls(html, page_url):
+    """회차 페이지 HTML에서 웹툰 이미지 URL 목록을 찾는다"""
+    soup = BeautifulSoup(html, "html.parser")
+
+    img_container = None
+    for class_name in POSSIBLE_CLASSES:
+        container = soup.find("div", class_=class_name)
+        if container and container.find_all("img"):
+            img_container = container
+            break
+
+    if img_container:
+        img_tags = img_container.find_all("img")
+    else:
+        # 웹툰 이미지로 보이는 것들만 필터링 (src에 "webtoon" 또는 "comic" 포함)
+        img_tags = [img for img in soup.find_all("img")
+                    if img.get('src') and ('webtoon' in img['src'].lower() or 'comic' in img['src'].lower())]
+
+    img_urls = []
+    for img in img_tags:
+        src = img.get('src')
+        if not src:
+            continue
+        # 상대 URL 처리 ('//host/...' 포함)
+        img_urls.append(urljoin(page_url, src))
+    return img_urls
+
+
+def _image_extension(img_url):
+    """이미지 URL에서 확장자를 추출 (없으면 jpg)"""
+    filename = img_url.split('?')[0].split('/')[-1]
+    if '.' in filename:
+        return filename.split('.')[-1]
+    return 'jpg'
+
+
+def _local_file_ok(entry):
+    """매니페스트에 기록된 로컬 파일이 존재하고 크기가 같은지 확인"""
+    path = entry.get("path")
+    return bool(path) and os.path.exists(path) and os.path.getsize(path) == entry.get("size")
+
+
+def sync_image(session, img_url, path, entry, stats, force_check=True):
+    """
+    이미지를 조건부 요청으로 동기화한다.
+
+    Args:
+        session (requests.Session): HTTP 세션
+        img_url (str): 이미지 URL
+        path (str): 저장할 로컬 경로
+        entry (dict): 이전 매니페스트 항목 (없으면 None)
+        stats (dict): 요청 통계
+        force_check (bool): 로컬 파일이 있어도 서버에 변경 여부를 확인할지 여부
+
+    Returns:
+        dict: 갱신된 매니페스트 항목
+    """
+    if entry and entry.get("url") == img_url and _local_file_ok(entry):
+        if not force_check:
+            stats["skipped"] += 1
+            return entry
+        request_headers = conditional_headers(entry)
+    else:
+        entry = None
+        request_headers = dict(HEADERS)
+
+    response = session.get(img_url, headers=request_headers)
+    stats["requests"] += 1
+    if response.status_code == 304:
+        stats["not_modified"] += 1
+        return entry
+    response.raise_for_status()
+
+    content = response.content
+    content_hash = hashlib.md5(content).hexdigest()
+    stats["bytes"] += len(content)
+
+    if entry and entry.get("md5") == content_hash and entry.get("path") == path:
+        # 서버가 304를 보내지 않았지만 내용은 같음
+        stats["unchanged"] += 1
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+        stats["downloaded"] += 1
+        print(f"이미지 저장 완료: {path}")
+
+    return {
+        "url": img_url,
+        "path": path,
+        "md5": content_hash,
+        "size": len(content),
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified")
+    }
+
+
+def _image_path(output_dir, title_id, no, index, img_url):
+    """페이지 안에서의 위치(1부터)로 이미지 저장 경로를 만든다"""
+    return os.path.join(output_dir, str(title_id), str(no), f"{index}.{_image_extension(img_url)}")
+
+
+def _manifest_images(episode_entry):
+    """매니페스트의 이미지 항목을 페이지 위치 순서로 반환 (index가 없는 이전 매니페스트는 목록 순서)"""
+    images = (episode_entry or {}).get("images", [])
+    return sorted(({**image, "index": image.get("index", idx)} for idx, image in enumerate(images, 1)),
+                  key=lambda image: image["index"])
+
+
+def sync_episode(session, base_url, title_id, no, output_dir, manifest, stats, verify_images=False, delay=0.5):
+    """
+    한 회차를 동기화한다. 회차 페이지가 304이면 이미지 목록은 매니페스트 것을 그대로 쓰고,
+    로컬 파일이 없는 이미지만 다시 받는다.
+    실패한 이미지는 페이지 위치를 담은 자리 표시 항목으로 남기고, 이때는 페이지 ETag를 저장하지 않으므로
+    다음 실행에서 페이지를 다시 받아 실패한 이미지를 같은 경로로 재시도한다.
+    """
+    page_url = episode_url(base_url, title_id, no)
+    episode_entry = manifest["episodes"].get(str(no))
+    previous_images = _manifest_images(episode_entry)
+
+    response = session.get(page_url, headers=conditional_headers(episode_entry))
+    stats["requests"] += 1
+
+    if response.status_code == 304 and episode_entry:
+        stats["not_modified"] += 1
+        page_images = [(image["index"], image["url"]) for image in previous_images]
+        page_changed = False
+    else:
+        response.raise_for_status()
+        page_images = list(enumerate(find_image_urls(response.text, page_url), 1))
+        page_changed = True
+        if not page_images:
+            print(f"{no}화: 이미지를 찾을 수 없습니다.")
+
+    previous_by_index = {image["index"]: image for image in previous_images}
+    images = []
+    failed = 0
+    for index, img_url in page_images:
+        path = _image_path(output_dir, title_id, no, index, img_url)
+        previous = previous_by_index.get(index)
+        if previous and (previous.get("url") != img_url or previous.get("path") != path or previous.get("failed")):
+            previous = None
+        requests_before = stats["requests"]
+        try:
+            image = sync_image(session, img_url, path, previous, stats, force_check=page_changed or verify_images)
+            images.append({**image, "index": index})
+        except Exception as e:
+            print(f"이미지 동기화 실패 {img_url}: {e}")
+            stats["errors"] += 1
+            failed += 1
+            # 이전에 받은 파일이 있으면 유지하고, 없으면 위치만 기록한 자리 표시 항목을 남김
+            images.append({**previous, "index": index} if previous
+                          else {"index": index, "url": img_url, "path": path, "failed": True})
+        # 실제로 요청을 보낸 경우에만 지연 (서버 부하 방지)
+        if stats["requests"] > requests_before and delay:
+            time.sleep(delay)
+
+    if failed:
+        # 페이지 검증 값을 저장하면 다음 실행이 304를 받아 실패한 이미지를 다시 확인하지 않으므로 비워 둠
+        etag, last_modified = None, None
+        print(f"{no}화: 이미지 {failed}개 실패, 다음 실행에서 다시 시도합니다.")
+    elif page_changed:
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+    else:
+        etag, last_modified = episode_entry.get("etag"), episode_entry.get("last_modified")
+
+    manifest["episodes"][str(no)] = {
+        "url": page_url,
+        "etag": etag,
+        "last_modified": last_modified,
+        "images": images
+    }
+
+
+def sync_series(title_id, start, end, output_dir="webtoon_images", base_url=DEFAULT_BASE_URL,
+                verify_images=False, delay=0.5):
+    """
+    titleId의 start~end 회차를 증분 동기화한다.
+    회차가 끝날 때마다 매니페스트를 저장하므로 중간에 멈춰도 다음 실행에서 이어진다.
+
+    Returns:
+        dict: 요청 통계
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, f"{title_id}_{MANIFEST_NAME}")
+    manifest = load_manifest(manifest_path, title_id)
+
+    stats = {"requests": 0, "not_modified": 0, "downloaded": 0, "unchanged": 0,
+             "skipped": 0, "errors": 0, "bytes": 0}
+    session = requests.Session()
+
+    for no in range(start, end + 1):
+        try:
+            sync_episode(session, base_url, title_id, no, output_dir, manifest, stats,
+                         verify_images=verify_images, delay=delay)
+            save_manifest(manifest, manifest_path)
+            print(f"{no}화 동기화 완료")
+        except Exception as e:
+            print(f"{no}화 동기화 실패: {e}")
+            stats["errors"] += 1
+
+    print(f"요청 {stats['requests']}회 (304: {stats['not_modified']}회), "
+          f"새로 받은 이미지 {stats['downloaded']}개, 받은 데이터 {stats['bytes'] / (1024 * 1024):.1f} MB, "
+          f"오류 {stats['errors']}회")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incrementally crawl a webtoon series with a local manifest')
+    parser.add_argument('--title_id', required=True, help='Webtoon titleId')
+    parser.add_argument('--start', type=int, default=1, help='First episode number')
+    parser.add_argument('--end', type=int, required=True, help='Last episode number (inclusive)')
+    parser.add_argument('--output_dir', default='webtoon_images', help='Directory for images and manifest')
+    parser.add_argument('--base_url', default=DEFAULT_BASE_URL, help='Webtoon server base URL (e.g. a local stand-in server)')
+    parser.add_argument('--verify_images', action='store_true', help='Send conditional requests for images even when the episode page is unchanged')
+    parser.add_argument('--delay', type=float, default=0.5, help='Delay between requests in seconds')
+    args = parser.parse_args()
+
+    sync_series(args.title_id, args.start, args.end, args.output_dir, args.base_url,
+                verify_images=args.verify_images, delay=args.delay)
+
+
+if __name__ == "__main__":
+    main()
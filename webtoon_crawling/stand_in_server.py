@@ -0,0 +1,185 @@
+import argparse
+import hashlib
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import series_crawler
+
+# 스탠드인 서버의 회차당 이미지 수
+IMAGES_PER_EPISODE = 5
+
+
+def _image_bytes(title_id, no, index):
+    """회차/위치마다 내용이 다른 가짜 이미지 데이터"""
+    return f"stand-in image {title_id}/{no}/{index}\n".encode("utf-8") * 64
+
+
+def _etag(content):
+    return '"' + hashlib.md5(content).hexdigest() + '"'
+
+
+class StandInWebtoonServer(ThreadingHTTPServer):
+    """
+    네이버 웹툰 회차 페이지와 이미지를 흉내 내는 로컬 서버.
+    모든 응답에 ETag를 붙이고 If-None-Match가 같으면 304를 돌려줍니다.
+    fail_once에 넣은 경로는 처음 한 번만 500을 돌려줍니다 (일시적인 이미지 오류 재현용).
+
+    Args:
+        images_per_episode (int): 회차당 이미지 수
+        fail_once (iterable): 한 번 실패시킬 경로 (예: '/img/1/1/3.jpg')
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), images_per_episode=IMAGES_PER_EPISODE, fail_once=()):
+        super().__init__(address, _Handler)
+        self.images_per_episode = images_per_episode
+        self.fail_once = set(fail_once)
+        self.lock = threading.Lock()
+        self.hits = {}
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def count(self, status):
+        with self.lock:
+            self.hits[status] = self.hits.get(status, 0) + 1
+
+    def should_fail(self, path):
+        with self.lock:
+            if path in self.fail_once:
+                self.fail_once.discard(path)
+                return True
+            return False
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def _send(self, status, content=b"", content_type="text/html; charset=utf-8", etag=None):
+        self.server.count(status)
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        if content:
+            self.wfile.write(content)
+
+    def _send_cached(self, content, content_type):
+        etag = _etag(content)
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, etag=etag)
+        else:
+            self._send(200, content, content_type, etag)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if self.server.should_fail(parsed.path):
+            self._send(500, b"injected failure")
+            return
+        if parsed.path == "/webtoon/detail":
+            query = parse_qs(parsed.query)
+            title_id, no = query["titleId"][0], query["no"][0]
+            tags = "".join(f'<img src="/img/{title_id}/{no}/{index}.jpg">'
+                           for index in range(1, self.server.images_per_episode + 1))
+            html = f'<html><body><div class="wt_viewer">{tags}</div></body></html>'
+            self._send_cached(html.encode("utf-8"), "text/html; charset=utf-8")
+        elif parsed.path.startswith("/img/"):
+            title_id, no, filename = parsed.path[len("/img/"):].split("/")
+            self._send_cached(_image_bytes(title_id, no, int(filename.split(".")[0])), "image/jpeg")
+        else:
+            self._send(404, b"not found")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _start(**options):
+    server = StandInWebtoonServer(**options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _check_files(output_dir, title_id, start, end, images_per_episode):
+    """저장된 파일이 페이지 위치별 이미지와 같은지 확인"""
+    for no in range(start, end + 1):
+        for index in range(1, images_per_episode + 1):
+            path = os.path.join(output_dir, str(title_id), str(no), f"{index}.jpg")
+            with open(path, "rb") as f:
+                assert f.read() == _image_bytes(title_id, no, index), f"{path}: 다른 위치의 이미지가 저장됨"
+
+
+def check(title_id="1", episodes=3):
+    """
+    스탠드인 서버로 증분 동기화를 확인합니다.
+    1) 두 번째 동기화는 회차 페이지 요청이 모두 304이고 이미지는 다시 받지 않아야 합니다.
+    2) 이미지 하나가 한 번 실패하면 다음 동기화에서 같은 위치로 다시 받고 다른 이미지는 304여야 합니다.
+    """
+    with tempfile.TemporaryDirectory() as output_dir:
+        server = _start()
+        try:
+            first = series_crawler.sync_series(title_id, 1, episodes, output_dir, server.base_url, delay=0)
+            second = series_crawler.sync_series(title_id, 1, episodes, output_dir, server.base_url, delay=0)
+            verified = series_crawler.sync_series(title_id, 1, episodes, output_dir, server.base_url,
+                                                  verify_images=True, delay=0)
+        finally:
+            server.shutdown()
+        assert first["downloaded"] == episodes * IMAGES_PER_EPISODE and first["errors"] == 0
+        assert second["requests"] == episodes and second["not_modified"] == episodes and second["downloaded"] == 0
+        assert verified["not_modified"] == verified["requests"] and verified["downloaded"] == 0
+        _check_files(output_dir, title_id, 1, episodes, IMAGES_PER_EPISODE)
+        print(f"재동기화: 요청 {second['requests']}회 중 304 {second['not_modified']}회, "
+              f"이미지 확인 포함 {verified['requests']}회 중 304 {verified['not_modified']}회")
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        failing = f"/img/{title_id}/1/3.jpg"
+        server = _start(fail_once=[failing])
+        try:
+            first = series_crawler.sync_series(title_id, 1, 1, output_dir, server.base_url, delay=0)
+            manifest = series_crawler.load_manifest(
+                os.path.join(output_dir, f"{title_id}_{series_crawler.MANIFEST_NAME}"), title_id)
+            episode = manifest["episodes"]["1"]
+            assert first["errors"] == 1 and episode["etag"] is None
+            assert [image["index"] for image in episode["images"]] == list(range(1, IMAGES_PER_EPISODE + 1))
+            assert episode["images"][2].get("failed")
+
+            retry = series_crawler.sync_series(title_id, 1, 1, output_dir, server.base_url, delay=0)
+            after = series_crawler.sync_series(title_id, 1, 1, output_dir, server.base_url, delay=0)
+        finally:
+            server.shutdown()
+        assert retry["errors"] == 0 and retry["downloaded"] == 1
+        assert retry["not_modified"] == IMAGES_PER_EPISODE - 1
+        assert after["requests"] == 1 and after["not_modified"] == 1
+        _check_files(output_dir, title_id, 1, 1, IMAGES_PER_EPISODE)
+        print(f"일시적 실패 후 재시도: {failing}만 다시 받음, 나머지 {retry['not_modified']}개는 304")
+    print("OK")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in webtoon server for testing the series crawler')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Run the stand-in server (use with series_crawler.py --base_url)')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--images', type=int, default=IMAGES_PER_EPISODE, help='Images per episode')
+    serve_parser.add_argument('--fail_once', nargs='*', default=[], help='Paths that return 500 once (e.g. /img/1/1/3.jpg)')
+
+    check_parser = subparsers.add_parser('check', help='Run the incremental sync checks against an in-process server')
+    check_parser.add_argument('--episodes', type=int, default=3)
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        server = StandInWebtoonServer(("127.0.0.1", args.port), args.images, args.fail_once)
+        print(f"Stand-in webtoon server: {server.base_url}")
+        server.serve_forever()
+    else:
+        check(episodes=args.episodes)
+
+
+if __name__ == "__main__":
+    main()